@@ -1,9 +1,12 @@
 import streamlit as st
 import pandas as pd
 import plotly.graph_objects as go
-from wordcloud import WordCloud
-import matplotlib.pyplot as plt
 import numpy as np
+from archivio_prezzi import leggi_cubo, apri_archivio, FILE_ARCHIVIO
+from sorgenti_dati import SorgenteFile
+from lettura_dati import leggi_sentiment, FILE_SENTIMENT
+from nuvole_parole import tabella_frequenze, frequenze, nuvola_png
+from indici_dashboard import indicizza, seleziona, valori_livello, date_estreme, CHIAVI_PREZZI, CATEGORICHE_PREZZI, CHIAVI_SENTIMENT, CATEGORICHE_SENTIMENT
 
 # --- 1. CONFIGURAZIONE PAGINA ---
 st.set_page_config(page_title="Antigravity Wine OS", layout="wide", initial_sidebar_state="expanded")
@@ -19,33 +22,39 @@ st.markdown("""
     """, unsafe_allow_html=True)
 
 # --- 3. CARICAMENTO E PULIZIA DATI ---
-@st.cache_data(ttl=3600)
-def load_all_data():
-    # Caricamento Storico Prezzi
-    df_prezzi = pd.read_csv("public/data/storico_prezzi.csv", sep=";")
-    df_prezzi['DATA_ESTRAZIONE'] = pd.to_datetime(df_prezzi['DATA_ESTRAZIONE'], format='mixed', dayfirst=True, errors='coerce').dt.normalize()
-    
-    for col in ['PREZZO_SCONTATO', 'PREZZO_ORIGINALE']:
-        if col in df_prezzi.columns:
-            df_prezzi[col] = pd.to_numeric(df_prezzi[col].astype(str).str.replace(',', '.'), errors='coerce')
-    
-    # Caricamento Database Vini
-    df_vini = pd.read_csv("public/data/database_vini.csv", sep=";")
-    if 'PREZZO_BASE' in df_vini.columns:
-        df_vini['PREZZO_BASE'] = pd.to_numeric(df_vini['PREZZO_BASE'].astype(str).str.replace(',', '.'), errors='coerce')
-        
-    df_merged = pd.merge(df_prezzi, df_vini[['CANTINA', 'NOME_PRODOTTO', 'PREZZO_BASE']], on=['CANTINA', 'NOME_PRODOTTO'], how='left')
-    
-    # Caricamento Sentiment Elaborato
-    df_sent = pd.read_csv("public/data/sentiment_vini_elaborato.csv", sep=";")
-    df_sent['DATA_COMMENTO'] = pd.to_datetime(df_sent['DATA_COMMENTO'], format='mixed', dayfirst=True, errors='coerce').dt.normalize()
-    if 'PAROLE_CHIAVE_ESTRATTE' in df_sent.columns:
-        df_sent['PAROLE_CHIAVE_ESTRATTE'] = df_sent['PAROLE_CHIAVE_ESTRATTE'].fillna('')
-    
-    return df_merged, df_sent
+def carica_prezzi(file_archivio):
+    # Prezzi: cubo giornaliero (ID_PRODOTTO, SITO_ORIGINE, GIORNO) già aggregato dal bot,
+    # con PREZZO_BASE e conteggi sotto MAP precalcolati: niente merge né ricalcoli sullo storico grezzo
+    df_cubo = leggi_cubo(file_archivio)
+    # Colonne ripetute -> categoriche, frame ordinati per (prodotto, data): i filtri diventano fette dell'indice
+    return indicizza(df_cubo, CHIAVI_PREZZI, CATEGORICHE_PREZZI)
+
+def carica_sentiment(file_sentiment):
+    # Schema dichiarato in lettura_dati: date nei formati noti, rating numerico, BOM gestito
+    df_sent = leggi_sentiment(file_sentiment)
+    df_sent['DATA_COMMENTO'] = df_sent['DATA_COMMENTO'].dt.normalize()
+    return indicizza(df_sent, CHIAVI_SENTIMENT, CATEGORICHE_SENTIMENT)
+
+@st.cache_resource
+def sorgenti():
+    # Condivise da tutte le sessioni: ogni file si ricarica da solo, in background, quando cambia contenuto
+    apri_archivio().close()  # al primo avvio crea l'archivio SQLite (e il cubo) dal CSV storico
+    return SorgenteFile(FILE_ARCHIVIO, carica_prezzi), SorgenteFile(FILE_SENTIMENT, carica_sentiment)
+
+@st.cache_data(max_entries=1, show_spinner=False)
+def frequenze_sentiment(firma, _df_s):
+    # Conteggi per (vino, sentiment, giorno): ricalcolati solo quando cambia il contenuto del CSV del sentiment
+    return tabella_frequenze(_df_s.reset_index())
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def nuvola_cache(firma, vino, sentiment, inizio, fine, colormap, _tabella):
+    # LRU delle immagini già pronte, chiave = stato dei filtri + impronta del file
+    return nuvola_png(frequenze(_tabella, vino, sentiment, inizio, fine), colormap)
 
 try:
-    df_p, df_s = load_all_data()
+    sorgente_prezzi, sorgente_sentiment = sorgenti()
+    df_p, _ = sorgente_prezzi.leggi()
+    df_s, firma_sent = sorgente_sentiment.leggi()
 
     # --- 4. SIDEBAR ---
     with st.sidebar:
@@ -53,14 +62,14 @@ try:
         app_mode = st.radio("Seleziona modulo:", ["Price Intelligence", "Sentiment Analysis"])
         st.markdown("---")
         
-        list_cantine = sorted(df_p['CANTINA'].dropna().unique())
+        list_cantine = valori_livello(df_p, 'CANTINA')
         sel_cantina = st.selectbox("Seleziona Cantina", list_cantine)
         
-        filtered_vini = sorted(df_p[df_p['CANTINA'] == sel_cantina]['NOME_PRODOTTO'].dropna().unique())
+        filtered_vini = valori_livello(df_p, 'NOME_PRODOTTO', CANTINA=sel_cantina)
         sel_vino = st.selectbox("Seleziona Vino", filtered_vini)
         
         date_range = st.date_input("Intervallo temporale", 
-                                   [df_p['DATA_ESTRAZIONE'].min(), df_p['DATA_ESTRAZIONE'].max()])
+                                   list(date_estreme(df_p)))
 
     start_date = pd.to_datetime(date_range[0])
     end_date = pd.to_datetime(date_range[1]) if len(date_range) > 1 else start_date
@@ -70,11 +79,13 @@ try:
     # ==========================================
     if app_mode == "Price Intelligence":
         st.title(f"📊 Price Intelligence")
-        df_plot = df_p[(df_p['CANTINA'] == sel_cantina) & (df_p['NOME_PRODOTTO'] == sel_vino) & (df_p['DATA_ESTRAZIONE'].between(start_date, end_date))]
+        df_plot = seleziona(df_p, sel_cantina, sel_vino, inizio=start_date, fine=end_date)
         
         if not df_plot.empty:
+            # Tutti i KPI sono somme sulle righe del cubo (una per sito e giorno)
             prezzo_base = df_plot['PREZZO_BASE'].values[0]
-            prezzo_medio = df_plot['PREZZO_SCONTATO'].mean()
+            prezzi_validi = df_plot['N_PREZZI'].sum()
+            prezzo_medio = df_plot['SOMMA_PREZZO'].sum() / prezzi_validi if prezzi_validi > 0 else float('nan')
             scostamento_perc = ((prezzo_medio - prezzo_base) / prezzo_base) * 100 if prezzo_base > 0 else 0
 
             col_img, col_info1, col_info2, col_info3 = st.columns([1, 1, 1, 1])
@@ -84,21 +95,21 @@ try:
             with col_info3: st.metric("Scostamento dal Base", f"{scostamento_perc:.1f}%", delta=f"{scostamento_perc:.1f}%", delta_color="inverse" if scostamento_perc < 0 else "normal")
 
             st.markdown("---")
+            giorni = df_plot['GIORNO'].drop_duplicates().sort_values()
             fig = go.Figure()
-            fig.add_trace(go.Scatter(x=df_plot['DATA_ESTRAZIONE'], y=[prezzo_base]*len(df_plot), name="PREZZO BASE (MAP)", line=dict(color='black', width=4, dash='dash'), mode='lines'))
+            fig.add_trace(go.Scatter(x=giorni, y=[prezzo_base]*len(giorni), name="PREZZO BASE (MAP)", line=dict(color='black', width=4, dash='dash'), mode='lines'))
             pastel_colors = ['#aec6cf', '#ffb347', '#b39eb5', '#ff6961', '#77dd77', '#fdfd96', '#ffb7b2']
             sites = df_plot['SITO_ORIGINE'].unique()
             for i, mkt in enumerate(sites):
-                df_mkt = df_plot[df_plot['SITO_ORIGINE'] == mkt].sort_values('DATA_ESTRAZIONE')
-                fig.add_trace(go.Scatter(x=df_mkt['DATA_ESTRAZIONE'], y=df_mkt['PREZZO_SCONTATO'], name=mkt, line=dict(width=3, color=pastel_colors[i % len(pastel_colors)]), mode='lines+markers'))
+                df_mkt = df_plot[df_plot['SITO_ORIGINE'] == mkt].sort_values('GIORNO')
+                fig.add_trace(go.Scatter(x=df_mkt['GIORNO'], y=df_mkt['PREZZO_MEDIO'], name=mkt, line=dict(width=3, color=pastel_colors[i % len(pastel_colors)]), mode='lines+markers'))
             fig.update_layout(template="plotly_white", hovermode="x unified", height=500)
             st.plotly_chart(fig, use_container_width=True)
 
             st.markdown("---")
             col_kpi, col_wos = st.columns([1, 2])
-            totale_rilevazioni = len(df_plot)
-            df_under = df_plot[df_plot['PREZZO_SCONTATO'] < prezzo_base]
-            count_under = len(df_under)
+            totale_rilevazioni = int(df_plot['N_RILEVAZIONI'].sum())
+            count_under = int(df_plot['N_SOTTO_MAP'].sum())
             perc_under = (count_under / totale_rilevazioni) * 100 if totale_rilevazioni > 0 else 0
             with col_kpi:
                 st.subheader("📉 KPI Scostamenti")
@@ -106,8 +117,16 @@ try:
                 st.metric("% Violazioni Totali", f"{perc_under:.1f}%")
             with col_wos:
                 st.subheader("⚠️ Wall of Shame")
-                # ... logica wall of shame ...
-                st.write("(Elenco siti con violazioni)")
+                df_wos = (df_plot.groupby('SITO_ORIGINE', observed=True)
+                          .agg(VIOLAZIONI=('N_SOTTO_MAP', 'sum'), RILEVAZIONI=('N_RILEVAZIONI', 'sum'), PREZZO_MINIMO=('PREZZO_MIN', 'min'))
+                          .query('VIOLAZIONI > 0')
+                          .sort_values('VIOLAZIONI', ascending=False)
+                          .reset_index())
+                if not df_wos.empty:
+                    df_wos['% VIOLAZIONI'] = (df_wos['VIOLAZIONI'] / df_wos['RILEVAZIONI'] * 100).round(1)
+                    st.dataframe(df_wos, use_container_width=True, hide_index=True)
+                else:
+                    st.success("Nessun sito sotto MAP nel periodo selezionato")
 
     # ==========================================
     # MODULO 2: SENTIMENT ANALYSIS (Aggiornato)
@@ -116,7 +135,7 @@ try:
         st.title(f"🍷 Sentiment Analysis")
         st.markdown(f"**Vino Analizzato:** {sel_vino}")
         
-        df_plot_s = df_s[(df_s['NOME_PRODOTTO'] == sel_vino) & (df_s['DATA_COMMENTO'].between(start_date, end_date))]
+        df_plot_s = seleziona(df_s, sel_vino, inizio=start_date, fine=end_date)
 
         if not df_plot_s.empty:
             # --- KPI Superiori ---
@@ -134,19 +153,14 @@ try:
             # --- NUOVA FASCIA: WORDCLOUD - ANNELLO - WORDCLOUD ---
             col_wc_pos, col_donut, col_wc_neg = st.columns([1.5, 2, 1.5])
             
-            stopwords_ita = ['di', 'a', 'da', 'in', 'con', 'su', 'per', 'tra', 'fra', 'il', 'lo', 'la', 'i', 'gli', 'le', 'un', 'uno', 'una', 'è', 'che', 'non', 'molto', 'vino', 'bottiglia', 'sapore', 'note']
+            tabella_parole = frequenze_sentiment(firma_sent, df_s)
 
             # 1. Word Cloud POSITIVA (Sinistra)
             with col_wc_pos:
                 st.markdown("<h4 style='text-align: center; color: #77dd77;'>🟢 Punti di Forza</h4>", unsafe_allow_html=True)
-                text_pos = " ".join(df_plot_s[df_plot_s['SENTIMENT_SCORE'] == 'Positivo']['PAROLE_CHIAVE_ESTRATTE'].astype(str))
-                if text_pos.strip() and len(text_pos) > 5:
-                    wc_pos = WordCloud(width=400, height=400, background_color='rgba(0,0,0,0)', mode="RGBA", colormap='Greens', stopwords=stopwords_ita).generate(text_pos)
-                    fig_p, ax_p = plt.subplots(figsize=(5, 5))
-                    ax_p.imshow(wc_pos, interpolation='bilinear')
-                    ax_p.axis("off")
-                    fig_p.patch.set_alpha(0)
-                    st.pyplot(fig_p)
+                png_pos = nuvola_cache(firma_sent, sel_vino, 'Positivo', start_date, end_date, 'Greens', tabella_parole)
+                if png_pos:
+                    st.image(png_pos, use_container_width=True)
                 else:
                     st.info("Dati positivi insufficienti")
 
@@ -178,22 +192,22 @@ try:
             # 3. Word Cloud NEGATIVA (Destra)
             with col_wc_neg:
                 st.markdown("<h4 style='text-align: center; color: #ff6961;'>🔴 Criticità</h4>", unsafe_allow_html=True)
-                text_neg = " ".join(df_plot_s[df_plot_s['SENTIMENT_SCORE'] == 'Negativo']['PAROLE_CHIAVE_ESTRATTE'].astype(str))
-                if text_neg.strip() and len(text_neg) > 5:
-                    wc_neg = WordCloud(width=400, height=400, background_color='rgba(0,0,0,0)', mode="RGBA", colormap='Reds', stopwords=stopwords_ita).generate(text_neg)
-                    fig_n, ax_n = plt.subplots(figsize=(5, 5))
-                    ax_n.imshow(wc_neg, interpolation='bilinear')
-                    ax_n.axis("off")
-                    fig_n.patch.set_alpha(0)
-                    st.pyplot(fig_n)
+                png_neg = nuvola_cache(firma_sent, sel_vino, 'Negativo', start_date, end_date, 'Reds', tabella_parole)
+                if png_neg:
+                    st.image(png_neg, use_container_width=True)
                 else:
                     st.success("Nessuna criticità rilevata")
 
             # --- Tabella Recensioni ---
             st.markdown("---")
             st.subheader("Dettaglio Recensioni")
+            # TESTO_COMMENTO vuoto: recensione chiusa dal filtro locale, senza traduzione
+            df_tabella = df_plot_s[['DATA_COMMENTO', 'SITO_ORIGINE', 'RATING_ORIGINALE', 'SENTIMENT_SCORE', 'TESTO_COMMENTO']].copy()
+            if 'TESTO_ORIGINALE' in df_plot_s.columns:
+                non_tradotte = df_tabella['TESTO_COMMENTO'].fillna('').astype(str).str.strip() == ''
+                df_tabella.loc[non_tradotte, 'TESTO_COMMENTO'] = '[non tradotto] ' + df_plot_s.loc[non_tradotte, 'TESTO_ORIGINALE'].fillna('').astype(str)
             st.dataframe(
-                df_plot_s[['DATA_COMMENTO', 'SITO_ORIGINE', 'RATING_ORIGINALE', 'SENTIMENT_SCORE', 'TESTO_COMMENTO']]
+                df_tabella
                 .sort_values('DATA_COMMENTO', ascending=False), 
                 use_container_width=True, hide_index=True
             )
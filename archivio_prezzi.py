@@ -0,0 +1,236 @@
+import csv
+import os
+import sqlite3
+import sys
+from datetime import datetime
+import pandas as pd
+from lettura_dati import leggi_database_vini
+from metriche import span
+
+# --- ARCHIVIO STORICO PREZZI (SQLite, SOLO APPEND) ---
+# La fonte di verità è il database; storico_prezzi.csv resta per Next.js (api/storico, csv-parser.ts)
+# e viene aggiornato in coda con le sole righe nuove, senza rileggere né riscrivere lo storico.
+DIR_DATA = os.path.join('public', 'data')
+FILE_ARCHIVIO = os.path.join(DIR_DATA, 'storico_prezzi.db')
+FILE_CSV = os.path.join(DIR_DATA, 'storico_prezzi.csv')
+FILE_VINI = os.path.join(DIR_DATA, 'database_vini.csv')
+
+# Array originale a 11 colonne: il join avverrà su Next.js tramite ID_PRODOTTO o NOME_PRODOTTO
+COLONNE_STORICO = ['DATA_ESTRAZIONE', 'ID_PRODOTTO', 'CANTINA', 'NOME_PRODOTTO', 'SITO_ORIGINE', 'PREZZO_RILEVATO', 'PREZZO_SCONTATO', 'STOCKOUT', 'TRIGGER_REASON', 'SCREENSHOT_PATH', 'LINK_SCRAPING']
+COLONNE_PREZZO = ('PREZZO_RILEVATO', 'PREZZO_SCONTATO')
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS storico_prezzi (
+    {', '.join(f'{c} REAL' if c in COLONNE_PREZZO else f'{c} TEXT' for c in COLONNE_STORICO)}
+);
+CREATE INDEX IF NOT EXISTS idx_storico_listing ON storico_prezzi (ID_PRODOTTO, SITO_ORIGINE);
+"""
+
+# --- CUBO GIORNALIERO (AGGREGATI MATERIALIZZATI PER LA DASHBOARD) ---
+# Una riga per (ID_PRODOTTO, SITO_ORIGINE, GIORNO), aggiornata nella stessa transazione delle rilevazioni:
+# KPI e Wall of Shame diventano somme su poche righe invece di maschere sull'intero storico.
+# Prezzo effettivo = PREZZO_SCONTATO se presente, altrimenti PREZZO_RILEVATO.
+# N_SOTTO_MAP usa il PREZZO_BASE di database_vini.csv al momento della scrittura:
+# se i prezzi base cambiano, rigenerare con --ricostruisci-cubo.
+COLONNE_CUBO = ['ID_PRODOTTO', 'SITO_ORIGINE', 'GIORNO', 'CANTINA', 'NOME_PRODOTTO', 'PREZZO_BASE',
+                'N_RILEVAZIONI', 'N_PREZZI', 'SOMMA_PREZZO', 'PREZZO_MIN', 'PREZZO_MAX', 'N_SOTTO_MAP', 'N_STOCKOUT']
+FORMATI_DATA = ('%d/%m/%Y', '%Y-%m-%d', '%d/%m/%Y %H:%M', '%d/%m/%Y %H:%M:%S')
+
+SCHEMA_CUBO = """
+CREATE TABLE IF NOT EXISTS cubo_giornaliero (
+    ID_PRODOTTO TEXT NOT NULL,
+    SITO_ORIGINE TEXT NOT NULL,
+    GIORNO TEXT NOT NULL,
+    CANTINA TEXT,
+    NOME_PRODOTTO TEXT,
+    PREZZO_BASE REAL,
+    N_RILEVAZIONI INTEGER NOT NULL,
+    N_PREZZI INTEGER NOT NULL,
+    SOMMA_PREZZO REAL NOT NULL,
+    PREZZO_MIN REAL,
+    PREZZO_MAX REAL,
+    N_SOTTO_MAP INTEGER NOT NULL,
+    N_STOCKOUT INTEGER NOT NULL,
+    PRIMARY KEY (ID_PRODOTTO, SITO_ORIGINE, GIORNO)
+);
+"""
+
+# Upsert: i contatori si sommano, min/max si confrontano (NULL = nessun prezzo valido quel giorno)
+SQL_UPSERT_CUBO = f"""
+INSERT INTO cubo_giornaliero VALUES ({', '.join('?' * len(COLONNE_CUBO))})
+ON CONFLICT (ID_PRODOTTO, SITO_ORIGINE, GIORNO) DO UPDATE SET
+    CANTINA = excluded.CANTINA,
+    NOME_PRODOTTO = excluded.NOME_PRODOTTO,
+    PREZZO_BASE = COALESCE(excluded.PREZZO_BASE, PREZZO_BASE),
+    N_RILEVAZIONI = N_RILEVAZIONI + excluded.N_RILEVAZIONI,
+    N_PREZZI = N_PREZZI + excluded.N_PREZZI,
+    SOMMA_PREZZO = SOMMA_PREZZO + excluded.SOMMA_PREZZO,
+    PREZZO_MIN = MIN(COALESCE(PREZZO_MIN, excluded.PREZZO_MIN), COALESCE(excluded.PREZZO_MIN, PREZZO_MIN)),
+    PREZZO_MAX = MAX(COALESCE(PREZZO_MAX, excluded.PREZZO_MAX), COALESCE(excluded.PREZZO_MAX, PREZZO_MAX)),
+    N_SOTTO_MAP = N_SOTTO_MAP + excluded.N_SOTTO_MAP,
+    N_STOCKOUT = N_STOCKOUT + excluded.N_STOCKOUT
+"""
+
+def _valore_db(colonna, valore):
+    if valore is None or (isinstance(valore, float) and valore != valore):
+        return None
+    if colonna in COLONNE_PREZZO:
+        try:
+            return float(str(valore).replace(',', '.'))
+        except ValueError:
+            return str(valore)  # valore sporco conservato così com'è
+    return str(valore)
+
+def _valore_csv(valore):
+    return '' if valore is None else str(valore)
+
+def _importa_csv(conn, file_csv):
+    """Migrazione una tantum: copia nel database lo storico CSV esistente."""
+    with open(file_csv, encoding='utf-8-sig', newline='') as f:
+        lettore = csv.DictReader(f, delimiter=';')
+        lettore.fieldnames = [c.strip().upper() for c in lettore.fieldnames or []]
+        righe = [tuple(_valore_db(c, r.get(c) or None) for c in COLONNE_STORICO) for r in lettore]
+    conn.executemany(f"INSERT INTO storico_prezzi VALUES ({', '.join('?' * len(COLONNE_STORICO))})", righe)
+    print(f"📦 Archivio storico creato importando {len(righe)} righe da {file_csv}")
+
+def _giorno_iso(data):
+    testo = str(data or '').strip()
+    for formato in FORMATI_DATA:
+        try:
+            return datetime.strptime(testo, formato).strftime('%Y-%m-%d')
+        except ValueError:
+            continue
+    return None
+
+def _prezzo(valore):
+    return valore if isinstance(valore, float) else None  # i valori sporchi restano testo nel database
+
+def carica_prezzi_base(file_vini=FILE_VINI):
+    """{(ID_PRODOTTO, SITO_ORIGINE): PREZZO_BASE}, più {(ID_PRODOTTO, None): primo prezzo} come ripiego."""
+    prezzi = {}
+    if not os.path.exists(file_vini):
+        return prezzi
+    df_vini = leggi_database_vini(file_vini).dropna(subset=['ID_PRODOTTO', 'PREZZO_BASE'])
+    for id_prodotto, sito, base in df_vini[['ID_PRODOTTO', 'SITO_ORIGINE', 'PREZZO_BASE']].itertuples(index=False):
+        prezzi[(id_prodotto, sito)] = float(base)
+        prezzi.setdefault((id_prodotto, None), float(base))
+    return prezzi
+
+def _aggrega(righe, prezzi_base):
+    """Riduce righe nel formato COLONNE_STORICO a righe del cubo (una per listing e giorno)."""
+    i = {c: n for n, c in enumerate(COLONNE_STORICO)}
+    celle = {}
+    for riga in righe:
+        giorno = _giorno_iso(riga[i['DATA_ESTRAZIONE']])
+        id_prodotto, sito = riga[i['ID_PRODOTTO']], riga[i['SITO_ORIGINE']]
+        if giorno is None or not id_prodotto or not sito:
+            continue
+        chiave = (id_prodotto, sito, giorno)
+        cella = celle.get(chiave)
+        if cella is None:
+            base = prezzi_base.get((id_prodotto, sito), prezzi_base.get((id_prodotto, None)))
+            cella = celle[chiave] = [id_prodotto, sito, giorno, None, None, base, 0, 0, 0.0, None, None, 0, 0]
+        cella[3], cella[4] = riga[i['CANTINA']], riga[i['NOME_PRODOTTO']]
+        cella[6] += 1
+        cella[12] += riga[i['STOCKOUT']] == 'SI'
+        prezzo = _prezzo(riga[i['PREZZO_SCONTATO']])
+        if prezzo is None:
+            prezzo = _prezzo(riga[i['PREZZO_RILEVATO']])
+        if prezzo is None:
+            continue
+        cella[7] += 1
+        cella[8] += prezzo
+        cella[9] = prezzo if cella[9] is None else min(cella[9], prezzo)
+        cella[10] = prezzo if cella[10] is None else max(cella[10], prezzo)
+        cella[11] += cella[5] is not None and prezzo < cella[5]
+    return [tuple(c) for c in celle.values()]
+
+def ricostruisci_cubo(conn, file_vini=FILE_VINI):
+    """Ricalcola da zero il cubo dall'intero storico (prima apertura o prezzi base cambiati)."""
+    righe = conn.execute(f"SELECT {', '.join(COLONNE_STORICO)} FROM storico_prezzi ORDER BY rowid").fetchall()
+    celle = _aggrega(righe, carica_prezzi_base(file_vini))
+    with conn:
+        conn.execute("DELETE FROM cubo_giornaliero")
+        conn.executemany(SQL_UPSERT_CUBO, celle)
+    print(f"🧊 Cubo giornaliero ricostruito: {len(righe)} rilevazioni -> {len(celle)} righe aggregate")
+
+def apri_archivio(file_archivio=FILE_ARCHIVIO, file_csv=FILE_CSV):
+    nuovo = not os.path.exists(file_archivio)
+    conn = sqlite3.connect(file_archivio)
+    with conn:
+        conn.executescript(SCHEMA + SCHEMA_CUBO)
+        if nuovo and os.path.exists(file_csv):
+            _importa_csv(conn, file_csv)
+    # Archivi creati prima del cubo: lo si popola una volta sola dallo storico esistente
+    if (conn.execute("SELECT 1 FROM cubo_giornaliero LIMIT 1").fetchone() is None
+            and conn.execute("SELECT 1 FROM storico_prezzi LIMIT 1").fetchone() is not None):
+        ricostruisci_cubo(conn)
+    return conn
+
+def aggiungi_rilevazioni(record, file_archivio=FILE_ARCHIVIO, file_csv=FILE_CSV, file_vini=FILE_VINI):
+    """Accoda le rilevazioni della notte al database e al CSV: costo proporzionale alle sole righe nuove.
+    Il cubo giornaliero viene aggiornato nella stessa transazione, così non resta mai indietro."""
+    if not record:
+        return 0
+    righe = [tuple(_valore_db(c, r.get(c)) for c in COLONNE_STORICO) for r in record]
+
+    conn = apri_archivio(file_archivio, file_csv)
+    try:
+        with span('scrittura_db'), conn:
+            conn.executemany(f"INSERT INTO storico_prezzi VALUES ({', '.join('?' * len(COLONNE_STORICO))})", righe)
+            conn.executemany(SQL_UPSERT_CUBO, _aggrega(righe, carica_prezzi_base(file_vini)))
+    finally:
+        conn.close()
+
+    scrivi_intestazione = not os.path.exists(file_csv) or os.path.getsize(file_csv) == 0
+    with span('scrittura_csv'), open(file_csv, 'a', encoding='utf-8-sig' if scrivi_intestazione else 'utf-8', newline='') as f:
+        scrittore = csv.writer(f, delimiter=';', lineterminator='\n')
+        if scrivi_intestazione:
+            scrittore.writerow(COLONNE_STORICO)
+        scrittore.writerows([_valore_csv(v) for v in riga] for riga in righe)
+    return len(righe)
+
+def esporta_csv(file_archivio=FILE_ARCHIVIO, file_csv=FILE_CSV):
+    """Rigenera da zero il CSV per Next.js (da usare solo se il file va ricostruito)."""
+    conn = apri_archivio(file_archivio, file_csv)
+    try:
+        cursore = conn.execute(f"SELECT {', '.join(COLONNE_STORICO)} FROM storico_prezzi ORDER BY rowid")
+        with open(file_csv, 'w', encoding='utf-8-sig', newline='') as f:
+            scrittore = csv.writer(f, delimiter=';', lineterminator='\n')
+            scrittore.writerow(COLONNE_STORICO)
+            scrittore.writerows([_valore_csv(v) for v in riga] for riga in cursore)
+    finally:
+        conn.close()
+    print(f"✅ CSV storico esportato in: {file_csv}")
+
+def leggi_storico(file_archivio=FILE_ARCHIVIO, file_csv=FILE_CSV):
+    """Restituisce lo storico come DataFrame (colonne in maiuscolo, come nel CSV)."""
+    conn = apri_archivio(file_archivio, file_csv)
+    try:
+        return pd.read_sql_query(f"SELECT {', '.join(COLONNE_STORICO)} FROM storico_prezzi ORDER BY rowid", conn)
+    finally:
+        conn.close()
+
+def leggi_cubo(file_archivio=FILE_ARCHIVIO, file_csv=FILE_CSV):
+    """Restituisce il cubo giornaliero come DataFrame, con GIORNO già in datetime e PREZZO_MEDIO del giorno."""
+    conn = apri_archivio(file_archivio, file_csv)
+    try:
+        df = pd.read_sql_query(f"SELECT {', '.join(COLONNE_CUBO)} FROM cubo_giornaliero", conn)
+    finally:
+        conn.close()
+    df['GIORNO'] = pd.to_datetime(df['GIORNO'], format='%Y-%m-%d')
+    df['PREZZO_MEDIO'] = df['SOMMA_PREZZO'] / df['N_PREZZI'].where(df['N_PREZZI'] > 0)
+    return df
+
+if __name__ == "__main__":
+    if '--esporta' in sys.argv:
+        esporta_csv()
+    elif '--ricostruisci-cubo' in sys.argv:
+        connessione = apri_archivio()
+        try:
+            ricostruisci_cubo(connessione)
+        finally:
+            connessione.close()
+    else:
+        print("Uso: python archivio_prezzi.py --esporta            (rigenera storico_prezzi.csv dall'archivio)")
+        print("     python archivio_prezzi.py --ricostruisci-cubo  (ricalcola il cubo giornaliero, es. dopo aver cambiato i PREZZO_BASE)")
@@ -0,0 +1,63 @@
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+# Il benchmark si lancia dalla root del progetto: python benchmark/benchmark_destinazioni.py [righe] [latenza_sheets_s]
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from destinazioni_righe import DestinazioneSheets, DestinazioneCsv, DestinazioneSqlite
+from sheets_finto import FoglioFinto
+
+# Le righe sono quelle di scraper_reale.py; il foglio è quello finto, con una latenza per round trip
+# simile a quella dell'API di Google Sheets. Prima: una append_row per prezzo; ora: un buffer per giro.
+RIGHE = 200
+LATENZA_SHEETS = 0.3
+COLONNE = ['DATA_ESTRAZIONE', 'ID_PRODOTTO', 'NOME_PRODOTTO', 'SITO_ORIGINE', 'PREZZO_RILEVATO', 'LINK_SCRAPING']
+
+def righe_di_prova(quante):
+    data = datetime.now().strftime("%d/%m/%Y %H:%M")
+    return [[data, f'WINE-{n % 50:03d}', f'Prosecco di prova {n % 50}', ('Tannico', 'Spirit Italia', 'Land of Wines')[n % 3],
+             round(9.9 + n % 7, 2), f'https://example.com/vino/{n}'] for n in range(quante)]
+
+def una_riga_alla_volta(righe, latenza):
+    foglio = FoglioFinto(latenza=latenza)
+    for riga in righe:
+        foglio.append_row(riga)
+    return foglio.chiamate
+
+def con_destinazione(destinazione, righe):
+    with destinazione:
+        for riga in righe:
+            destinazione.aggiungi(riga)
+    return destinazione.chiamate
+
+def cronometra(funzione, *argomenti):
+    inizio = time.perf_counter()
+    chiamate = funzione(*argomenti)
+    return time.perf_counter() - inizio, chiamate
+
+def main():
+    quante = int(sys.argv[1]) if len(sys.argv) > 1 else RIGHE
+    latenza = float(sys.argv[2]) if len(sys.argv) > 2 else LATENZA_SHEETS
+    righe = righe_di_prova(quante)
+    print(f"{quante} righe, {latenza * 1000:.0f} ms per round trip verso il foglio finto\n")
+
+    with tempfile.TemporaryDirectory() as cartella:
+        risultati = [
+            ('Sheets, append_row per riga', cronometra(una_riga_alla_volta, righe, latenza)),
+            ('Sheets, append_rows a fine giro', cronometra(con_destinazione, DestinazioneSheets(COLONNE, foglio=FoglioFinto(latenza=latenza)), righe)),
+            ('CSV locale', cronometra(con_destinazione, DestinazioneCsv(COLONNE, os.path.join(cartella, 'prezzi.csv')), righe)),
+            ('SQLite locale', cronometra(con_destinazione, DestinazioneSqlite(COLONNE, os.path.join(cartella, 'prezzi.db')), righe)),
+        ]
+
+    print(f"{'DESTINAZIONE':<34}{'chiamate':>10}{'secondi':>10}")
+    print("-" * 54)
+    for nome, (secondi, chiamate) in risultati:
+        print(f"{nome:<34}{chiamate:>10}{secondi:>10.2f}")
+    (s_prima, c_prima), (s_ora, c_ora) = risultati[0][1], risultati[1][1]
+    print(f"\nSheets: {c_prima} -> {c_ora} richieste di quota, {s_prima / s_ora:.0f}x più veloce")
+
+if __name__ == "__main__":
+    main()
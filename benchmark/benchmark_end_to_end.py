@@ -0,0 +1,184 @@
+import asyncio
+import contextlib
+import csv
+import hashlib
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+from aiohttp import web
+
+# Il benchmark si lancia dalla root del progetto:
+#   python benchmark/benchmark_end_to_end.py [listing] [latenza_mediana_s] [tasso_errori] [pausa_cortesia]
+# avvia_scraping gira davvero, dall'anagrafica all'archivio, contro un finto marketplace locale che serve le
+# pagine registrate in benchmark/fixtures con latenza log-normale ed errori 503 casuali. Due notti di fila:
+# la prima a cache vuota, la seconda con ETag (304) come succede in produzione. I listing si distribuiscono
+# su tutte le fixture di attesi.json: pagine gonfiate e pagine ridotte con sconti e stockout, così
+# l'accuratezza conta anche i rami alternativi degli estrattori.
+RADICE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RADICE)
+
+import bot_prezzi
+from archivio_prezzi import leggi_storico
+from estrattori_siti import normalizza_sito
+
+DIR_FIXTURES = os.path.join(RADICE, 'benchmark', 'fixtures')
+LISTING = 1000
+LATENZA_MEDIANA = 0.15
+TASSO_ERRORI = 0.02
+# Le pause di cortesia vere (0.5-1.5s tra richieste allo stesso sito) dominerebbero la misura:
+# di default si azzerano per misurare il motore, con un fattore > 0 si riscalano quelle di LIMITI_SITI
+PAUSA_CORTESIA = 0.0
+SEME = 11
+
+
+class MarketplaceFinto:
+    """Server HTTP locale: /<fixture>/<n> restituisce la pagina registrata del sito, con ETag."""
+    def __init__(self, pagine, latenza_mediana, tasso_errori, seme=SEME):
+        self.pagine = pagine
+        self.etag = {sito: f'"{hashlib.sha1(contenuto).hexdigest()[:16]}"' for sito, contenuto in pagine.items()}
+        self.latenza_mediana = latenza_mediana
+        self.tasso_errori = tasso_errori
+        self.caso = random.Random(seme)
+        self.errori = set()   # URL (percorso) a cui è stato restituito un errore nell'ultima notte
+        self.porta = None
+        self._pronto = threading.Event()
+
+    async def _pagina(self, richiesta):
+        sito = richiesta.match_info['sito']
+        if sito not in self.pagine:
+            return web.Response(status=404)
+        await asyncio.sleep(self.latenza_mediana * self.caso.lognormvariate(0, 0.5))
+        if self.caso.random() < self.tasso_errori:
+            self.errori.add(richiesta.path)
+            return web.Response(status=503)
+        if richiesta.headers.get('If-None-Match') == self.etag[sito]:
+            return web.Response(status=304, headers={'ETag': self.etag[sito]})
+        return web.Response(body=self.pagine[sito], content_type='text/html', headers={'ETag': self.etag[sito]})
+
+    def _servi(self):
+        loop = asyncio.new_event_loop()
+        app = web.Application()
+        app.router.add_get('/{sito}/{n}', self._pagina)
+        runner = web.AppRunner(app, access_log=None)
+        loop.run_until_complete(runner.setup())
+        sito = web.TCPSite(runner, '127.0.0.1', 0)
+        loop.run_until_complete(sito.start())
+        self.porta = sito._server.sockets[0].getsockname()[1]
+        self._pronto.set()
+        loop.run_forever()
+
+    def avvia(self):
+        threading.Thread(target=self._servi, name='marketplace-finto', daemon=True).start()
+        self._pronto.wait()
+        return f"http://127.0.0.1:{self.porta}"
+
+
+def scrivi_anagrafica(percorso, base_url, attesi, listing):
+    """database_vini.csv sintetico: listing distribuiti sui siti delle fixture, PREZZO_BASE basso (nessun trigger SOTTO_PREZZO)."""
+    fixture = list(attesi)
+    with open(percorso, 'w', encoding='utf-8-sig', newline='') as f:
+        scrittore = csv.writer(f, delimiter=';')
+        scrittore.writerow(['CANTINA', 'ID_PRODOTTO', 'NOME_PRODOTTO', 'PREZZO_BASE', 'SITO_ORIGINE', 'LINK_SCRAPING'])
+        for n in range(listing):
+            sito = fixture[n % len(fixture)]
+            scrittore.writerow([f'Cantina {n % 40}', f'BENCH-{n:05d}', f'Vino di prova {n}', '1',
+                                attesi[sito]['sito_origine'], f'{base_url}/{sito}/{n}'])
+
+def cronometra_download(latenze):
+    """Avvolge il download di bot_prezzi per raccogliere la latenza vista dal bot (attesa del turno inclusa)."""
+    originale = bot_prezzi._scarica_pagina
+
+    async def cronometrata(sessione, limitatore, url, intestazioni):
+        inizio = time.perf_counter()
+        try:
+            return await originale(sessione, limitatore, url, intestazioni)
+        finally:
+            latenze.setdefault(url.split('/')[-2], []).append(time.perf_counter() - inizio)
+    bot_prezzi._scarica_pagina = cronometrata
+    return originale
+
+def accuratezza(storico, attesi, errori):
+    """Righe della notte confrontate con i valori attesi della fixture; le richieste fallite si contano a parte."""
+    corrette, sbagliate, fallite = 0, 0, 0
+    for riga in storico.itertuples(index=False):
+        percorso = '/' + '/'.join(riga.LINK_SCRAPING.split('/')[-2:])
+        if percorso in errori:
+            fallite += 1
+            continue
+        atteso = attesi[percorso.split('/')[1]]
+        prezzo = None if riga.PREZZO_RILEVATO is None or np.isnan(riga.PREZZO_RILEVATO) else riga.PREZZO_RILEVATO
+        scontato = None if riga.PREZZO_SCONTATO is None or np.isnan(riga.PREZZO_SCONTATO) else riga.PREZZO_SCONTATO
+        if (prezzo, scontato, riga.STOCKOUT == 'SI') == (atteso['prezzo_originale'], atteso['prezzo_scontato'], atteso['stockout']):
+            corrette += 1
+        else:
+            sbagliate += 1
+    return corrette, sbagliate, fallite
+
+def una_notte(server, attesi):
+    server.errori = set()
+    latenze = {}
+    righe_prima = len(leggi_storico())
+    originale = cronometra_download(latenze)
+    inizio = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            bot_prezzi.avvia_scraping(tutti=True, screenshot=False)
+    finally:
+        bot_prezzi._scarica_pagina = originale
+    secondi = time.perf_counter() - inizio
+    return secondi, latenze, accuratezza(leggi_storico().iloc[righe_prima:], attesi, server.errori)
+
+def stampa(titolo, listing, secondi, latenze, esito):
+    corrette, sbagliate, fallite = esito
+    print(f"\n{titolo}: {listing} listing in {secondi:.1f}s -> {listing / secondi:.1f} listing/s")
+    print(f"{'FIXTURE':<24}{'richieste':>10}{'p50 ms':>9}{'p95 ms':>9}")
+    print("-" * 52)
+    for sito, valori in sorted(latenze.items()):
+        print(f"{sito:<24}{len(valori):>10}{np.percentile(valori, 50) * 1000:>9.0f}{np.percentile(valori, 95) * 1000:>9.0f}")
+    verificate = corrette + sbagliate
+    print(f"Accuratezza estrazione: {corrette}/{verificate} ({corrette / verificate:.1%}) "
+          f"{'✅' if not sbagliate else '❌'} | {fallite} richieste fallite per errore simulato")
+
+def main():
+    listing = int(sys.argv[1]) if len(sys.argv) > 1 else LISTING
+    latenza = float(sys.argv[2]) if len(sys.argv) > 2 else LATENZA_MEDIANA
+    tasso_errori = float(sys.argv[3]) if len(sys.argv) > 3 else TASSO_ERRORI
+    pausa_cortesia = float(sys.argv[4]) if len(sys.argv) > 4 else PAUSA_CORTESIA
+
+    with open(os.path.join(DIR_FIXTURES, 'attesi.json'), encoding='utf-8') as f:
+        attesi = json.load(f)
+    pagine = {}
+    for sito in attesi:
+        with open(os.path.join(DIR_FIXTURES, f'{sito}.html'), 'rb') as f:
+            pagine[sito] = f.read()
+
+    for limite in list(bot_prezzi.LIMITI_SITI.values()) + [bot_prezzi.LIMITE_DEFAULT]:
+        limite['pausa'] *= pausa_cortesia
+    print(f"{listing} listing su {len(attesi)} siti, latenza mediana {latenza * 1000:.0f} ms, "
+          f"errori {tasso_errori:.0%}, pause di cortesia x{pausa_cortesia}")
+
+    server = MarketplaceFinto(pagine, latenza, tasso_errori)
+    base_url = server.avvia()
+    cartella_originale = os.getcwd()
+    with tempfile.TemporaryDirectory() as cartella:
+        # avvia_scraping usa percorsi relativi (public/data, .cache): si lavora in una cartella usa e getta
+        os.chdir(cartella)
+        try:
+            os.makedirs(os.path.join('public', 'data'))
+            scrivi_anagrafica(os.path.join('public', 'data', 'database_vini.csv'), base_url, attesi, listing)
+            # Sono siti diversi solo per il bot: tutti puntano a 127.0.0.1, il limitatore resta per SITO_ORIGINE
+            assert all(normalizza_sito(a['sito_origine']) in bot_prezzi.LIMITI_SITI for a in attesi.values())
+            stampa("Notte 1 (cache vuota)", listing, *una_notte(server, attesi))
+            stampa("Notte 2 (ETag, 304)", listing, *una_notte(server, attesi))
+        finally:
+            os.chdir(cartella_originale)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+import json
+import os
+import sys
+import time
+
+# Il benchmark si lancia dalla root del progetto: python benchmark/benchmark_estrattori.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from estrazione_html import PaginaProdotto, LexborHTMLParser
+from estrattori_siti import trova_estrattore
+
+# Fixture: <sito>.html sono pagine sintetiche gonfiate a ~70 KB (menu, stili, schede correlate) per misurare
+# la velocità del parsing; <sito>_<caso>.html sono pagine ridotte al solo markup che gli estrattori cercano
+# sui siti veri, una per ramo alternativo (sconto Tannico, stockout, prezzo dal testo, meta prima dello span).
+# I valori attesi di entrambe stanno in attesi.json e valgono anche per tests/test_estrattori.py.
+DIR_FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+RIPETIZIONI = 50
+
+def misura(contenuto, estrattore, parser):
+    inizio = time.perf_counter()
+    for _ in range(RIPETIZIONI):
+        dati = estrattore.estrai(PaginaProdotto(contenuto, parser=parser))
+    return (time.perf_counter() - inizio) / RIPETIZIONI * 1000, dati
+
+def main():
+    if LexborHTMLParser is None:
+        print("⚠️ selectolax non installato: il percorso veloce coincide con BeautifulSoup.")
+
+    with open(os.path.join(DIR_FIXTURES, 'attesi.json'), encoding='utf-8') as f:
+        attesi = json.load(f)
+
+    print(f"{'FIXTURE':<24}{'KB':>7}{'bs4 ms':>10}{'veloce ms':>11}{'speedup':>9}  ESITO")
+    print("-" * 72)
+    for sito, atteso in attesi.items():
+        estrattore = trova_estrattore(atteso['sito_origine'])
+        with open(os.path.join(DIR_FIXTURES, f'{sito}.html'), 'rb') as f:
+            contenuto = f.read()
+
+        ms_bs4, dati_bs4 = misura(contenuto, estrattore, 'bs4')
+        ms_veloce, dati_veloce = misura(contenuto, estrattore, 'auto')
+
+        atteso = {k: v for k, v in atteso.items() if k in dati_veloce}
+        esito = "✅" if dati_veloce == atteso and dati_bs4 == atteso else f"❌ {dati_veloce} / {dati_bs4}"
+        print(f"{sito:<24}{len(contenuto) / 1024:>7.0f}{ms_bs4:>10.2f}{ms_veloce:>11.2f}{ms_bs4 / ms_veloce:>8.1f}x  {esito}")
+
+if __name__ == "__main__":
+    main()
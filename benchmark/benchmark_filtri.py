@@ -0,0 +1,81 @@
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+# Il benchmark si lancia dalla root del progetto: python benchmark/benchmark_filtri.py [righe]
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from indici_dashboard import indicizza, seleziona, memoria_mb, CHIAVI_PREZZI, CATEGORICHE_PREZZI
+
+RIGHE = 1_000_000
+RIPETIZIONI = 50
+SITI = ['Tannico', 'Vino.com', 'Callmewine', 'Xtrawine', 'Bernabei', 'Vivino.com']
+
+def storico_sintetico(righe, seme=7):
+    """Storico finto con la stessa forma del cubo: ~40 vini di 8 cantine, 6 siti, anni di giorni."""
+    rng = np.random.default_rng(seme)
+    cantine = [f"Cantina {i:02d}" for i in range(8)]
+    vini = [(cantine[i % len(cantine)], f"Vino {i:03d} DOCG", f"VN-{i:03d}") for i in range(40)]
+    scelta = rng.integers(0, len(vini), righe)
+    giorni = pd.Timestamp('2015-01-01') + pd.to_timedelta(rng.integers(0, 365 * 11, righe), unit='D')
+    prezzi = np.round(rng.uniform(8, 60, righe), 2)
+    return pd.DataFrame({
+        'ID_PRODOTTO': [vini[i][2] for i in scelta],
+        'CANTINA': [vini[i][0] for i in scelta],
+        'NOME_PRODOTTO': [vini[i][1] for i in scelta],
+        'SITO_ORIGINE': rng.choice(SITI, righe),
+        'GIORNO': giorni,
+        'N_RILEVAZIONI': 1,
+        'N_PREZZI': 1,
+        'SOMMA_PREZZO': prezzi,
+        'N_SOTTO_MAP': (prezzi < 20).astype(int),
+    })
+
+def cronometra(funzione):
+    funzione()  # riscaldamento
+    inizio = time.perf_counter()
+    for _ in range(RIPETIZIONI):
+        risultato = funzione()
+    return (time.perf_counter() - inizio) / RIPETIZIONI * 1000, risultato
+
+def main():
+    righe = int(sys.argv[1]) if len(sys.argv) > 1 else RIGHE
+    print(f"Generazione storico sintetico da {righe:,} righe...")
+    grezzo = storico_sintetico(righe)
+    cantina, vino = 'Cantina 03', 'Vino 011 DOCG'
+    inizio, fine = pd.Timestamp('2020-01-01'), pd.Timestamp('2021-06-30')
+
+    t0 = time.perf_counter()
+    indicizzato = indicizza(grezzo, CHIAVI_PREZZI, CATEGORICHE_PREZZI)
+    ms_indice = (time.perf_counter() - t0) * 1000
+
+    def maschera():
+        return grezzo[(grezzo['CANTINA'] == cantina) & (grezzo['NOME_PRODOTTO'] == vino) & (grezzo['GIORNO'].between(inizio, fine))]
+
+    def fetta():
+        return seleziona(indicizzato, cantina, vino, inizio=inizio, fine=fine)
+
+    def fetta_vino():
+        return seleziona(indicizzato, cantina, vino, reimposta=False)
+
+    def maschera_vino():
+        return grezzo[(grezzo['CANTINA'] == cantina) & (grezzo['NOME_PRODOTTO'] == vino)]
+
+    ms_maschera, ris_maschera = cronometra(maschera)
+    ms_fetta, ris_fetta = cronometra(fetta)
+    ms_maschera_vino, _ = cronometra(maschera_vino)
+    ms_fetta_vino, _ = cronometra(fetta_vino)
+
+    esito = "✅" if len(ris_maschera) == len(ris_fetta) and np.isclose(ris_maschera['SOMMA_PREZZO'].sum(), ris_fetta['SOMMA_PREZZO'].sum()) else "❌"
+    print(f"Costruzione indice (una volta per caricamento): {ms_indice:.0f} ms")
+    print(f"Memoria: {memoria_mb(grezzo):.1f} MB (stringhe) -> {memoria_mb(indicizzato):.1f} MB (categoriche + indice)")
+    print(f"{'FILTRO':<28}{'maschera ms':>13}{'indice ms':>11}{'speedup':>9}")
+    print("-" * 61)
+    print(f"{'vino + intervallo date':<28}{ms_maschera:>13.2f}{ms_fetta:>11.2f}{ms_maschera / ms_fetta:>8.1f}x  {esito} {len(ris_fetta)} righe")
+    print(f"{'solo vino':<28}{ms_maschera_vino:>13.2f}{ms_fetta_vino:>11.2f}{ms_maschera_vino / ms_fetta_vino:>8.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+# Il benchmark si lancia dalla root del progetto: python benchmark/benchmark_giornale.py [recensioni] [lotto]
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot_sentiment_ai import COLONNE_ELABORATO
+from giornale_csv import GiornaleCsv
+
+# Stesso flusso di record del motore sentiment, scritti a gruppi di 'lotto' (un batch Gemini completato):
+# prima un DataFrame e una riapertura del CSV in append a ogni gruppo, ora un giornale aperto con fsync
+RECENSIONI = 2000
+LOTTO = 10
+
+def record_di_prova(quanti):
+    return [{
+        'DATA_COMMENTO': f'{1 + n % 28:02d}/{1 + n % 12:02d}/2025', 'ID_PRODOTTO': f'VS-CART-LR-{n % 9:02d}',
+        'NOME_PRODOTTO': 'Cartizze Vigna La Rivetta', 'CATEGORIA_PRODOTTO': 'Bollicine', 'SITO_ECOMMERCE': 'Vivino',
+        'RATING_ORIGINALE': 3.5 + (n % 4) / 2, 'TESTO_ORIGINALE': f'Heel mooi glas; fris en fruitig, recensione {n}',
+        'TESTO_COMMENTO': f'Un bicchiere molto bello; fresco e fruttato, recensione {n}', 'SENTIMENT_SCORE': 'Positivo',
+        'PAROLE_CHIAVE_ESTRATTE': 'fresco, fruttato',
+    } for n in range(quanti)]
+
+def con_pandas(percorso, records, lotto):
+    # Il percorso di prima (salva_record): os.path.exists, DataFrame e to_csv in append a ogni gruppo
+    for i in range(0, len(records), lotto):
+        df = pd.DataFrame(records[i:i + lotto])
+        if not os.path.exists(percorso):
+            df.to_csv(percorso, sep=';', encoding='utf-8-sig', index=False)
+        else:
+            df.to_csv(percorso, sep=';', encoding='utf-8-sig', index=False, mode='a', header=False)
+
+def con_giornale(percorso, records, lotto):
+    with GiornaleCsv(percorso, COLONNE_ELABORATO) as giornale:
+        for i in range(0, len(records), lotto):
+            giornale.scrivi_tutti(records[i:i + lotto])
+            giornale.commit()
+
+def cronometra(funzione, *argomenti):
+    inizio, cpu = time.perf_counter(), time.process_time()
+    funzione(*argomenti)
+    return time.perf_counter() - inizio, time.process_time() - cpu
+
+def main():
+    quanti = int(sys.argv[1]) if len(sys.argv) > 1 else RECENSIONI
+    lotto = int(sys.argv[2]) if len(sys.argv) > 2 else LOTTO
+    records = record_di_prova(quanti)
+    print(f"{quanti} recensioni scritte a gruppi di {lotto} ({quanti // lotto} commit)\n")
+
+    with tempfile.TemporaryDirectory() as cartella:
+        prima, ora = os.path.join(cartella, 'prima.csv'), os.path.join(cartella, 'ora.csv')
+        s_prima, cpu_prima = cronometra(con_pandas, prima, records, lotto)
+        s_ora, cpu_ora = cronometra(con_giornale, ora, records, lotto)
+        uguali = pd.read_csv(prima, sep=';', encoding='utf-8-sig').equals(pd.read_csv(ora, sep=';', encoding='utf-8-sig'))
+
+    print(f"{'PERCORSO':<30}{'secondi':>9}{'CPU µs/rec':>12}")
+    print("-" * 51)
+    print(f"{'pandas to_csv in append':<30}{s_prima:>9.2f}{cpu_prima / quanti * 1e6:>12.0f}")
+    print(f"{'giornale (write + fsync)':<30}{s_ora:>9.2f}{cpu_ora / quanti * 1e6:>12.0f}")
+    print(f"\nCPU per record {cpu_prima / cpu_ora:.1f}x in meno, contenuto identico: {'✅' if uguali else '❌'}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+# Il benchmark si lancia dalla root del progetto: python benchmark/benchmark_parsing.py [righe]
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lettura_dati import converti_date, converti_prezzi
+
+RIGHE = 500_000
+
+def colonne_sintetiche(righe, seme=3):
+    """Date nei tre formati presenti nei CSV (in prevalenza %d/%m/%Y) e prezzi con virgola o punto,
+    insieme ai valori veri con cui confrontare il risultato."""
+    rng = np.random.default_rng(seme)
+    giorni = pd.Timestamp('2018-01-01') + pd.to_timedelta(rng.integers(0, 3000, righe), unit='D')
+    ore = pd.to_timedelta(rng.integers(0, 24 * 60, righe), unit='min')
+    tipo = rng.choice(3, righe, p=[0.9, 0.08, 0.02])
+    date = np.where(tipo == 0, giorni.strftime('%d/%m/%Y'),
+                    np.where(tipo == 1, giorni.strftime('%Y-%m-%d'), (giorni + ore).strftime('%d/%m/%Y %H:%M')))
+    valori = np.round(rng.uniform(5, 90, righe), 2).astype(str)
+    prezzi = np.where(rng.random(righe) < 0.5, np.char.replace(valori, '.', ','), valori)
+    vere = pd.Series(np.where(tipo == 2, giorni + ore, giorni))
+    return pd.Series(date), pd.Series(prezzi), vere, pd.Series(valori.astype(float))
+
+def cronometra(funzione):
+    inizio = time.perf_counter()
+    risultato = funzione()
+    return (time.perf_counter() - inizio) * 1000, risultato
+
+def prezzo_riga_per_riga(valore):
+    # Come faceva bot_prezzi.py con PREZZO_BASE, una riga alla volta
+    try:
+        return float(str(valore).replace(',', '.'))
+    except ValueError:
+        return None
+
+def main():
+    righe = int(sys.argv[1]) if len(sys.argv) > 1 else RIGHE
+    date, prezzi, date_vere, prezzi_veri = colonne_sintetiche(righe)
+    print(f"{righe:,} valori per colonna\n")
+
+    ms_mixed, vecchie = cronometra(lambda: pd.to_datetime(date, format='mixed', dayfirst=True, errors='coerce'))
+    ms_formati, nuove = cronometra(lambda: converti_date(date))
+    # format='mixed' con dayfirst=True scambia giorno e mese nelle date ISO con giorno <= 12
+    errate_prima = int((vecchie != date_vere).sum())
+    errate_ora = int((nuove != date_vere).sum())
+
+    ms_riga, prezzi_riga = cronometra(lambda: prezzi.map(prezzo_riga_per_riga))
+    ms_vettoriale, prezzi_vett = cronometra(lambda: converti_prezzi(prezzi))
+    esito_prezzi = "✅" if np.allclose(prezzi_riga.astype(float), prezzi_veri) and np.allclose(prezzi_vett, prezzi_veri) else "❌"
+
+    print(f"{'COLONNA':<10}{'prima ms':>11}{'ora ms':>10}{'speedup':>9}")
+    print("-" * 40)
+    print(f"{'date':<10}{ms_mixed:>11.0f}{ms_formati:>10.0f}{ms_mixed / ms_formati:>8.1f}x  (format='mixed' vs formati noti)")
+    print(f"{'prezzi':<10}{ms_riga:>11.0f}{ms_vettoriale:>10.0f}{ms_riga / ms_vettoriale:>8.1f}x  {esito_prezzi}  (riga per riga vs vettoriale)")
+    print(f"\nDate errate rispetto ai valori veri: {errate_prima:,} con format='mixed', {errate_ora:,} con i formati noti")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+import asyncio
+import glob
+import io
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from PIL import Image, ImageDraw, ImageFont
+
+# Il benchmark si lancia dalla root del progetto: python benchmark/benchmark_screenshot.py [catture] [latenza_s]
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from timbro_screenshot import salva_timbrato
+
+# Navigazione e attesa della pagina sono simulate con una pausa: il confronto misura solo quanto
+# il timbro inline (file PNG temporaneo + WebP nel ciclo degli scatti) rallenta le catture
+CATTURE = 60
+LATENZA_PAGINA = 0.5
+PAGINE_PARALLELE = 4
+URL = "https://www.tannico.it/vino-rosso/amarone-della-valpolicella-classico-docg-2018-bottiglia-da-75-cl.html"
+
+def screenshot_di_prova(quanti=8):
+    """Byte PNG 1280x800 come quelli di Playwright, ricavati dalle prove già salvate (o sintetici)."""
+    percorsi = sorted(glob.glob(os.path.join('public', 'screenshots', '*.webp')))[:quanti]
+    immagini = [Image.open(p).convert('RGB').resize((1280, 800)) for p in percorsi]
+    if not immagini:
+        immagini = [Image.new('RGB', (1280, 800), (240, 236, 230))]
+        ImageDraw.Draw(immagini[0]).text((100, 100), "Amarone 2018 - 39,90 €", fill=(20, 20, 20))
+    png = []
+    for img in immagini:
+        buffer = io.BytesIO()
+        img.save(buffer, 'PNG')
+        png.append(buffer.getvalue())
+    return png
+
+def timbro_inline(png, cartella, n, url, motivo):
+    # Il percorso di prima: PNG su disco, riapertura, font caricato e fascia disegnata a ogni scatto
+    temporaneo = os.path.join(cartella, f"temp_{n}.png")
+    with open(temporaneo, 'wb') as f:
+        f.write(png)
+    img = Image.open(temporaneo)
+    draw = ImageDraw.Draw(img)
+    larghezza, altezza = img.size
+    draw.rectangle([(0, altezza - 90), (larghezza, altezza)], fill=(0, 0, 0))
+    font = ImageFont.load_default()
+    draw.text((20, altezza - 80), f"DATA/ORA: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}", fill=(255, 255, 255), font=font)
+    draw.text((20, altezza - 55), f"URL: {url[:80]}...", fill=(255, 255, 0), font=font)
+    draw.text((20, altezza - 30), f"NOTIFICA: VIOLAZIONE COMMERCIALE [{motivo}]", fill=(255, 100, 100), font=font)
+    img.save(os.path.join(cartella, f"prima_{n}.webp"), "WEBP", quality=75)
+    os.remove(temporaneo)
+
+async def catture(screenshot, cartella, catture, latenza, pool=None):
+    coda = asyncio.Queue()
+    for n in range(catture):
+        coda.put_nowait(n)
+    timbrature = []
+
+    async def pagina():
+        while not coda.empty():
+            n = coda.get_nowait()
+            await asyncio.sleep(latenza)  # goto + attesa pagina pronta
+            png = screenshot[n % len(screenshot)]
+            if pool is None:
+                timbro_inline(png, cartella, n, URL, 'SOTTO_PREZZO')
+            else:
+                timbrature.append(asyncio.get_running_loop().run_in_executor(
+                    pool, salva_timbrato, png, os.path.join(cartella, f"ora_{n}.webp"), URL, 'SOTTO_PREZZO', datetime.now()))
+
+    await asyncio.gather(*[pagina() for _ in range(PAGINE_PARALLELE)])
+    await asyncio.gather(*timbrature)
+
+def cronometra(funzione):
+    inizio = time.perf_counter()
+    funzione()
+    return time.perf_counter() - inizio
+
+def main():
+    n_catture = int(sys.argv[1]) if len(sys.argv) > 1 else CATTURE
+    latenza = float(sys.argv[2]) if len(sys.argv) > 2 else LATENZA_PAGINA
+    screenshot = screenshot_di_prova()
+    print(f"{n_catture} catture, {PAGINE_PARALLELE} pagine in parallelo, {latenza}s di navigazione simulata, {os.cpu_count()} CPU\n")
+
+    with tempfile.TemporaryDirectory() as cartella:
+        s_prima = cronometra(lambda: asyncio.run(catture(screenshot, cartella, n_catture, latenza)))
+        with ThreadPoolExecutor(max_workers=os.cpu_count() or 2) as pool:
+            s_ora = cronometra(lambda: asyncio.run(catture(screenshot, cartella, n_catture, latenza, pool)))
+        prodotte = len(glob.glob(os.path.join(cartella, 'ora_*.webp')))
+
+    print(f"{'PERCORSO':<34}{'secondi':>9}{'catture/min':>13}")
+    print("-" * 56)
+    print(f"{'timbro inline (PNG su disco)':<34}{s_prima:>9.1f}{n_catture / s_prima * 60:>13.0f}")
+    print(f"{'timbro nel pool (byte in memoria)':<34}{s_ora:>9.1f}{n_catture / s_ora * 60:>13.0f}")
+    print(f"\nSpeedup {s_prima / s_ora:.1f}x, {prodotte}/{n_catture} WebP prodotti dal pool")
+
+if __name__ == "__main__":
+    main()
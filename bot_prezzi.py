@@ -1,12 +1,21 @@
-import requests
-from bs4 import BeautifulSoup
+import asyncio
+import aiohttp
 import pandas as pd
 from datetime import datetime
-import re
-import json
 import os
-from playwright.sync_api import sync_playwright
-from PIL import Image, ImageDraw, ImageFont
+import sys
+import time
+from playwright.async_api import async_playwright
+from concurrent.futures import ThreadPoolExecutor
+from estrazione_html import PaginaProdotto
+from estrattori_siti import trova_estrattore, normalizza_sito, VERSIONE_ESTRATTORI
+from cache_http import CacheHttp, calcola_impronta
+from archivio_prezzi import aggiungi_rilevazioni
+from lettura_dati import leggi_database_vini
+from pianificatore_visite import pianifica, BUDGET_VISITE
+from timbro_screenshot import salva_timbrato
+from prove_fotografiche import aggiorna_prove
+from metriche import span, conta, giro
 
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
@@ -20,121 +29,83 @@ DIR_DATA = os.path.join('public', 'data')
 os.makedirs(DIR_SCREENSHOTS, exist_ok=True)
 os.makedirs(DIR_DATA, exist_ok=True)
 
-def pulisci_prezzo(testo):
-    if not testo: return None
-    try:
-        pulito = str(testo).replace('€', '').replace('\xa0', '').strip()
-        pulito = re.sub(r'[^\d,.-]', '', pulito).replace(',', '.')
-        return float(pulito)
-    except:
-        return None
-
-# --- ESTRATTORI ORIGINALI PRESERVATI ---
-def estrai_tannico(soup):
-    is_stockout = False
-    if soup and soup.text:
-        is_stockout = "non disponibile" in soup.text.lower()
-    p_orig, p_scont = None, None
-    try:
-        scripts = soup.find_all('script', type='application/ld+json')
-        for script in scripts:
-            if script.string and 'price' in script.string.lower():
-                match_price = re.search(r'"price":\s*"?(\d+[.,]?\d*)"?', script.string)
-                if match_price:
-                    p_orig = float(match_price.group(1).replace(',', '.'))
-                    break
-    except Exception: pass
-
-    if not p_orig:
-        try:
-            prezzo_tag = soup.find(attrs={"itemprop": "price"})
-            if prezzo_tag: p_orig = pulisci_prezzo(prezzo_tag.get('content') or prezzo_tag.text)
-        except Exception: pass
+# --- LIMITI DI CONCORRENZA E CORTESIA PER MARKETPLACE ---
+# max_paralleli: richieste contemporanee verso lo stesso sito
+# pausa: secondi minimi tra l'avvio di due richieste verso lo stesso sito
+LIMITI_SITI = {
+    'tannico': {'max_paralleli': 4, 'pausa': 0.5},
+    'vino.com': {'max_paralleli': 3, 'pausa': 1.0},
+    'callmewine': {'max_paralleli': 3, 'pausa': 1.0},
+    'xtrawine': {'max_paralleli': 2, 'pausa': 1.5},
+    'bernabei': {'max_paralleli': 2, 'pausa': 1.5},
+}
+LIMITE_DEFAULT = {'max_paralleli': 2, 'pausa': 1.5}
+MAX_CONNESSIONI_TOTALI = 16
+TIMEOUT_RICHIESTA = 15
 
-    if not p_orig:
-        try:
-            contenitore = soup.find('div', {'data-controller': 'price'}) or soup.find('div', class_=re.compile('price', re.I))
-            if contenitore:
-                scont_tag = contenitore.find('span', class_=re.compile('tw-text-blue|tw-text-red|discount'))
-                orig_tag = contenitore.find('span', class_=re.compile('tw-line-through|original'))
-                if scont_tag:
-                    p_scont = pulisci_prezzo(scont_tag.text)
-                    p_orig = pulisci_prezzo(orig_tag.text) if orig_tag else p_scont
-                else:
-                    base_tag = contenitore.find('span', class_=re.compile('tw-font-bold|current'))
-                    p_orig = pulisci_prezzo(base_tag.text) if base_tag else None
-        except Exception: pass
-    return {'prezzo_originale': p_orig, 'prezzo_scontato': p_scont, 'stockout': is_stockout}
-    
-def estrai_callmewine(soup):
-    is_stockout = False
-    if soup and soup.text:
-        is_stockout = "non disponibile" in soup.text.lower() or "esaurito" in soup.text.lower()
-    p_orig, p_scont = None, None
-    scripts = soup.find_all('script', type='application/ld+json')
-    for script in scripts:
+# --- MOTORE DI DOWNLOAD ASINCRONO (CONNESSIONI IN POOL, LIMITI PER SITO) ---
+class LimitatoreSito:
+    """Semaforo + pausa di cortesia condivisi da tutte le richieste verso lo stesso marketplace."""
+    def __init__(self, sito, max_paralleli, pausa):
+        self.sito = sito
+        self.semaforo = asyncio.Semaphore(max_paralleli)
+        self.pausa = pausa
+        self._lock = asyncio.Lock()
+        self._ultimo_avvio = None
+
+    async def attendi_turno(self):
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            if self._ultimo_avvio is not None:
+                attesa = self._ultimo_avvio + self.pausa - loop.time()
+                if attesa > 0:
+                    await asyncio.sleep(attesa)
+            self._ultimo_avvio = loop.time()
+
+async def _scarica_pagina(sessione, limitatore, url, intestazioni):
+    async with limitatore.semaforo:
+        with span('attesa_turno', sito=limitatore.sito):
+            await limitatore.attendi_turno()
         try:
-            dati = json.loads(script.string)
-            if 'offers' in dati and 'price' in dati['offers']:
-                p_orig = float(dati['offers']['price'])
-                break
-        except: continue
-    return {'prezzo_originale': p_orig, 'prezzo_scontato': p_scont, 'stockout': is_stockout}
-
-def estrai_vinocom(soup):
-    is_stockout = False
-    if soup and soup.text:
-        is_stockout = "non disponibile" in soup.text.lower()
-    p_orig, p_scont = None, None
-    tag_prezzo = soup.find(itemprop='price')
-    if tag_prezzo: p_orig = pulisci_prezzo(tag_prezzo.get('content') or tag_prezzo.text)
-    return {'prezzo_originale': p_orig, 'prezzo_scontato': p_scont, 'stockout': is_stockout}
-
-def estrai_xtrawine(soup):
-    html_str = str(soup)
-    is_stockout = "non disponibile" in html_str.lower() or "esaurito" in html_str.lower()
-    p_orig = None
-    match_js = re.findall(r'["\']price["\']\s*:\s*["\']?(\d+[,\.]\d+)["\']?', html_str, re.IGNORECASE)
-    for p in match_js:
-        val = pulisci_prezzo(p)
-        if val and val > 0: 
-            p_orig = val
-            break
-    if not p_orig:
-        prezzi_euro = re.findall(r'(\d+[,\.]\d{2})\s*€|€\s*(\d+[,\.]\d{2})', soup.text)
-        for p_tupla in prezzi_euro:
-            p_testo = p_tupla[0] if p_tupla[0] else p_tupla[1]
-            val = pulisci_prezzo(p_testo)
-            if val and val > 0:
-                p_orig = val
-                break
-    return {'prezzo_originale': p_orig, 'prezzo_scontato': None, 'stockout': is_stockout}
-
-def estrai_bernabei(soup):
-    is_stockout = False
-    if soup and soup.text:
-        is_stockout = "non disponibile" in soup.text.lower()
-    p_orig, p_scont = None, None
-    tag_prezzo = soup.find('span', {'itemprop': 'price'})
-    if tag_prezzo: p_orig = pulisci_prezzo(tag_prezzo.text)
-    return {'prezzo_originale': p_orig, 'prezzo_scontato': p_scont, 'stockout': is_stockout}
+            with span('fetch', sito=limitatore.sito, listing=url):
+                async with sessione.get(url, headers=intestazioni) as risposta:
+                    validatori = {'etag': risposta.headers.get('ETag'), 'last_modified': risposta.headers.get('Last-Modified')}
+                    conta('risposte_http', sito=limitatore.sito, status=risposta.status)
+                    return risposta.status, await risposta.read(), validatori
+        except Exception:
+            conta('errori_rete', sito=limitatore.sito)
+            return None, None, {}
+
+async def _scarica_tutte(richieste):
+    connettore = aiohttp.TCPConnector(limit=MAX_CONNESSIONI_TOTALI, ttl_dns_cache=300)
+    timeout = aiohttp.ClientTimeout(total=TIMEOUT_RICHIESTA)
+    limitatori = {}
+    async with aiohttp.ClientSession(connector=connettore, timeout=timeout, headers=HEADERS) as sessione:
+        compiti = []
+        for url, sito, intestazioni in richieste:
+            if sito not in limitatori:
+                limitatori[sito] = LimitatoreSito(sito, **LIMITI_SITI.get(sito, LIMITE_DEFAULT))
+            compiti.append(_scarica_pagina(sessione, limitatori[sito], url, intestazioni))
+        # gather restituisce i risultati nello stesso ordine delle richieste
+        return await asyncio.gather(*compiti)
+
+def scarica_pagine(richieste):
+    """Scarica in parallelo una lista di (url, sito normalizzato, intestazioni extra).
+
+    Restituisce (status, contenuto, validatori ETag/Last-Modified) nell'ordine di input.
+    """
+    if not richieste:
+        return []
+    return asyncio.run(_scarica_tutte(richieste))
 
 # --- NUOVA FUNZIONE: STRATEGIA 2 - SCATTO E TIMBRO DIGITALE (AUDIT TRAIL) ---
-def cattura_e_timbri_screenshot(url, id_prodotto, motivo):
-    print(f"📸 [TRIGGER: {motivo}] Avvio Playwright per prova fotografica...")
-    timestamp_file = datetime.now().strftime('%Y%m%d_%H%M%S')
-    nome_file = f"{id_prodotto}_{timestamp_file}.webp"
-    percorso_salvataggio = os.path.join(DIR_SCREENSHOTS, nome_file)
-    percorso_temporaneo = os.path.join(DIR_SCREENSHOTS, f"temp_{id_prodotto}.png")
+# Un solo browser per notte, con un pool di contesti/pagine che lavorano in parallelo
+MAX_PAGINE_SCREENSHOT = 4
+MAX_LAVORATORI_TIMBRO = os.cpu_count() or 2
+TIMEOUT_NAVIGAZIONE = 30000
+TIMEOUT_RETE_QUIETA = 3000
 
-    try:
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            page = browser.new_page()
-            page.set_viewport_size({"width": 1280, "height": 800})
-            page.goto(url, timeout=30000, wait_until="networkidle")
-            page.wait_for_timeout(2000) 
-            page.add_style_tag(content="""
+CSS_NASCONDI_OVERLAY = """
     [id*='cookie' i], [class*='cookie' i], 
     [id*='popup' i], [class*='popup' i], 
     [id*='banner' i], [class*='banner' i], 
@@ -149,59 +120,112 @@ def cattura_e_timbri_screenshot(url, id_prodotto, motivo):
         z-index: -9999 !important;
         pointer-events: none !important;
     }
-""")
-            page.evaluate("() => { document.querySelectorAll('[id*=\\\"cookie\\\" i], [class*=\\\"cookie\\\" i], [id*=\\\"popup\\\" i], [class*=\\\"popup\\\" i], [class*=\\\"banner\\\" i], iframe').forEach(el => el.remove()); }")
-            page.wait_for_timeout(1000)
-            page.screenshot(path=percorso_temporaneo)
-            browser.close()
-
-        img = Image.open(percorso_temporaneo)
-        draw = ImageDraw.Draw(img)
-        
-        testo_data = f"DATA/ORA: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}"
-        testo_url = f"URL: {url[:80]}..." if len(url) > 80 else f"URL: {url}"
-        testo_motivo = f"NOTIFICA: VIOLAZIONE COMMERCIALE [{motivo}]"
+"""
+JS_RIMUOVI_OVERLAY = "() => { document.querySelectorAll('[id*=\\\"cookie\\\" i], [class*=\\\"cookie\\\" i], [id*=\\\"popup\\\" i], [class*=\\\"popup\\\" i], [class*=\\\"banner\\\" i], iframe').forEach(el => el.remove()); }"
+# Attende due frame di rendering: il CSS iniettato è applicato quando la promise si risolve
+JS_ATTENDI_RENDER = "() => new Promise(r => requestAnimationFrame(() => requestAnimationFrame(r)))"
+
+async def _attendi_pagina_pronta(page):
+    # Al posto delle pause fisse: DOM completo, font caricati e (se arriva in tempo) rete quieta
+    await page.wait_for_function("document.readyState === 'complete'", timeout=TIMEOUT_NAVIGAZIONE)
+    await page.evaluate("() => document.fonts ? document.fonts.ready.then(() => true) : true")
+    try:
+        await page.wait_for_load_state("networkidle", timeout=TIMEOUT_RETE_QUIETA)
+    except Exception:
+        pass  # siti con polling/analytics continui: la pagina è comunque pronta
+
+async def _cattura_singola(page, pool, url, id_prodotto, motivo):
+    """Scatta lo screenshot in memoria e affida timbro e WebP al pool; restituisce (percorso web, durata, timbratura)."""
+    print(f"📸 [TRIGGER: {motivo}] Prova fotografica per {id_prodotto}...")
+    inizio = time.perf_counter()
+    scatto = datetime.now()
+    nome_file = f"{id_prodotto}_{scatto.strftime('%Y%m%d_%H%M%S')}.webp"
+    percorso_salvataggio = os.path.join(DIR_SCREENSHOTS, nome_file)
+
+    try:
+        with span('screenshot', listing=url):
+            await page.goto(url, timeout=TIMEOUT_NAVIGAZIONE, wait_until="domcontentloaded")
+            await _attendi_pagina_pronta(page)
+            await page.add_style_tag(content=CSS_NASCONDI_OVERLAY)
+            await page.evaluate(JS_RIMUOVI_OVERLAY)
+            await page.evaluate(JS_ATTENDI_RENDER)
+            png = await page.screenshot()
+    except Exception as e:
+        print(f"❌ Errore durante la cattura dello screenshot di {id_prodotto}: {e}")
+        return None, time.perf_counter() - inizio, None
+
+    # Il timbro riporta l'ora dello scatto, non quella in cui il pool arriva a lavorarlo
+    timbratura = asyncio.get_running_loop().run_in_executor(pool, salva_timbrato, png, percorso_salvataggio, url, motivo, scatto)
+    return f"/screenshots/{nome_file}", time.perf_counter() - inizio, timbratura
+
+async def _cattura_tutte(richieste):
+    risultati = [None] * len(richieste)
+    durate = []
+    coda = asyncio.Queue()
+    for i, richiesta in enumerate(richieste):
+        coda.put_nowait((i, richiesta))
 
-        larghezza, altezza = img.size
-        altezza_fascia = 90
-        draw.rectangle([(0, altezza - altezza_fascia), (larghezza, altezza)], fill=(0, 0, 0))
+    timbrature = []
 
+    async def lavoratore(browser, pool):
+        contesto = await browser.new_context(viewport={"width": 1280, "height": 800}, user_agent=HEADERS["User-Agent"])
+        page = await contesto.new_page()
         try:
-            font = ImageFont.load_default()
-        except:
-            font = None
+            while not coda.empty():
+                i, (url, id_prodotto, motivo) = coda.get_nowait()
+                percorso, durata, timbratura = await _cattura_singola(page, pool, url, id_prodotto, motivo)
+                durate.append(durata)
+                if timbratura is not None:
+                    timbrature.append((i, percorso, timbratura))
+        finally:
+            await contesto.close()
 
-        draw.text((20, altezza - 80), testo_data, fill=(255, 255, 255), font=font)
-        draw.text((20, altezza - 55), testo_url, fill=(255, 255, 0), font=font) 
-        draw.text((20, altezza - 30), testo_motivo, fill=(255, 100, 100), font=font) 
+    with ThreadPoolExecutor(max_workers=MAX_LAVORATORI_TIMBRO, thread_name_prefix='timbro') as pool:
+        async with async_playwright() as p:
+            browser = await p.chromium.launch(headless=True)
+            try:
+                n_lavoratori = min(MAX_PAGINE_SCREENSHOT, len(richieste))
+                await asyncio.gather(*[lavoratore(browser, pool) for _ in range(n_lavoratori)])
+            finally:
+                await browser.close()
 
-        img.save(percorso_salvataggio, "WEBP", quality=75)
-        
-        if os.path.exists(percorso_temporaneo):
-            os.remove(percorso_temporaneo)
-            
-        print(f"✅ Screenshot timbrato e salvato (WebP): /screenshots/{nome_file}")
-        return f"/screenshots/{nome_file}"
+        # Le ultime timbrature finiscono mentre il browser si chiude
+        for i, percorso, timbratura in timbrature:
+            try:
+                await timbratura
+                risultati[i] = percorso
+                print(f"✅ Screenshot timbrato e salvato (WebP): {percorso}")
+            except Exception as e:
+                print(f"❌ Errore durante il timbro dello screenshot {percorso}: {e}")
+
+    if durate:
+        print(f"⏱️ Screenshot: {len(durate)} catture, media {sum(durate) / len(durate):.1f}s, massimo {max(durate):.1f}s")
+    return risultati
 
+def cattura_screenshot_batch(richieste):
+    """Cattura e timbra una lista di (url, id_prodotto, motivo); restituisce i percorsi web nello stesso ordine."""
+    if not richieste:
+        return []
+    print(f"📸 Avvio Playwright per {len(richieste)} prove fotografiche...")
+    try:
+        return asyncio.run(_cattura_tutte(richieste))
     except Exception as e:
-        print(f"❌ Errore durante la cattura dello screenshot: {e}")
-        if os.path.exists(percorso_temporaneo): os.remove(percorso_temporaneo)
-        return None
+        print(f"❌ Errore critico del browser per gli screenshot: {e}")
+        return [None] * len(richieste)
 
-def avvia_scraping():
+def avvia_scraping(budget=BUDGET_VISITE, tutti=False, screenshot=True):
+    """Giro notturno completo; screenshot=False salta le prove fotografiche (es. nei benchmark offline).
+    Restituisce False se il giro non parte (anagrafica mancante), True altrimenti."""
     FILE_INPUT = os.path.join(DIR_DATA, 'database_vini.csv')
     FILE_OUTPUT = os.path.join(DIR_DATA, 'storico_prezzi.csv')
     
     if not os.path.exists(FILE_INPUT):
         print(f"Errore: File {FILE_INPUT} non trovato!")
-        return
+        return False
 
     try:
-        df_input = pd.read_csv(FILE_INPUT, sep=',', encoding='utf-8-sig', engine='python')
-        df_input.columns = df_input.columns.str.strip().str.upper()
-        if 'LINK_SCRAPING' not in df_input.columns:
-            df_input = pd.read_csv(FILE_INPUT, sep=';', encoding='utf-8-sig', engine='python')
-            df_input.columns = df_input.columns.str.strip().str.upper()
+        # Separatore, BOM e PREZZO_BASE numerico (anche con la virgola) gestiti da lettura_dati
+        df_input = leggi_database_vini(FILE_INPUT)
     except Exception as e:
         print(f"❌ Errore critico lettura anagrafica: {e}")
         raise e
@@ -209,49 +233,84 @@ def avvia_scraping():
     risultati = []
     oggi = datetime.now().strftime('%d/%m/%Y')
 
+    # 1. Preparazione dei listing validi (l'ordine dell'anagrafica viene preservato)
+    listing = []
     for index, row in df_input.iterrows():
         url = str(row.get('LINK_SCRAPING', '')).strip() 
-        id_prodotto = str(row.get('ID_PRODOTTO', '')).strip()
-        cantina = str(row.get('CANTINA', 'Sconosciuta')).strip()
-        nome_prodotto = str(row.get('NOME_PRODOTTO', 'Sconosciuto')).strip()
-        sito_origine = str(row.get('SITO_ORIGINE', '')).strip().lower()
-        
+        if not url or url.lower() == 'nan': continue
+
         prezzo_base = row.get('PREZZO_BASE')
+        prezzo_base = float(prezzo_base) if pd.notna(prezzo_base) else None
+
+        listing.append({
+            'url': url,
+            'id_prodotto': str(row.get('ID_PRODOTTO', '')).strip(),
+            'cantina': str(row.get('CANTINA', 'Sconosciuta')).strip(),
+            'nome_prodotto': str(row.get('NOME_PRODOTTO', 'Sconosciuto')).strip(),
+            'sito_origine': str(row.get('SITO_ORIGINE', '')).strip().lower(),
+            'prezzo_base': prezzo_base,
+        })
+
+    # 1b. Pianificazione adattiva: link morti in attesa esponenziale, listing stabili ricontrollati più di rado
+    if not tutti:
         try:
-            prezzo_base = float(str(prezzo_base).replace(',', '.')) if pd.notna(prezzo_base) else None
-        except:
-            prezzo_base = None
-        
-        if not url or url.lower() == 'nan': continue
-            
+            listing, _ = pianifica(listing, budget=budget)
+        except Exception as e:
+            # Senza storico leggibile si visita tutto, come prima
+            print(f"⚠️ Pianificazione non disponibile ({e}): visito tutti i listing.")
+
+    # 2. Download concorrente di tutte le pagine
+    print(f"🌐 Download parallelo di {len(listing)} pagine prodotto...")
+    cache = CacheHttp(VERSIONE_ESTRATTORI)
+    pagine = scarica_pagine([(l['url'], normalizza_sito(l['sito_origine']), cache.intestazioni_condizionali(l['url'])) for l in listing])
+
+    # 3. Estrazione e trigger, nello stesso ordine dell'anagrafica
+    da_catturare = []
+    for l, (status, contenuto, validatori) in zip(listing, pagine):
+        url = l['url']
+        id_prodotto = l['id_prodotto']
+        cantina = l['cantina']
+        nome_prodotto = l['nome_prodotto']
+        sito_origine = l['sito_origine']
+        prezzo_base = l['prezzo_base']
+
         print(f"Scraping standard: {cantina} - {nome_prodotto} su {sito_origine}...")
         dati = {'prezzo_originale': None, 'prezzo_scontato': None, 'stockout': False}
         
         try:
-            response = requests.get(url, headers=HEADERS, timeout=15)
-            if response.status_code == 200:
-                soup = BeautifulSoup(response.content, 'html.parser')
-                if 'tannico' in sito_origine: dati = estrai_tannico(soup)
-                elif 'callmewine' in sito_origine: dati = estrai_callmewine(soup)
-                elif 'vino.com' in sito_origine: dati = estrai_vinocom(soup)
-                elif 'xtrawine' in sito_origine: dati = estrai_xtrawine(soup)
-                elif 'bernabei' in sito_origine: dati = estrai_bernabei(soup)
+            estrattore = trova_estrattore(sito_origine)
+            if status == 304:
+                # Pagina non modificata dalla notte scorsa: si riusa l'estrazione precedente
+                dati = cache.risultato_se_non_modificata(url) or dati
+            elif status == 200 and estrattore:
+                impronta = calcola_impronta(contenuto)
+                precedente = cache.risultato_se_invariata(url, impronta)
+                if precedente:
+                    dati = precedente
+                    conta('pagine_invariate', sito=sito_origine)
+                else:
+                    with span('parse', sito=sito_origine, listing=url):
+                        pagina = PaginaProdotto(contenuto)
+                    with span('extract', sito=sito_origine, listing=url):
+                        dati = estrattore.estrai(pagina)
+                cache.aggiorna(url, validatori, impronta, len(contenuto), dati, parsata=not precedente)
         except Exception: pass
 
-        screenshot_path = None
-        trigger_reason = None
-        
-        prezzo_finale = dati['prezzo_scontato'] if dati['prezzo_scontato'] else dati['prezzo_originale']
+        with span('trigger', sito=sito_origine, listing=url):
+            trigger_reason = None
+
+            prezzo_finale = dati['prezzo_scontato'] if dati['prezzo_scontato'] else dati['prezzo_originale']
 
-        if dati['stockout']:
-            trigger_reason = "STOCKOUT"
-        elif prezzo_finale and prezzo_base and (prezzo_finale < prezzo_base):
-            trigger_reason = "SOTTO_PREZZO"
-        elif dati['prezzo_scontato'] is not None:
-            trigger_reason = "SCONTO_RILEVATO"
+            if dati['stockout']:
+                trigger_reason = "STOCKOUT"
+            elif prezzo_finale and prezzo_base and (prezzo_finale < prezzo_base):
+                trigger_reason = "SOTTO_PREZZO"
+            elif dati['prezzo_scontato'] is not None:
+                trigger_reason = "SCONTO_RILEVATO"
 
         if trigger_reason:
-            screenshot_path = cattura_e_timbri_screenshot(url, id_prodotto, trigger_reason)
+            conta('trigger', motivo=trigger_reason)
+            da_catturare.append((len(risultati), (url, id_prodotto, trigger_reason)))
 
         record = {
             'DATA_ESTRAZIONE': oggi,
@@ -263,32 +322,35 @@ def avvia_scraping():
             'PREZZO_SCONTATO': dati['prezzo_scontato'],
             'STOCKOUT': 'SI' if dati['stockout'] else 'NO',
             'TRIGGER_REASON': trigger_reason if trigger_reason else 'REGOLARE',
-            'SCREENSHOT_PATH': screenshot_path if screenshot_path else '',
+            'SCREENSHOT_PATH': '',
             'LINK_SCRAPING': url
         }
         risultati.append(record)
 
+    cache.chiudi()
+
+    # 4. Prove fotografiche in un unico batch, dopo la raccolta prezzi
+    if not screenshot:
+        da_catturare = []
+    if da_catturare:
+        percorsi = cattura_screenshot_batch([richiesta for _, richiesta in da_catturare])
+        for (posizione, _), percorso in zip(da_catturare, percorsi):
+            risultati[posizione]['SCREENSHOT_PATH'] = percorso if percorso else ''
+
     if risultati:
-        df_nuovi = pd.DataFrame(risultati)
-        # Array originale a 11 colonne: il join avverrà su Next.js tramite ID_PRODOTTO o NOME_PRODOTTO
-        ordine_colonne = ['DATA_ESTRAZIONE', 'ID_PRODOTTO', 'CANTINA', 'NOME_PRODOTTO', 'SITO_ORIGINE', 'PREZZO_RILEVATO', 'PREZZO_SCONTATO', 'STOCKOUT', 'TRIGGER_REASON', 'SCREENSHOT_PATH', 'LINK_SCRAPING']
-        
-        if os.path.exists(FILE_OUTPUT):
-            try:
-                df_storico = pd.read_csv(FILE_OUTPUT, sep=';', encoding='utf-8-sig', engine='python')
-                df_storico.columns = df_storico.columns.str.strip().str.upper()
-                df_finale = pd.concat([df_storico, df_nuovi], ignore_index=True)
-            except Exception:
-                df_finale = df_nuovi
-        else:
-            df_finale = df_nuovi
-            
-        for col in ordine_colonne:
-            if col not in df_finale.columns: df_finale[col] = ''
-        
-        df_finale = df_finale[ordine_colonne]
-        df_finale.to_csv(FILE_OUTPUT, sep=';', encoding='utf-8-sig', index=False)
+        aggiungi_rilevazioni(risultati, file_csv=FILE_OUTPUT)
         print(f"✅ Database storico prezzi aggiornato in: {FILE_OUTPUT}")
 
+    # 5. Deduplica percettiva delle prove e politica di conservazione di public/screenshots
+    if da_catturare:
+        try:
+            aggiorna_prove(file_csv=FILE_OUTPUT)
+        except Exception as e:
+            print(f"⚠️ Compattazione delle prove fotografiche non riuscita (riproverà la notte prossima): {e}")
+    return True
+
 if __name__ == "__main__":
-    avvia_scraping()
\ No newline at end of file
+    # --tutti ignora la pianificazione; --budget N limita le visite della notte (anche via BUDGET_VISITE)
+    budget = int(sys.argv[sys.argv.index('--budget') + 1]) if '--budget' in sys.argv else BUDGET_VISITE
+    with giro('prezzi'):
+        avvia_scraping(budget=budget, tutti='--tutti' in sys.argv)
\ No newline at end of file
@@ -1,129 +1,414 @@
 import pandas as pd
 from google import genai
 from google.genai import types
+import asyncio
 import json
-import time
+import math
+import re
+import sys
 import os
+from datetime import datetime
+from cache_sentiment import CacheSentiment, impronta_testo, FILE_CACHE
+from sentiment_locale import carica_o_addestra
+from lettura_dati import leggi_sentiment_raw_a_blocchi, RIGHE_PER_BLOCCO
+from metriche import span, conta, giro
+from giornale_csv import GiornaleCsv
 
 # --- 1. SICUREZZA E SETUP API ---
-# Peschiamo la chiave in sicurezza dall'ambiente virtuale
-chiave_segreta = os.environ.get("API_VINO")
+def crea_client():
+    # Peschiamo la chiave in sicurezza dall'ambiente virtuale
+    chiave_segreta = os.environ.get("API_VINO")
 
-# Check di sicurezza (la nostra rete di salvataggio)
-if not chiave_segreta:
-    raise ValueError("ALERT CRITICO: Chiave API_VINO mancante. Controlla i secret del Codespace!")
+    # Check di sicurezza (la nostra rete di salvataggio)
+    if not chiave_segreta:
+        raise ValueError("ALERT CRITICO: Chiave API_VINO mancante. Controlla i secret del Codespace!")
 
-# Inizializziamo il client AI di Google (Gemini) usando la chiave blindata
-client = genai.Client(api_key=chiave_segreta)
+    # Inizializziamo il client AI di Google (Gemini) usando la chiave blindata
+    return genai.Client(api_key=chiave_segreta)
 
-# --- 2. IL PROMPT DI INGEGNERIA ---
+# --- 2. IL PROMPT DI INGEGNERIA (UNA RICHIESTA, PIÙ RECENSIONI) ---
 PROMPT_SISTEMA = """
-Sei un sommelier esperto e un analista di dati. Analizza questa recensione di un vino.
-Devi restituire ESCLUSIVAMENTE un oggetto JSON valido con questa esatta struttura:
-{
+Sei un sommelier esperto e un analista di dati. Analizza ciascuna delle recensioni di vino elencate in fondo.
+Devi restituire ESCLUSIVAMENTE un array JSON valido con UN oggetto per ogni recensione, con questa esatta struttura:
+[
+  {
+    "id": "Copia ESATTAMENTE l'id della recensione analizzata.",
     "testo_tradotto": "Traduci la recensione in un italiano perfetto e scorrevole. Se è già in italiano, correggi eventuali errori ortografici.",
     "sentiment_generale": "Scegli ESATTAMENTE una tra: Positivo, Negativo, Neutro",
     "parole_positive": "Estrai solo le parole chiave o aggettivi che indicano pregi (es. profumato, elegante, buon rapporto qualità prezzo). Separate da virgola.",
     "parole_negative": "Estrai solo le parole chiave o aggettivi che indicano difetti (es. acido, tappato, costoso, sbilanciato). Separate da virgola."
-}
+  }
+]
 
-Recensione da analizzare:
+Recensioni da analizzare (array JSON di oggetti con "id" e "testo"):
 """
 
-# --- 3. MOTORE DI ELABORAZIONE ---
-def elabora_sentiment():
-    file_input = 'public/data/sentiment_vini_raw.csv'
-    file_output = 'public/data/sentiment_vini_elaborato.csv'
+# Da cambiare quando prompt o modello cambiano in modo incompatibile: le risposte in cache
+# prodotte con un'altra versione non vengono più riusate
+VERSIONE_PROMPT = 'batch-v1'
 
-    if not os.path.exists(file_input):
-        print(f"❌ Errore: File {file_input} non trovato. Lancia prima lo scraper di Vivino!")
-        return
+# --- 3. PARAMETRI DEL MOTORE ---
+MODELLO = 'gemini-2.5-flash'
+DIMENSIONE_BATCH = 10          # recensioni impacchettate in una singola richiesta
+MAX_RICHIESTE_PARALLELE = 3    # richieste in volo contemporaneamente
+RICHIESTE_AL_MINUTO = 10       # ritmo iniziale, poi si adatta ai 429
+MAX_TENTATIVI = 3
+MAX_RECENSIONI_PER_RUN = int(os.environ.get('BUDGET_RECENSIONI') or 100)   # 🔥 Freno a mano (Protezione Budget)
+# Byte del CSV grezzo già consumati: a ogni giro si riparte da qui
+FILE_SEGNALIBRO = 'public/data/segnalibro_sentiment.json'
 
-    print("🧠 Avvio Motore Sentiment (Cruise Control + Salvataggio Incrementale)...")
-    
-    # Caricamento dati grezzi
-    df_raw = pd.read_csv(file_input, sep=';', encoding='utf-8-sig', engine='python')
-    
-    # 🔥 IL FRENO A MANO PER IL TEST API (Protezione Budget) 🔥
-    df_raw = df_raw.head(100)
-    print(f"⚠️ MODALITÀ TEST ATTIVA: Verranno processate solo le prime {len(df_raw)} recensioni.")
-    
-    recensioni_gia_fatte = []
-    if os.path.exists(file_output):
-        df_esistente = pd.read_csv(file_output, sep=';', encoding='utf-8-sig', engine='python')
-        if 'TESTO_ORIGINALE' in df_esistente.columns:
-            recensioni_gia_fatte = df_esistente['TESTO_ORIGINALE'].tolist()
-
-    for index, row in df_raw.iterrows():
-        testo_originale = str(row.get('TESTO_COMMENTO', '')).strip()
-        
-        if not testo_originale or testo_originale in recensioni_gia_fatte:
-            continue
+# Colonne del file elaborato (stesso ordine di costruisci_record), usate solo se il file è nuovo
+COLONNE_ELABORATO = ['DATA_COMMENTO', 'ID_PRODOTTO', 'NOME_PRODOTTO', 'CATEGORIA_PRODOTTO', 'SITO_ECOMMERCE',
+                     'RATING_ORIGINALE', 'TESTO_ORIGINALE', 'TESTO_COMMENTO', 'SENTIMENT_SCORE', 'PAROLE_CHIAVE_ESTRATTE']
+
+RE_ATTESA_SUGGERITA = re.compile(r"retry.?delay\D{0,10}(\d+(?:\.\d+)?)", re.IGNORECASE)
+
+class SecchielloToken:
+    """Token bucket adattivo: dimezza il ritmo a ogni 429/RESOURCE_EXHAUSTED e lo rialza piano a ogni successo."""
+    def __init__(self, richieste_al_minuto, minimo=1, massimo=60, raffica=2):
+        self.ritmo = richieste_al_minuto / 60
+        self.minimo = minimo / 60
+        self.massimo = massimo / 60
+        self.raffica = raffica
+        self.token = raffica
+        self._ultimo = None
+        self._pausa_fino = 0.0
+        self._lock = asyncio.Lock()
+
+    async def prendi(self):
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            while True:
+                ora = loop.time()
+                if ora < self._pausa_fino:
+                    await asyncio.sleep(self._pausa_fino - ora)
+                    continue
+                if self._ultimo is not None:
+                    self.token = min(self.raffica, self.token + (ora - self._ultimo) * self.ritmo)
+                self._ultimo = ora
+                if self.token >= 1:
+                    self.token -= 1
+                    return
+                await asyncio.sleep((1 - self.token) / self.ritmo)
+
+    def segnala_successo(self):
+        self.ritmo = min(self.massimo, self.ritmo + 0.5 / 60)
+
+    def segnala_limite(self, attesa=None):
+        self.ritmo = max(self.minimo, self.ritmo / 2)
+        self.token = 0
+        pausa = attesa if attesa else 1 / self.ritmo
+        self._pausa_fino = asyncio.get_running_loop().time() + pausa
+        return pausa
+
+def _is_limite_api(errore):
+    return "429" in str(errore) or "RESOURCE_EXHAUSTED" in str(errore)
+
+def _attesa_suggerita(errore):
+    match = RE_ATTESA_SUGGERITA.search(str(errore))
+    return float(match.group(1)) if match else None
+
+def costruisci_record(row, testo_originale, dati_ia):
+    sentiment = dati_ia.get('sentiment_generale', 'Neutro')
+    if sentiment == 'Positivo':
+        parole_estratte = dati_ia.get('parole_positive', '')
+    elif sentiment == 'Negativo':
+        parole_estratte = dati_ia.get('parole_negative', '')
+    else:
+        parole_estratte = dati_ia.get('parole_positive', '') + ", " + dati_ia.get('parole_negative', '')
 
-        print(f"Analisi recensione {index + 1}/{len(df_raw)}...")
-        
-        successo = False
-        for tentativo in range(3):
+    # 🎯 ALLINEAMENTO DATABASE CORRETTO (Dizionario Dati) 🎯
+    return {
+        'DATA_COMMENTO': row.get('DATA_COMMENTO'),
+        'ID_PRODOTTO': row.get('ID_PRODOTTO'),
+        'NOME_PRODOTTO': row.get('NOME_PRODOTTO'),
+        'CATEGORIA_PRODOTTO': row.get('CATEGORIA_PRODOTTO'),
+        'SITO_ECOMMERCE': row.get('SITO_ECOMMERCE'), # Allineato col dizionario ufficiale
+        'RATING_ORIGINALE': row.get('RATING_ORIGINALE'),
+        'TESTO_ORIGINALE': testo_originale,
+        'TESTO_COMMENTO': dati_ia.get('testo_tradotto', testo_originale),
+        'SENTIMENT_SCORE': sentiment,
+        'PAROLE_CHIAVE_ESTRATTE': parole_estratte.strip(', ')
+    }
+
+async def analizza_batch(client, secchiello, semaforo, batch):
+    """Invia un batch [(id, testo)] in una sola richiesta; restituisce {id: dati_ia} per gli id ricevuti."""
+    elenco = json.dumps([{'id': id_rec, 'testo': testo} for id_rec, testo in batch], ensure_ascii=False)
+    async with semaforo:
+        for tentativo in range(MAX_TENTATIVI):
+            with span('attesa_ritmo'):
+                await secchiello.prendi()
             try:
-                risposta = client.models.generate_content(
-                    model='gemini-2.5-flash',
-                    contents=PROMPT_SISTEMA + f'"{testo_originale}"',
-                    config=types.GenerateContentConfig(
-                        response_mime_type="application/json",
-                    ),
-                )
-                
-                dati_ia = json.loads(risposta.text)
-                
-                sentiment = dati_ia.get('sentiment_generale', 'Neutro')
-                if sentiment == 'Positivo':
-                    parole_estratte = dati_ia.get('parole_positive', '')
-                elif sentiment == 'Negativo':
-                    parole_estratte = dati_ia.get('parole_negative', '')
-                else:
-                    parole_estratte = dati_ia.get('parole_positive', '') + ", " + dati_ia.get('parole_negative', '')
-
-                # 🎯 ALLINEAMENTO DATABASE CORRETTO (Dizionario Dati) 🎯
-                record = {
-                    'DATA_COMMENTO': row.get('DATA_COMMENTO'),
-                    'ID_PRODOTTO': row.get('ID_PRODOTTO'),
-                    'NOME_PRODOTTO': row.get('NOME_PRODOTTO'),
-                    'CATEGORIA_PRODOTTO': row.get('CATEGORIA_PRODOTTO'),
-                    'SITO_ECOMMERCE': row.get('SITO_ECOMMERCE'), # Allineato col dizionario ufficiale
-                    'RATING_ORIGINALE': row.get('RATING_ORIGINALE'),
-                    'TESTO_ORIGINALE': testo_originale,
-                    'TESTO_COMMENTO': dati_ia.get('testo_tradotto', testo_originale),
-                    'SENTIMENT_SCORE': sentiment,
-                    'PAROLE_CHIAVE_ESTRATTE': parole_estratte.strip(', ')
-                }
-                
-                # --- LA VERA CASSAFORTE: Salvataggio Immediato (Append) ---
-                df_record = pd.DataFrame([record])
-                if not os.path.exists(file_output):
-                    # Se il file non esiste, lo crea con le intestazioni
-                    df_record.to_csv(file_output, sep=';', encoding='utf-8-sig', index=False)
-                else:
-                    # Se il file esiste, si "accoda" in fondo senza riscrivere le intestazioni
-                    df_record.to_csv(file_output, sep=';', encoding='utf-8-sig', index=False, mode='a', header=False)
-                
-                print(f"   💾 Salvata con successo su disco.")
-                
-                successo = True
-                time.sleep(65) # Pausa di crociera per evitare blocchi rate-limit da Google
-                break 
-                
+                with span('chiamata_api', tentativo=tentativo + 1):
+                    risposta = await client.aio.models.generate_content(
+                        model=MODELLO,
+                        contents=PROMPT_SISTEMA + elenco,
+                        config=types.GenerateContentConfig(
+                            response_mime_type="application/json",
+                        ),
+                    )
+                elementi = json.loads(risposta.text)
+                secchiello.segnala_successo()
+                if isinstance(elementi, dict):
+                    elementi = [elementi]
+                return {str(e.get('id')): e for e in elementi if isinstance(e, dict)}
+
             except Exception as e:
-                if "429" in str(e) or "RESOURCE_EXHAUSTED" in str(e):
-                    print(f"   ⏳ Limite API colpito. Pausa di 65 secondi... (Tentativo {tentativo + 1}/3)")
-                    time.sleep(65)
+                if _is_limite_api(e):
+                    conta('limiti_api')
+                    pausa = secchiello.segnala_limite(_attesa_suggerita(e))
+                    print(f"   ⏳ Limite API colpito. Ritmo ridotto a {secchiello.ritmo * 60:.1f} richieste/min, pausa di {pausa:.0f} secondi... (Tentativo {tentativo + 1}/{MAX_TENTATIVI})")
                 else:
                     print(f"   ⚠️ Errore API: {e}")
-                    time.sleep(5)
-        
-        if not successo:
-            print(f"❌ Recensione {index + 1} saltata.")
+                    conta('errori_api')
+                    with span('attesa_retry'):
+                        await asyncio.sleep(5)
+    return {}
+
+async def _elabora(client, cache, da_fare, giornale, gia_fatte=None, secchiello=None):
+    """da_fare: lista di (impronta, righe, testo); le righe con lo stesso testo condividono una sola analisi.
+    Le impronte entrano in gia_fatte solo dopo il commit del loro batch: un testo saltato resta da rifare.
+    Il secchiello, se passato, arriva da chi chiama e conserva il ritmo imparato dai 429 tra un blocco e l'altro."""
+    secchiello = secchiello or SecchielloToken(RICHIESTE_AL_MINUTO)
+    semaforo = asyncio.Semaphore(MAX_RICHIESTE_PARALLELE)
+    batches = [da_fare[i:i + DIMENSIONE_BATCH] for i in range(0, len(da_fare), DIMENSIONE_BATCH)]
+
+    async def un_batch(batch):
+        risultati = await analizza_batch(client, secchiello, semaforo, [(impronta[:16], testo) for impronta, _, testo in batch])
+        return batch, risultati
+
+    salvate, saltate = 0, 0
+    for completato in asyncio.as_completed([un_batch(b) for b in batches]):
+        batch, risultati = await completato
+        records = []
+        riuscite = []
+        for impronta, righe, testo in batch:
+            dati_ia = risultati.get(impronta[:16])
+            if dati_ia is None:
+                saltate += len(righe)
+                continue
+            cache.scrivi(impronta, dati_ia)
+            records.extend(costruisci_record(row, testo, dati_ia) for row in righe)
+            riuscite.append(impronta)
+        # --- LA VERA CASSAFORTE: ogni batch completato finisce su disco (write + fsync) ---
+        giornale.scrivi_tutti(records)
+        giornale.commit()
+        if gia_fatte is not None:
+            gia_fatte.update(riuscite)
+        salvate += len(records)
+        print(f"   💾 Batch salvato su disco: {len(records)} recensioni (totale {salvate}).")
+    return salvate, saltate
+
+# --- 4. SEGNALIBRO SUL CSV GREZZO ---
+def carica_segnalibro(file_input, file_segnalibro=FILE_SEGNALIBRO):
+    """Byte del CSV grezzo fin dove le recensioni sono già state consumate (0 = da capo)."""
+    if not os.path.exists(file_segnalibro):
+        return 0
+    with open(file_segnalibro, encoding='utf-8') as f:
+        byte = json.load(f).get('byte', 0)
+    # Vale solo se cade subito dopo un a capo: un CSV riscritto o accorciato si rilegge da capo
+    # (le recensioni già elaborate le ferma comunque l'impronta del testo)
+    with open(file_input, 'rb') as f:
+        f.seek(max(byte - 1, 0))
+        if byte and f.read(1) != b'\n':
+            print(f"⚠️ Segnalibro {file_segnalibro} non più valido per {file_input}: si riparte da capo.")
+            return 0
+    return byte
+
+def salva_segnalibro(byte, file_segnalibro=FILE_SEGNALIBRO):
+    os.makedirs(os.path.dirname(file_segnalibro) or '.', exist_ok=True)
+    temporaneo = file_segnalibro + '.tmp'
+    with open(temporaneo, 'w', encoding='utf-8') as f:
+        json.dump({'byte': byte, 'aggiornato': datetime.now().isoformat(timespec='seconds')}, f, indent=2)
+    os.replace(temporaneo, file_segnalibro)
+
+def impronte_elaborate(file_output):
+    """Impronte dei testi già elaborati (lookup O(1), insensibile a spazi/maiuscole), lette a blocchi."""
+    impronte = set()
+    if not os.path.exists(file_output) or os.path.getsize(file_output) == 0:
+        return impronte
+    try:
+        blocchi = pd.read_csv(file_output, sep=';', encoding='utf-8-sig', usecols=['TESTO_ORIGINALE'],
+                              dtype=str, chunksize=RIGHE_PER_BLOCCO)
+    except ValueError:
+        return impronte  # file senza colonna TESTO_ORIGINALE
+    for blocco in blocchi:
+        impronte.update(impronta_testo(t) for t in blocco['TESTO_ORIGINALE'].dropna())
+    return impronte
+
+# --- 5. MOTORE DI ELABORAZIONE ---
+def _elabora_blocco(client, cache, classificatore, giornale, righe, recensioni_gia_fatte, secchiello=None, loop=None):
+    """Cache, filtro locale e batch Gemini per un blocco di righe; restituisce (salvate, saltate).
+    Con secchiello e loop (quelli della sessione) il ritmo verso Gemini non riparte da capo a ogni blocco."""
+    da_cache = []
+    da_locale = []
+    in_attesa = {}
+    for row in righe:
+        testo_originale = str(row.get('TESTO_COMMENTO', '')).strip()
+        impronta = impronta_testo(testo_originale)
+        if impronta in in_attesa:
+            in_attesa[impronta][0].append(row)  # stesso testo già in coda: nessuna chiamata in più
+            continue
+        if impronta in recensioni_gia_fatte:
+            continue
+
+        # Cache e filtro locale finiscono nel commit di questo blocco: i doppioni successivi non vanno riscritti.
+        # I testi per Gemini diventano "fatti" solo a batch salvato (in _elabora)
+        dati_ia = cache.leggi(impronta)
+        if dati_ia is not None:
+            recensioni_gia_fatte.add(impronta)
+            da_cache.append(costruisci_record(row, testo_originale, dati_ia))
+            continue
+        if classificatore is not None:
+            etichetta, _ = classificatore.classifica(testo_originale, row.get('RATING_ORIGINALE'))
+            if etichetta is not None:
+                recensioni_gia_fatte.add(impronta)
+                da_locale.append(costruisci_record(row, testo_originale, classificatore.dati_ia(testo_originale, etichetta)))
+                continue
+        in_attesa[impronta] = ([row], testo_originale)
+
+    conta('recensioni_cache', len(da_cache))
+    conta('recensioni_locali', len(da_locale))
+    conta('recensioni_api', len(in_attesa))
+    if da_cache:
+        giornale.scrivi_tutti(da_cache)
+        print(f"♻️ {len(da_cache)} recensioni recuperate dalla cache (nessuna chiamata API).")
+    if da_locale:
+        giornale.scrivi_tutti(da_locale)
+        chiamate_evitate = math.ceil((len(da_locale) + len(in_attesa)) / DIMENSIONE_BATCH) - math.ceil(len(in_attesa) / DIMENSIONE_BATCH)
+        print(f"🧮 {len(da_locale)} recensioni chiuse dal classificatore locale ({chiamate_evitate} chiamate API evitate).")
+    giornale.commit()
+
+    da_fare = [(impronta, righe_testo, testo) for impronta, (righe_testo, testo) in in_attesa.items()]
+    if not da_fare:
+        return len(da_cache) + len(da_locale), 0
+    print(f"Analisi di {len(da_fare)} recensioni in batch da {DIMENSIONE_BATCH}...")
+    lavoro = _elabora(client, cache, da_fare, giornale, recensioni_gia_fatte, secchiello)
+    salvate, saltate = loop.run_until_complete(lavoro) if loop is not None else asyncio.run(lavoro)
+    return salvate + len(da_cache) + len(da_locale), saltate
+
+def _blocchi_da_elaborare(blocchi, sessione):
+    """Taglia i blocchi al budget residuo della sessione: contano solo le recensioni non ancora elaborate.
+    Genera (righe, byte_fine) con byte_fine = posizione dopo l'ultima riga consumata (None senza segnalibro).
+    Le righe già elaborate (o senza testo) si consumano anche a budget esaurito: il segnalibro le supera
+    e si ferma solo sulla prima recensione nuova rimasta fuori."""
+    for df, fini in blocchi:
+        righe, byte_fine, esaurito = [], None, False
+        for i, row in enumerate(df.to_dict('records')):
+            testo = str(row.get('TESTO_COMMENTO', '')).strip()
+            if testo and testo.lower() != 'nan':
+                if impronta_testo(testo) not in sessione.recensioni_gia_fatte:
+                    if sessione.residuo <= 0:
+                        esaurito = True
+                        break
+                    sessione.residuo -= 1
+                righe.append(row)
+            byte_fine = fini[i] if fini else None
+        yield righe, byte_fine
+        if esaurito:
+            return
+
+class SessioneSentiment:
+    """Client, cache, classificatore, giornale e budget condivisi da più chiamate a elabora_sentiment:
+    la pipeline notturna la apre una volta per stadio, non una volta per vino arrivato in coda."""
+
+    def __init__(self, client=None, file_output='public/data/sentiment_vini_elaborato.csv', file_cache=FILE_CACHE, filtro_locale=True, budget=MAX_RECENSIONI_PER_RUN):
+        self.client = client if client is not None else crea_client()
+        self.residuo = budget
+        # Un solo ritmo e un solo event loop per sessione: i rallentamenti dovuti ai 429 valgono per tutti i blocchi
+        self.secchiello = SecchielloToken(RICHIESTE_AL_MINUTO)
+        self.loop = asyncio.new_event_loop()
+        self.recensioni_gia_fatte = impronte_elaborate(file_output)
+        # Primo filtro locale: i casi ovvi (es. "Top!" con voto 4.5) non arrivano a Gemini
+        self.classificatore = carica_o_addestra() if filtro_locale else None
+        self.cache = CacheSentiment(VERSIONE_PROMPT, file_cache)
+        # Il file elaborato resta aperto per tutta la sessione: un solo giornale per tutti i blocchi
+        self.giornale = GiornaleCsv(file_output, COLONNE_ELABORATO)
+
+    def chiudi(self):
+        try:
+            self.giornale.chiudi()
+            self.cache.chiudi()
+        finally:
+            self.loop.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *errore):
+        self.chiudi()
+        return False
+
+def elabora_sentiment(client=None, file_input='public/data/sentiment_vini_raw.csv', file_output='public/data/sentiment_vini_elaborato.csv', file_cache=FILE_CACHE, filtro_locale=True, recensioni=None, budget=MAX_RECENSIONI_PER_RUN, file_segnalibro=FILE_SEGNALIBRO, sessione=None):
+    """Arricchisce le recensioni grezze e restituisce quante ne ha salvate (None se il CSV grezzo manca).
+    Il CSV grezzo si legge a blocchi dal segnalibro in poi: a ogni giro solo le recensioni accodate dopo
+    l'ultimo, fino a budget recensioni nuove, con memoria costante qualunque sia la dimensione del file.
+    Con recensioni (lista di dict con le colonne del CSV grezzo) non si legge file_input: è il caso
+    della pipeline notturna, dove arrivano direttamente dallo scraper attraverso una coda.
+    Con sessione (SessioneSentiment già aperta) client, file_output, file_cache, filtro_locale e budget
+    sono quelli della sessione, e il budget speso resta scalato per le chiamate successive."""
+
+    if recensioni is None and not os.path.exists(file_input):
+        print(f"❌ Errore: File {file_input} non trovato. Lancia prima lo scraper di Vivino!")
+        return None
+
+    propria = sessione is None
+    if propria:
+        sessione = SessioneSentiment(client, file_output, file_cache, filtro_locale, budget)
+
+    print("🧠 Avvio Motore Sentiment (Lettura a blocchi + Batch paralleli + Salvataggio Incrementale)...")
+
+    # Caricamento dati grezzi
+    # Le date restano testo: vengono ricopiate così come sono nel file elaborato
+    if recensioni is None:
+        segnalibro = carica_segnalibro(file_input, file_segnalibro)
+        blocchi = leggi_sentiment_raw_a_blocchi(file_input, segnalibro, converti_date_colonne=False)
+        print(f"🔖 Lettura di {file_input} dal byte {segnalibro} di {os.path.getsize(file_input)}.")
+    else:
+        segnalibro = None
+        blocchi = [(pd.DataFrame(recensioni), None)]
+
+    # 🔥 IL FRENO A MANO (Protezione Budget): al massimo budget recensioni nuove per giro 🔥
+    print(f"💰 Budget residuo: {max(sessione.residuo, 0)} recensioni nuove.")
+
+    salvate, saltate, lette = 0, 0, 0
+    try:
+        for righe, byte_fine in _blocchi_da_elaborare(blocchi, sessione):
+            lette += len(righe)
+            salvate_blocco, saltate_blocco = _elabora_blocco(sessione.client, sessione.cache, sessione.classificatore,
+                                                             sessione.giornale, righe, sessione.recensioni_gia_fatte,
+                                                             sessione.secchiello, sessione.loop)
+            salvate += salvate_blocco
+            saltate += saltate_blocco
+            # Il segnalibro avanza solo dopo il commit del blocco e si ferma al primo blocco con recensioni
+            # saltate: al prossimo giro si rilegge da lì (le già elaborate le ferma l'impronta)
+            if byte_fine is not None and not saltate:
+                salva_segnalibro(byte_fine, file_segnalibro)
+                segnalibro = byte_fine
+    finally:
+        if propria:
+            sessione.chiudi()
+    if saltate:
+        print(f"❌ {saltate} recensioni saltate (verranno riprovate al prossimo giro).")
+    if segnalibro is not None:
+        print(f"🔖 Segnalibro al byte {segnalibro} di {os.path.getsize(file_input)}.")
 
-    print("🏁 Elaborazione terminata.")
+    print(f"🏁 Elaborazione terminata: {lette} recensioni lette, {salvate} salvate.")
+    return salvate
 
 if __name__ == "__main__":
-    elabora_sentiment()
\ No newline at end of file
+    # --budget N: recensioni nuove da elaborare in questo giro (anche via BUDGET_RECENSIONI)
+    budget = int(sys.argv[sys.argv.index('--budget') + 1]) if '--budget' in sys.argv else MAX_RECENSIONI_PER_RUN
+    if '--finto' in sys.argv:
+        # Prova a secco: nessuna chiamata reale a Gemini, output e segnalibro separati
+        from gemini_finto import ClientFinto
+        os.makedirs('.cache', exist_ok=True)
+        client_finto = ClientFinto(probabilita_429=0.2)
+        with giro('sentiment_finto'):
+            elabora_sentiment(client_finto, file_output=os.path.join('.cache', 'sentiment_finto.csv'),
+                              file_cache=os.path.join('.cache', 'cache_sentiment_finto.db'), budget=budget,
+                              file_segnalibro=os.path.join('.cache', 'segnalibro_sentiment_finto.json'))
+        print(f"🧪 Client finto: {client_finto.chiamate} chiamate, {client_finto.errori_429} errori 429 simulati.")
+    else:
+        with giro('sentiment'):
+            elabora_sentiment(budget=budget)
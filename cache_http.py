@@ -0,0 +1,127 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+from datetime import datetime
+
+# --- CACHE HTTP DELLE PAGINE PRODOTTO (ETag / Last-Modified + IMPRONTA DEL PREZZO) ---
+# Una riga per LINK_SCRAPING: validatori HTTP della notte precedente, impronta della parte
+# di pagina che influenza il prezzo e risultato dell'estrazione da riusare se nulla è cambiato.
+DIR_CACHE = '.cache'
+FILE_CACHE = os.path.join(DIR_CACHE, 'http_prodotti.db')
+
+# Frammenti della pagina da cui dipendono prezzo e disponibilità: si trovano con regex sui
+# byte grezzi, senza costruire il DOM (è proprio il parsing che vogliamo evitare).
+# Oltre ai singoli prezzi si prende per intero il contenitore del prezzo (data-controller="price" di
+# Tannico, itemprop price/offers): un prezzo scritto in un markup che le altre regex non conoscono
+# cambia comunque l'impronta. Tra cifre ed euro può esserci uno spazio qualunque, anche &nbsp;.
+SPAZIO = rb'(?:\s|\xc2\xa0|\xa0|&nbsp;|&#160;)*'
+EURO = rb'(?:\xe2\x82\xac|&euro;|&#8364;|EUR)'
+RE_FRAMMENTI_PREZZO = re.compile(
+    rb'<script[^>]+application/ld\+json[^>]*>.*?</script>'
+    rb'|<[^>]+data-controller=["\']?price["\'\s>][^>]*>(?:.{0,2048}?</div>|.{0,512})'
+    rb'|<[^>]+itemprop=["\'](?:price|lowPrice|highPrice|offers)["\'][^>]*>[^<]{0,64}'
+    rb'|["\']price["\']\s*:\s*["\']?[\d.,]+'
+    rb'|\d+[.,]\d{2}' + SPAZIO + EURO + rb'|' + EURO + SPAZIO + rb'\d+[.,]\d{2}'
+    rb'|<[^>]+class=["\'][^"\']*(?:price|discount|line-through)[^"\']*["\'][^>]*>[^<]{0,64}',
+    re.IGNORECASE | re.DOTALL)
+# Anche con impronta invariata, dopo questi giorni dall'ultimo parsing completo si riparsa (e senza
+# richiesta condizionale): una regex che non vede il prezzo non può congelarlo per sempre nello storico
+MAX_GIORNI_SENZA_PARSING = 7
+PAROLE_DISPONIBILITA = (b'non disponibile', b'esaurito')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pagine (
+    url TEXT PRIMARY KEY,
+    etag TEXT,
+    last_modified TEXT,
+    impronta TEXT,
+    byte INTEGER,
+    versione INTEGER,
+    risultato TEXT,
+    aggiornato TEXT,
+    parsato TEXT
+);
+"""
+
+def calcola_impronta(contenuto):
+    """Hash della sola parte di pagina rilevante per prezzo, sconto e stockout."""
+    h = hashlib.sha1()
+    for frammento in RE_FRAMMENTI_PREZZO.findall(contenuto):
+        h.update(frammento)
+        h.update(b'\x00')
+    minuscolo = contenuto.lower()
+    for parola in PAROLE_DISPONIBILITA:
+        h.update(b'%d' % minuscolo.count(parola))
+    return h.hexdigest()
+
+
+class CacheHttp:
+    def __init__(self, versione, file_cache=FILE_CACHE):
+        """versione: versione degli estrattori; i risultati salvati con un'altra versione vengono ignorati."""
+        os.makedirs(os.path.dirname(file_cache) or '.', exist_ok=True)
+        self.versione = versione
+        self.conn = sqlite3.connect(file_cache)
+        self.conn.executescript(SCHEMA)
+        if 'parsato' not in {r[1] for r in self.conn.execute("PRAGMA table_info(pagine)")}:
+            self.conn.execute("ALTER TABLE pagine ADD COLUMN parsato TEXT")  # cache di prima: si riparsa tutto una volta
+        self.voci = {
+            r[0]: {'etag': r[1], 'last_modified': r[2], 'impronta': r[3], 'byte': r[4] or 0, 'risultato': json.loads(r[5]), 'parsato': r[6]}
+            for r in self.conn.execute("SELECT url, etag, last_modified, impronta, byte, risultato, parsato FROM pagine WHERE versione = ?", (versione,))
+        }
+        self.oggi = datetime.now().date()
+        self.pagine_304 = 0
+        self.pagine_invariate = 0
+        self.byte_risparmiati = 0
+
+    def _da_riparsare(self, voce):
+        if not voce['parsato']:
+            return True
+        return (self.oggi - datetime.fromisoformat(voce['parsato']).date()).days >= MAX_GIORNI_SENZA_PARSING
+
+    def intestazioni_condizionali(self, url):
+        voce = self.voci.get(url)
+        if not voce or self._da_riparsare(voce):
+            return {}
+        intestazioni = {}
+        if voce['etag']: intestazioni['If-None-Match'] = voce['etag']
+        if voce['last_modified']: intestazioni['If-Modified-Since'] = voce['last_modified']
+        return intestazioni
+
+    def risultato_se_non_modificata(self, url):
+        """Da chiamare su una risposta 304: restituisce l'estrazione precedente."""
+        voce = self.voci.get(url)
+        if not voce:
+            return None
+        self.pagine_304 += 1
+        self.byte_risparmiati += voce['byte']
+        return dict(voce['risultato'])
+
+    def risultato_se_invariata(self, url, impronta):
+        """Da chiamare su una risposta 200: se la parte di prezzo non è cambiata si salta il parsing."""
+        voce = self.voci.get(url)
+        if not voce or voce['impronta'] != impronta or self._da_riparsare(voce):
+            return None
+        self.pagine_invariate += 1
+        return dict(voce['risultato'])
+
+    def aggiorna(self, url, intestazioni, impronta, byte, risultato, parsata=True):
+        """parsata=False quando il risultato è stato riusato: resta la data dell'ultimo parsing vero."""
+        adesso = datetime.now().isoformat(timespec='seconds')
+        precedente = self.voci.get(url)
+        parsato = adesso if parsata or not precedente else precedente['parsato']
+        voce = {'etag': intestazioni.get('etag'), 'last_modified': intestazioni.get('last_modified'),
+                'impronta': impronta, 'byte': byte, 'risultato': risultato, 'parsato': parsato}
+        self.voci[url] = voce
+        self.conn.execute(
+            "INSERT OR REPLACE INTO pagine (url, etag, last_modified, impronta, byte, versione, risultato, aggiornato, parsato) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (url, voce['etag'], voce['last_modified'], impronta, byte, self.versione,
+             json.dumps(risultato), adesso, parsato))
+
+    def chiudi(self):
+        self.conn.commit()
+        self.conn.close()
+        print(f"🗄️ Cache HTTP: {self.pagine_304} pagine 304, {self.pagine_invariate} pagine con prezzo invariato "
+              f"(parsing saltato), {self.byte_risparmiati / 1024:.0f} KB non scaricati")
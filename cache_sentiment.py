@@ -0,0 +1,63 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import unicodedata
+from datetime import datetime
+
+# --- CACHE DELLE RISPOSTE DEL MODELLO, INDIRIZZATA PER CONTENUTO ---
+# Chiave: hash del testo normalizzato della recensione + versione del prompt.
+# Stesso testo (anche con spazi o maiuscole diverse) e prompt compatibile = nessuna nuova chiamata API.
+# Sta in .cache, che il workflow notturno ripristina e salva tra una notte e l'altra (actions/cache)
+FILE_CACHE = os.path.join('.cache', 'cache_sentiment.db')
+FILE_CACHE_PRECEDENTE = os.path.join('public', 'data', 'cache_sentiment.db')
+
+RE_SPAZI = re.compile(r'\s+')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS risposte (
+    impronta TEXT NOT NULL,
+    versione_prompt TEXT NOT NULL,
+    risposta TEXT NOT NULL,
+    creata TEXT,
+    PRIMARY KEY (impronta, versione_prompt)
+);
+"""
+
+def normalizza_testo(testo):
+    testo = unicodedata.normalize('NFKC', str(testo))
+    return RE_SPAZI.sub(' ', testo).strip().casefold()
+
+def impronta_testo(testo):
+    return hashlib.sha256(normalizza_testo(testo).encode('utf-8')).hexdigest()
+
+
+class CacheSentiment:
+    def __init__(self, versione_prompt, file_cache=FILE_CACHE):
+        os.makedirs(os.path.dirname(file_cache) or '.', exist_ok=True)
+        if file_cache == FILE_CACHE and not os.path.exists(file_cache) and os.path.exists(FILE_CACHE_PRECEDENTE):
+            os.replace(FILE_CACHE_PRECEDENTE, file_cache)  # cache locale creata nel vecchio percorso
+        self.versione_prompt = versione_prompt
+        self.conn = sqlite3.connect(file_cache)
+        self.conn.executescript(SCHEMA)
+        self.colpi = 0
+
+    def leggi(self, impronta):
+        riga = self.conn.execute(
+            "SELECT risposta FROM risposte WHERE impronta = ? AND versione_prompt = ?",
+            (impronta, self.versione_prompt)).fetchone()
+        if riga is None:
+            return None
+        self.colpi += 1
+        return json.loads(riga[0])
+
+    def scrivi(self, impronta, risposta):
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO risposte VALUES (?, ?, ?, ?)",
+                (impronta, self.versione_prompt, json.dumps(risposta, ensure_ascii=False),
+                 datetime.now().isoformat(timespec='seconds')))
+
+    def chiudi(self):
+        self.conn.close()
@@ -1,81 +1,193 @@
-import pandas as pd
 import os
+import sqlite3
+import sys
+import pandas as pd
+from archivio_prezzi import apri_archivio, FILE_ARCHIVIO
+from lettura_dati import leggi_database_vini, converti_prezzi, FILE_VINI
 
-def check_errori():
-    file_storico = 'public/data/storico_prezzi.csv'
-    file_database = 'public/data/database_vini.csv'
+# --- AUDIT DEGLI ERRORI DI SCRAPING (INCREMENTALE) ---
+# Lo storico si legge a blocchi dal database, solo dalle righe aggiunte dopo l'ultimo audit (rowid > segnalibro).
+# Per ogni listing (ID_PRODOTTO, SITO_ORIGINE) l'indice tiene rilevazioni, errori, serie di errori consecutivi
+# e date dell'ultimo errore/successo: il report è una query sull'indice, non una scansione dello storico.
+# Errore = prezzo vuoto o non numerico (i prezzi 0 / "0,0" sono stockout voluti, non errori).
+FILE_INDICE = os.path.join('public', 'data', 'indice_errori.db')
+DIMENSIONE_BLOCCO = 10_000
+MAX_RIGHE_REPORT = 20
+MAX_PARAMETRI_SQL = 500   # chiavi per query quando si caricano dall'indice le voci toccate da un blocco
 
-    if not os.path.exists(file_storico):
-        print(f"Errore: Il file {file_storico} non esiste.")
-        return
+SCHEMA_INDICE = """
+CREATE TABLE IF NOT EXISTS indice_errori (
+    ID_PRODOTTO TEXT NOT NULL,
+    SITO_ORIGINE TEXT NOT NULL,
+    CANTINA TEXT,
+    NOME_PRODOTTO TEXT,
+    RILEVAZIONI INTEGER NOT NULL,
+    ERRORI INTEGER NOT NULL,
+    SERIE_ATTUALE INTEGER NOT NULL,
+    SERIE_MASSIMA INTEGER NOT NULL,
+    ULTIMO_ERRORE TEXT,
+    ULTIMO_SUCCESSO TEXT,
+    PRIMARY KEY (ID_PRODOTTO, SITO_ORIGINE)
+);
+CREATE TABLE IF NOT EXISTS stato_audit (
+    chiave TEXT PRIMARY KEY,
+    valore INTEGER NOT NULL
+);
+"""
+COLONNE_INDICE = ['ID_PRODOTTO', 'SITO_ORIGINE', 'CANTINA', 'NOME_PRODOTTO', 'RILEVAZIONI', 'ERRORI',
+                  'SERIE_ATTUALE', 'SERIE_MASSIMA', 'ULTIMO_ERRORE', 'ULTIMO_SUCCESSO']
 
-    if not os.path.exists(file_database):
-        print(f"Errore: Il file {file_database} non esiste.")
-        return
+def apri_indice(file_indice=FILE_INDICE):
+    conn = sqlite3.connect(file_indice)
+    conn.executescript(SCHEMA_INDICE)
+    return conn
+
+def _leggi_segnalibro(conn):
+    riga = conn.execute("SELECT valore FROM stato_audit WHERE chiave = 'ultimo_rowid'").fetchone()
+    return riga[0] if riga else 0
+
+# Upsert delle sole voci toccate: il resto dell'indice non si riscrive
+SQL_UPSERT_INDICE = f"""
+INSERT INTO indice_errori VALUES ({', '.join('?' * len(COLONNE_INDICE))})
+ON CONFLICT (ID_PRODOTTO, SITO_ORIGINE) DO UPDATE SET
+    {', '.join(f'{c} = excluded.{c}' for c in COLONNE_INDICE[2:])}
+"""
 
+def _carica_voci(conn, indice, chiavi):
+    """Porta in memoria le voci già nell'indice per i listing indicati (solo quelli non ancora caricati)."""
+    mancanti = [c for c in dict.fromkeys(chiavi) if c not in indice]
+    for inizio in range(0, len(mancanti), MAX_PARAMETRI_SQL):
+        gruppo = mancanti[inizio:inizio + MAX_PARAMETRI_SQL]
+        condizione = ' OR '.join(['(ID_PRODOTTO = ? AND SITO_ORIGINE = ?)'] * len(gruppo))
+        righe = conn.execute(f"SELECT {', '.join(COLONNE_INDICE)} FROM indice_errori WHERE {condizione}",
+                             [v for chiave in gruppo for v in chiave]).fetchall()
+        indice.update({(r[0], r[1]): dict(zip(COLONNE_INDICE, r)) for r in righe})
+
+def _aggiorna_voce(indice, id_prodotto, sito, cantina, nome, data, errore):
+    voce = indice.get((id_prodotto, sito))
+    if voce is None:
+        voce = indice[(id_prodotto, sito)] = {
+            'ID_PRODOTTO': id_prodotto, 'SITO_ORIGINE': sito, 'RILEVAZIONI': 0, 'ERRORI': 0,
+            'SERIE_ATTUALE': 0, 'SERIE_MASSIMA': 0, 'ULTIMO_ERRORE': None, 'ULTIMO_SUCCESSO': None}
+    voce['CANTINA'], voce['NOME_PRODOTTO'] = cantina, nome
+    voce['RILEVAZIONI'] += 1
+    if errore:
+        voce['ERRORI'] += 1
+        voce['SERIE_ATTUALE'] += 1
+        voce['SERIE_MASSIMA'] = max(voce['SERIE_MASSIMA'], voce['SERIE_ATTUALE'])
+        voce['ULTIMO_ERRORE'] = data
+    else:
+        voce['SERIE_ATTUALE'] = 0
+        voce['ULTIMO_SUCCESSO'] = data
+
+def aggiorna_indice(file_archivio=FILE_ARCHIVIO, file_indice=FILE_INDICE, da_capo=False, dimensione_blocco=DIMENSIONE_BLOCCO):
+    """Elabora a blocchi le sole righe dello storico successive al segnalibro; restituisce le righe lette."""
+    conn_indice = apri_indice(file_indice)
+    conn_archivio = apri_archivio(file_archivio)
     try:
-        # Carica lo storico prezzi (delimitatore punto e virgola)
-        df_storico = pd.read_csv(file_storico, sep=';')
-        # Rinominiamo le colonne dello storico per compatibilità
-        df_storico = df_storico.rename(columns={
-            'PREZZO_RILEVATO': 'Prezzo',
-            'CANTINA': 'Cantina',
-            'NOME_PRODOTTO': 'Vino',
-            'SITO_ORIGINE': 'Sito'
-        })
-        
-        # Carica il database dei vini (delimitatore punto e virgola)
-        df_database = pd.read_csv(file_database, sep=';')
-        # Rinominiamo le colonne del database per compatibilità
-        df_database = df_database.rename(columns={
-            'NOME_PRODOTTO': 'VINO',
-            'SITO_ORIGINE': 'SITO_ECOMMERCE',
-            'LINK_SCRAPING': 'LINK'
-        })
-    except Exception as e:
-        print(f"Errore nel caricamento dei file: {e}")
-        return
+        segnalibro = 0 if da_capo else _leggi_segnalibro(conn_indice)
+        ultimo_rowid = conn_archivio.execute("SELECT COALESCE(MAX(rowid), 0) FROM storico_prezzi").fetchone()[0]
+        if segnalibro > ultimo_rowid:
+            print("⚠️ L'archivio è stato ricostruito (segnalibro oltre l'ultima riga): ricalcolo l'indice da capo.")
+            segnalibro = 0
+        # In memoria solo le voci dei listing che compaiono nelle righe nuove
+        ricostruisci = segnalibro == 0
+        indice = {}
+
+        lette = 0
+        blocchi = pd.read_sql_query(
+            "SELECT rowid AS RIGA, DATA_ESTRAZIONE, ID_PRODOTTO, CANTINA, NOME_PRODOTTO, SITO_ORIGINE, PREZZO_RILEVATO "
+            "FROM storico_prezzi WHERE rowid > ? ORDER BY rowid",
+            conn_archivio, params=(segnalibro,), chunksize=dimensione_blocco)
+        for blocco in blocchi:
+            if blocco.empty:
+                continue
+            # Un solo passaggio vettoriale sul blocco, poi la scansione in ordine per le serie consecutive
+            blocco['ERRORE'] = converti_prezzi(blocco['PREZZO_RILEVATO']).isna()
+            if not ricostruisci:
+                _carica_voci(conn_indice, indice, zip(blocco['ID_PRODOTTO'], blocco['SITO_ORIGINE']))
+            for riga in blocco[['ID_PRODOTTO', 'SITO_ORIGINE', 'CANTINA', 'NOME_PRODOTTO', 'DATA_ESTRAZIONE', 'ERRORE']].itertuples(index=False):
+                _aggiorna_voce(indice, *riga)
+            lette += len(blocco)
+            segnalibro = int(blocco['RIGA'].iloc[-1])
+
+        # Indice e segnalibro nella stessa transazione: un audit interrotto non conta mai due volte le stesse righe
+        with conn_indice:
+            if ricostruisci:
+                conn_indice.execute("DELETE FROM indice_errori")
+            conn_indice.executemany(SQL_UPSERT_INDICE, [tuple(v[c] for c in COLONNE_INDICE) for v in indice.values()])
+            conn_indice.execute("INSERT OR REPLACE INTO stato_audit VALUES ('ultimo_rowid', ?)", (segnalibro,))
+        return lette
+    finally:
+        conn_archivio.close()
+        conn_indice.close()
+
+def leggi_indice(file_indice=FILE_INDICE):
+    conn = apri_indice(file_indice)
+    try:
+        df = pd.read_sql_query(f"SELECT {', '.join(COLONNE_INDICE)} FROM indice_errori", conn)
+    finally:
+        conn.close()
+    df['TASSO_ERRORI'] = df['ERRORI'] / df['RILEVAZIONI']
+    return df
 
-    # Assicuriamoci che la colonna Prezzo sia numerica (i non numerici diventano NaN)
-    df_storico['Prezzo_Numerico'] = pd.to_numeric(df_storico['Prezzo'], errors='coerce')
-
-    # Filtra: 
-    # 1. Prezzo è NaN (vuoto, nullo o non numerico)
-    # 2. Escludiamo i casi dove il prezzo è 0.0 (stockout volontari)
-    # Nota: pd.isna() cattura i NaN. I valori 0.0 NON sono NaN.
-    # Ma dobbiamo anche gestire i casi dove il prezzo potrebbe essere "vuoto" nel CSV originale.
-    
-    errori = df_storico[
-        (pd.isna(df_storico['Prezzo_Numerico'])) & 
-        (df_storico['Prezzo'].astype(str).str.strip().str.replace(',', '.') != '0.0') &
-        (df_storico['Prezzo'].astype(str).str.strip().str.replace(',', '.') != '0')
-    ]
-
-    # Se non ci sono errori diretti nel file, potremmo voler segnalare anche se mancano dei dati?
-    # Ma atteniamoci alla richiesta: "Filtra tutte le righe dove la colonna del prezzo è vuota..."
-
-    if errori.empty:
-        print("✅ Analisi completata: Nessun errore di scraping (prezzi non validi) trovato nello storico.")
+def stampa_report(df_indice, file_database=FILE_VINI, max_righe=MAX_RIGHE_REPORT):
+    if df_indice.empty:
+        print("Indice vuoto: nessuna rilevazione nello storico.")
         return
 
-    # Join con il database per recuperare i link
-    # Usiamo Cantina, Vino e Sito come chiavi di join
-    errori_con_link = pd.merge(
-        errori, 
-        df_database[['CANTINA', 'VINO', 'SITO_ECOMMERCE', 'LINK']], 
-        left_on=['Cantina', 'Vino', 'Sito'], 
-        right_on=['CANTINA', 'VINO', 'SITO_ECOMMERCE'], 
-        how='left'
-    )
-
-    print(f"🔎 TROVATI {len(errori_con_link)} ERRORI DI SCRAPING (Prezzo non catturato):\n")
+    # 1. Salute degli estrattori: un estrattore è rotto quando molti dei suoi listing falliscono di fila
+    per_sito = (df_indice.assign(IN_ERRORE=df_indice['SERIE_ATTUALE'] > 0)
+                .groupby('SITO_ORIGINE')
+                .agg(LISTING=('ID_PRODOTTO', 'size'), IN_ERRORE=('IN_ERRORE', 'sum'),
+                     ERRORI=('ERRORI', 'sum'), RILEVAZIONI=('RILEVAZIONI', 'sum'),
+                     SERIE_IN_CORSO=('SERIE_ATTUALE', 'max'), SERIE_MASSIMA=('SERIE_MASSIMA', 'max')))
+    per_sito['QUOTA_IN_ERRORE'] = per_sito['IN_ERRORE'] / per_sito['LISTING']
+    per_sito['TASSO_STORICO'] = per_sito['ERRORI'] / per_sito['RILEVAZIONI']
+    per_sito = per_sito.sort_values(['QUOTA_IN_ERRORE', 'SERIE_IN_CORSO', 'TASSO_STORICO'], ascending=False)
+
+    print("🩺 SALUTE DEGLI ESTRATTORI (per sito)")
     print("-" * 60)
+    for sito, r in per_sito.iterrows():
+        stato = "🔴" if r['QUOTA_IN_ERRORE'] >= 0.5 else "🟠" if r['IN_ERRORE'] else "🟢"
+        print(f"{stato} {sito:<12} {int(r['IN_ERRORE'])}/{int(r['LISTING'])} listing in errore ora | "
+              f"serie in corso {int(r['SERIE_IN_CORSO'])} (max {int(r['SERIE_MASSIMA'])}) | tasso storico {r['TASSO_STORICO']:.1%}")
+
+    # 2. Listing che falliscono adesso, dal più lungo di fila
+    in_errore = df_indice[df_indice['SERIE_ATTUALE'] > 0].sort_values(['SERIE_ATTUALE', 'TASSO_ERRORI'], ascending=False)
+    if in_errore.empty:
+        print("\n✅ Nessun listing in errore nell'ultima rilevazione.")
+        return
 
-    for _, row in errori_con_link.iterrows():
-        print(f"🍷 VINO: {row['Vino']}")
-        print(f"🏢 SITO: {row['Sito']}")
-        print(f"🔗 LINK: {row['LINK']}")
+    link = {}
+    if os.path.exists(file_database):
+        df_database = leggi_database_vini(file_database)
+        link = {(r.ID_PRODOTTO, r.SITO_ORIGINE): r.LINK_SCRAPING for r in df_database.itertuples(index=False)}
+
+    print(f"\n🔎 {len(in_errore)} LISTING IN ERRORE (Prezzo non catturato), i primi {min(max_righe, len(in_errore))}:\n")
+    print("-" * 60)
+    for _, row in in_errore.head(max_righe).iterrows():
+        print(f"🍷 VINO: {row['NOME_PRODOTTO']} ({row['ID_PRODOTTO']})")
+        print(f"🏢 SITO: {row['SITO_ORIGINE']}")
+        print(f"📉 {row['SERIE_ATTUALE']} errori di fila (max {row['SERIE_MASSIMA']}), {row['ERRORI']}/{row['RILEVAZIONI']} in totale "
+              f"({row['TASSO_ERRORI']:.0%}), ultimo successo: {row['ULTIMO_SUCCESSO'] if pd.notna(row['ULTIMO_SUCCESSO']) else 'mai'}")
+        print(f"🔗 LINK: {link.get((row['ID_PRODOTTO'], row['SITO_ORIGINE']))}")
         print("-" * 60)
 
+def check_errori(da_capo=False):
+    file_storico = 'public/data/storico_prezzi.csv'
+
+    if not os.path.exists(file_storico) and not os.path.exists(FILE_ARCHIVIO):
+        print(f"Errore: Il file {file_storico} non esiste.")
+        return
+
+    try:
+        lette = aggiorna_indice(da_capo=da_capo)
+    except Exception as e:
+        print(f"Errore nell'aggiornamento dell'indice errori: {e}")
+        return
+    print(f"📥 Audit incrementale: {lette} nuove rilevazioni elaborate.\n")
+    stampa_report(leggi_indice())
+
 if __name__ == "__main__":
-    check_errori()
+    check_errori(da_capo='--da-capo' in sys.argv)
@@ -0,0 +1,141 @@
+import os
+import sqlite3
+from abc import ABC, abstractmethod
+
+from giornale_csv import GiornaleCsv
+from metriche import span, conta
+
+# --- DESTINAZIONI DELLE RIGHE ESTRATTE (GOOGLE SHEETS, CSV, SQLITE) ---
+# Gli scraper accodano le righe con aggiungi() e non parlano più direttamente con il foglio: tutto resta
+# in memoria e scarica() le scrive in un colpo solo alla fine del giro (una append_rows su Sheets invece
+# di una append_row per prezzo, un solo commit su CSV e SQLite). Il backend si sceglie per nome
+# (--destinazione sheets|csv|sqlite|finto); 'finto' è il foglio locale di sheets_finto.py per le prove offline.
+NOME_FOGLIO = "Prezzi"
+FILE_CREDENZIALI = 'credenziali.json'
+MAX_RIGHE_PER_CHIAMATA = 500   # append_rows molto grandi si spezzano per restare nei limiti di una richiesta
+DESTINAZIONI = ('sheets', 'csv', 'sqlite', 'finto')
+
+
+class Destinazione(ABC):
+    """Buffer di righe (liste nell'ordine di colonne) con una sola scrittura per giro."""
+    nome = 'destinazione'
+
+    def __init__(self, colonne):
+        self.colonne = list(colonne)
+        self.scritte = 0
+        self.chiamate = 0   # round trip verso il backend (richieste API per Sheets)
+        self._righe = []
+
+    def aggiungi(self, riga):
+        if len(riga) != len(self.colonne):
+            raise ValueError(f"Riga di {len(riga)} valori per {len(self.colonne)} colonne: {riga}")
+        self._righe.append(list(riga))
+
+    def scarica(self):
+        """Scrive le righe in attesa; restituisce quante ne ha scritte."""
+        if not self._righe:
+            return 0
+        with span(f'scrittura_{self.nome}'):
+            self.chiamate += self._scrivi(self._righe)
+        scritte, self._righe = len(self._righe), []
+        self.scritte += scritte
+        return scritte
+
+    @abstractmethod
+    def _scrivi(self, righe):
+        """Scrive le righe sul backend; restituisce il numero di round trip usati."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, errore, traccia):
+        # Anche se lo scraper si ferma a metà, le righe già estratte non vanno perse. Se però anche la
+        # scrittura fallisce, l'errore che resta in primo piano è quello dello scraper (con l'altro come causa)
+        if tipo is None:
+            self.scarica()
+            return False
+        try:
+            self.scarica()
+        except Exception as errore_scrittura:
+            raise errore from errore_scrittura
+        return False
+
+
+class DestinazioneSheets(Destinazione):
+    nome = 'sheets'
+
+    def __init__(self, colonne, link_foglio=None, nome_foglio=NOME_FOGLIO, credenziali=FILE_CREDENZIALI, foglio=None):
+        super().__init__(colonne)
+        self.link_foglio = link_foglio
+        self.nome_foglio = nome_foglio
+        self.credenziali = credenziali
+        self._foglio = foglio  # Worksheet già aperto (o FoglioFinto): nessuna connessione a Google
+
+    def foglio(self):
+        if self._foglio is None:
+            # Import qui: i backend locali non richiedono gspread né le credenziali
+            import gspread
+            gc = gspread.service_account(filename=self.credenziali)
+            self._foglio = gc.open_by_url(self.link_foglio).worksheet(self.nome_foglio)
+        return self._foglio
+
+    def _scrivi(self, righe):
+        foglio = self.foglio()
+        chiamate = 0
+        for inizio in range(0, len(righe), MAX_RIGHE_PER_CHIAMATA):
+            foglio.append_rows(righe[inizio:inizio + MAX_RIGHE_PER_CHIAMATA], value_input_option='RAW')
+            chiamate += 1
+        conta('chiamate_sheets', chiamate)
+        return chiamate
+
+
+class DestinazioneCsv(Destinazione):
+    nome = 'csv'
+
+    def __init__(self, colonne, percorso):
+        super().__init__(colonne)
+        self.percorso = percorso
+
+    def _scrivi(self, righe):
+        os.makedirs(os.path.dirname(self.percorso) or '.', exist_ok=True)
+        with GiornaleCsv(self.percorso, self.colonne, dimensione_lotto=len(righe)) as giornale:
+            giornale.scrivi_tutti(dict(zip(self.colonne, riga)) for riga in righe)
+        return 1
+
+
+class DestinazioneSqlite(Destinazione):
+    nome = 'sqlite'
+
+    def __init__(self, colonne, percorso, tabella='righe_estratte'):
+        super().__init__(colonne)
+        self.percorso = percorso
+        self.tabella = tabella
+
+    def _scrivi(self, righe):
+        os.makedirs(os.path.dirname(self.percorso) or '.', exist_ok=True)
+        conn = sqlite3.connect(self.percorso)
+        try:
+            with conn:
+                conn.execute(f"CREATE TABLE IF NOT EXISTS {self.tabella} ({', '.join(self.colonne)})")
+                conn.executemany(f"INSERT INTO {self.tabella} ({', '.join(self.colonne)}) VALUES ({', '.join('?' * len(self.colonne))})", righe)
+        finally:
+            conn.close()
+        return 1
+
+
+def crea_destinazione(tipo, colonne, file_locale, **opzioni):
+    """file_locale senza estensione: diventa .csv o .db secondo il backend."""
+    if tipo == 'sheets':
+        return DestinazioneSheets(colonne, **opzioni)
+    if tipo == 'finto':
+        from sheets_finto import FoglioFinto
+        return DestinazioneSheets(colonne, foglio=FoglioFinto(opzioni.get('nome_foglio', NOME_FOGLIO)))
+    if tipo == 'csv':
+        return DestinazioneCsv(colonne, file_locale + '.csv')
+    if tipo == 'sqlite':
+        return DestinazioneSqlite(colonne, file_locale + '.db', opzioni.get('tabella', 'righe_estratte'))
+    raise ValueError(f"Destinazione sconosciuta '{tipo}': scegli tra {', '.join(DESTINAZIONI)}")
+
+def destinazione_da_argomenti(argomenti, predefinita='sheets'):
+    """--destinazione <tipo> dalla riga di comando."""
+    return argomenti[argomenti.index('--destinazione') + 1] if '--destinazione' in argomenti else predefinita
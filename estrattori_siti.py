@@ -0,0 +1,175 @@
+import re
+import json
+from abc import ABC, abstractmethod
+from functools import lru_cache
+
+# --- REGISTRO DEGLI ESTRATTORI PER MARKETPLACE ---
+# Per aggiungere un marketplace basta una nuova classe decorata con @registra_estrattore:
+# il ciclo principale di bot_prezzi.py la trova da solo tramite SITO_ORIGINE.
+REGISTRO_ESTRATTORI = {}
+# Da incrementare quando cambia la logica di un estrattore: invalida i risultati nella cache HTTP
+VERSIONE_ESTRATTORI = 1
+
+# Capacità dichiarate dagli estrattori
+JSON_LD = 'json_ld'
+MICRODATA = 'microdata'
+SCONTI = 'sconti'
+
+RE_NON_NUMERICO = re.compile(r'[^\d,.-]')
+
+def pulisci_prezzo(testo):
+    if not testo: return None
+    try:
+        pulito = str(testo).replace('€', '').replace('\xa0', '').strip()
+        pulito = RE_NON_NUMERICO.sub('', pulito).replace(',', '.')
+        return float(pulito)
+    except:
+        return None
+
+def risultato(p_orig=None, p_scont=None, stockout=False):
+    return {'prezzo_originale': p_orig, 'prezzo_scontato': p_scont, 'stockout': stockout}
+
+def registra_estrattore(cls):
+    """Istanzia l'estrattore una volta sola (regex e selettori compilati all'avvio) e lo registra."""
+    REGISTRO_ESTRATTORI[cls.chiave] = cls()
+    normalizza_sito.cache_clear()
+    return cls
+
+@lru_cache(maxsize=None)
+def normalizza_sito(sito_origine):
+    """Riconduce SITO_ORIGINE (es. 'Vino.com', ' TANNICO ') alla chiave registrata."""
+    sito = str(sito_origine).strip().lower()
+    if sito in REGISTRO_ESTRATTORI:
+        return sito
+    for chiave in REGISTRO_ESTRATTORI:
+        if chiave in sito:
+            return chiave
+    return sito
+
+def trova_estrattore(sito_origine):
+    return REGISTRO_ESTRATTORI.get(normalizza_sito(sito_origine))
+
+
+class EstrattoreSito(ABC):
+    chiave = None
+    capacita = frozenset()
+
+    @abstractmethod
+    def estrai(self, pagina):
+        """Riceve una PaginaProdotto e restituisce {'prezzo_originale', 'prezzo_scontato', 'stockout'}."""
+
+
+@registra_estrattore
+class EstrattoreTannico(EstrattoreSito):
+    chiave = 'tannico'
+    capacita = frozenset({JSON_LD, MICRODATA, SCONTI})
+
+    RE_PREZZO_JSON = re.compile(r'"price":\s*"?(\d+[.,]?\d*)"?')
+    RE_SCONTATO = re.compile('tw-text-blue|tw-text-red|discount')
+    RE_ORIGINALE = re.compile('tw-line-through|original')
+    RE_BASE = re.compile('tw-font-bold|current')
+
+    def estrai(self, pagina):
+        is_stockout = "non disponibile" in pagina.testo_lower
+        p_orig, p_scont = None, None
+        try:
+            for script in pagina.json_ld:
+                if script and 'price' in script.lower():
+                    match_price = self.RE_PREZZO_JSON.search(script)
+                    if match_price:
+                        p_orig = float(match_price.group(1).replace(',', '.'))
+                        break
+        except Exception: pass
+
+        if not p_orig:
+            try:
+                if pagina.nodi_prezzo:
+                    prezzo_tag = pagina.nodi_prezzo[0]
+                    p_orig = pulisci_prezzo(prezzo_tag['content'] or prezzo_tag['testo'])
+            except Exception: pass
+
+        if not p_orig:
+            try:
+                spans = pagina.span_contenitore_prezzo
+                if spans:
+                    scont_tag = next((t for c, t in spans if self.RE_SCONTATO.search(c)), None)
+                    orig_tag = next((t for c, t in spans if self.RE_ORIGINALE.search(c)), None)
+                    if scont_tag is not None:
+                        p_scont = pulisci_prezzo(scont_tag)
+                        p_orig = pulisci_prezzo(orig_tag) if orig_tag is not None else p_scont
+                    else:
+                        base_tag = next((t for c, t in spans if self.RE_BASE.search(c)), None)
+                        p_orig = pulisci_prezzo(base_tag) if base_tag is not None else None
+            except Exception: pass
+        return risultato(p_orig, p_scont, is_stockout)
+
+
+@registra_estrattore
+class EstrattoreCallmewine(EstrattoreSito):
+    chiave = 'callmewine'
+    capacita = frozenset({JSON_LD})
+
+    def estrai(self, pagina):
+        is_stockout = "non disponibile" in pagina.testo_lower or "esaurito" in pagina.testo_lower
+        p_orig = None
+        for script in pagina.json_ld:
+            try:
+                dati = json.loads(script)
+                if 'offers' in dati and 'price' in dati['offers']:
+                    p_orig = float(dati['offers']['price'])
+                    break
+            except: continue
+        return risultato(p_orig, None, is_stockout)
+
+
+@registra_estrattore
+class EstrattoreVinocom(EstrattoreSito):
+    chiave = 'vino.com'
+    capacita = frozenset({MICRODATA})
+
+    def estrai(self, pagina):
+        is_stockout = "non disponibile" in pagina.testo_lower
+        p_orig = None
+        if pagina.nodi_prezzo:
+            tag_prezzo = pagina.nodi_prezzo[0]
+            p_orig = pulisci_prezzo(tag_prezzo['content'] or tag_prezzo['testo'])
+        return risultato(p_orig, None, is_stockout)
+
+
+@registra_estrattore
+class EstrattoreXtrawine(EstrattoreSito):
+    chiave = 'xtrawine'
+    capacita = frozenset()
+
+    RE_PREZZO_JS = re.compile(r'["\']price["\']\s*:\s*["\']?(\d+[,\.]\d+)["\']?', re.IGNORECASE)
+    RE_PREZZO_EURO = re.compile(r'(\d+[,\.]\d{2})\s*€|€\s*(\d+[,\.]\d{2})')
+
+    def estrai(self, pagina):
+        is_stockout = "non disponibile" in pagina.html_lower or "esaurito" in pagina.html_lower
+        p_orig = None
+        for p in self.RE_PREZZO_JS.findall(pagina.html):
+            val = pulisci_prezzo(p)
+            if val and val > 0:
+                p_orig = val
+                break
+        if not p_orig:
+            for p_tupla in self.RE_PREZZO_EURO.findall(pagina.testo):
+                p_testo = p_tupla[0] if p_tupla[0] else p_tupla[1]
+                val = pulisci_prezzo(p_testo)
+                if val and val > 0:
+                    p_orig = val
+                    break
+        return risultato(p_orig, None, is_stockout)
+
+
+@registra_estrattore
+class EstrattoreBernabei(EstrattoreSito):
+    chiave = 'bernabei'
+    capacita = frozenset({MICRODATA})
+
+    def estrai(self, pagina):
+        is_stockout = "non disponibile" in pagina.testo_lower
+        p_orig = None
+        tag_prezzo = next((n for n in pagina.nodi_prezzo if n['tag'] == 'span'), None)
+        if tag_prezzo: p_orig = pulisci_prezzo(tag_prezzo['testo'])
+        return risultato(p_orig, None, is_stockout)
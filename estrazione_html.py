@@ -0,0 +1,74 @@
+import re
+from functools import cached_property
+
+# Parser veloce (lexbor) se disponibile, altrimenti BeautifulSoup come rete di salvataggio
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+from bs4 import BeautifulSoup
+
+TAG_SENZA_TESTO = ['script', 'style', 'template', 'noscript']
+
+
+class PaginaProdotto:
+    """Vista della pagina prodotto calcolata UNA sola volta e condivisa da tutti gli estrattori.
+
+    Espone solo dati semplici (stringhe, liste, dizionari), così le strategie dei singoli
+    marketplace non dipendono dal parser usato:
+    - json_ld: contenuto testuale dei blocchi <script type="application/ld+json">
+    - nodi_prezzo: nodi con itemprop="price" come {'tag', 'content', 'testo'}
+    - span_contenitore_prezzo: (classi, testo) degli span nel primo contenitore prezzo
+    - testo / testo_lower: testo visibile (senza script e stili), come soup.text
+    - html / html_lower: sorgente decodificato, per le ricerche regex sull'intero documento
+    """
+
+    def __init__(self, contenuto, parser='auto'):
+        # parser='bs4' forza il vecchio percorso (usato dal benchmark per il confronto)
+        self._contenuto = contenuto
+        if LexborHTMLParser is not None and parser != 'bs4':
+            self._analizza_lexbor(contenuto)
+        else:
+            self._analizza_bs4(contenuto)
+
+    def _analizza_lexbor(self, contenuto):
+        albero = LexborHTMLParser(contenuto)
+        self.json_ld = [n.text(deep=True) for n in albero.css('script[type="application/ld+json"]')]
+        self.nodi_prezzo = [
+            {'tag': n.tag, 'content': n.attributes.get('content'), 'testo': n.text(deep=True)}
+            for n in albero.css('[itemprop="price"]')
+        ]
+        contenitore = albero.css_first('div[data-controller="price"]') or albero.css_first('div[class*="price" i]')
+        self.span_contenitore_prezzo = [
+            (n.attributes.get('class') or '', n.text(deep=True)) for n in contenitore.css('span[class]')
+        ] if contenitore else []
+        # Gli script sono già stati letti: li togliamo per avere lo stesso testo di soup.text
+        albero.strip_tags(TAG_SENZA_TESTO)
+        self.testo = albero.root.text(deep=True) if albero.root else ''
+
+    def _analizza_bs4(self, contenuto):
+        soup = BeautifulSoup(contenuto, 'html.parser')
+        self.json_ld = [s.string or '' for s in soup.find_all('script', type='application/ld+json')]
+        self.nodi_prezzo = [
+            {'tag': n.name, 'content': n.get('content'), 'testo': n.text}
+            for n in soup.find_all(attrs={'itemprop': 'price'})
+        ]
+        contenitore = soup.find('div', {'data-controller': 'price'}) or soup.find('div', class_=re.compile('price', re.I))
+        self.span_contenitore_prezzo = [
+            (' '.join(n.get('class', [])), n.text) for n in contenitore.find_all('span', class_=True)
+        ] if contenitore else []
+        self.testo = soup.text
+
+    @cached_property
+    def testo_lower(self):
+        return self.testo.lower()
+
+    @cached_property
+    def html(self):
+        if isinstance(self._contenuto, str):
+            return self._contenuto
+        return self._contenuto.decode('utf-8', errors='replace')
+
+    @cached_property
+    def html_lower(self):
+        return self.html.lower()
@@ -0,0 +1,62 @@
+import asyncio
+import json
+import random
+
+# --- CLIENT GEMINI FINTO (PROVE OFFLINE DEL MOTORE SENTIMENT) ---
+# Imita client.aio.models.generate_content: legge l'array di recensioni in coda al prompt
+# e risponde con un JSON per id. Può simulare latenza ed errori 429 per provare il rate limiting,
+# elementi persi e risposte in ordine diverso da quello della richiesta.
+PAROLE_POSITIVE = ('buon', 'ottim', 'eleg', 'top', 'great', 'good', 'lekker', 'gut', 'excellent', 'fresc')
+PAROLE_NEGATIVE = ('acid', 'tappat', 'cattiv', 'bad', 'sour', 'schlecht', 'deluden', 'costos')
+
+class RispostaFinta:
+    def __init__(self, text):
+        self.text = text
+
+class ModelliFinti:
+    def __init__(self, client):
+        self._client = client
+
+    async def generate_content(self, model, contents, config=None):
+        c = self._client
+        c.chiamate += 1
+        await asyncio.sleep(c.latenza)
+        if c.chiamate <= c.primi_429 or c.rng.random() < c.probabilita_429:
+            c.errori_429 += 1
+            raise RuntimeError("429 RESOURCE_EXHAUSTED. {'retryDelay': '1s'}")
+
+        elenco = json.loads(contents.rsplit('\n', 1)[1])  # l'elenco JSON è sempre l'ultima riga del prompt
+        risposta = []
+        for voce in elenco:
+            if voce['id'] in c.id_da_perdere:
+                continue  # simula il modello che "dimentica" un elemento del batch
+            testo = voce['testo'].lower()
+            pos = [p for p in PAROLE_POSITIVE if p in testo]
+            neg = [p for p in PAROLE_NEGATIVE if p in testo]
+            sentiment = 'Positivo' if len(pos) > len(neg) else 'Negativo' if neg else 'Neutro'
+            risposta.append({
+                'id': voce['id'],
+                'testo_tradotto': voce['testo'],
+                'sentiment_generale': sentiment,
+                'parole_positive': ', '.join(pos),
+                'parole_negative': ', '.join(neg),
+            })
+        if c.mescola:
+            c.rng.shuffle(risposta)
+        return RispostaFinta(json.dumps(risposta, ensure_ascii=False))
+
+class _Aio:
+    def __init__(self, client):
+        self.models = ModelliFinti(client)
+
+class ClientFinto:
+    def __init__(self, latenza=0.05, probabilita_429=0.0, id_da_perdere=(), seme=42, primi_429=0, mescola=False):
+        self.latenza = latenza
+        self.probabilita_429 = probabilita_429
+        self.primi_429 = primi_429      # le prime N chiamate rispondono sempre 429
+        self.mescola = mescola          # risposta in ordine casuale rispetto agli id richiesti
+        self.id_da_perdere = set(id_da_perdere)
+        self.rng = random.Random(seme)
+        self.chiamate = 0
+        self.errori_429 = 0
+        self.aio = _Aio(self)
@@ -0,0 +1,118 @@
+import csv
+import io
+import math
+import os
+
+from metriche import span
+
+# --- GIORNALE CSV: SCRITTURA IN CODA A LOTTI, SICURA AI CRASH ---
+# Il file resta aperto per tutto il giro; i record si accumulano in memoria e a ogni commit() (o quando il
+# lotto è pieno) vengono scritti in un'unica write seguita da fsync. Ogni record occupa esattamente una riga
+# fisica (gli a capo nei testi diventano spazi): se il processo muore a metà scrittura, all'apertura
+# successiva l'ultima riga senza a capo viene tagliata e il file torna a finire su un record completo.
+# Il giornale chiude ogni record con l'a capo, quindi una riga senza è sempre una scrittura interrotta,
+# anche quando ha il numero giusto di colonne (il taglio può cadere dentro l'ultimo campo). Solo per file
+# scritti a mano si può chiedere di tenerla con riga_finale_valida=True.
+# Stesso formato dei CSV del progetto: separatore ';', BOM utf-8 solo in testa al file.
+DIMENSIONE_LOTTO = 50
+
+
+def _valore(valore):
+    if valore is None or (isinstance(valore, float) and math.isnan(valore)):
+        return ''
+    if isinstance(valore, str):
+        return valore.replace('\r', ' ').replace('\n', ' ')
+    return valore
+
+def ripara_coda(percorso, riga_finale_valida=False):
+    """Sistema la fine del file se l'ultima riga non ha l'a capo; restituisce cosa ha fatto (None se nulla).
+    Di norma la riga viene tagliata; con riga_finale_valida=True (file scritti a mano o da altri
+    programmi senza a capo finale) si tiene e si chiude con l'a capo."""
+    with open(percorso, 'rb+') as f:
+        dimensione = f.seek(0, os.SEEK_END)
+        posizione = dimensione
+        while posizione > 0:
+            blocco = min(64 * 1024, posizione)
+            f.seek(posizione - blocco)
+            dati = f.read(blocco)
+            if posizione == dimensione and dati.endswith(b'\n'):
+                return None
+            ultimo_a_capo = dati.rfind(b'\n')
+            if ultimo_a_capo >= 0:
+                posizione = posizione - blocco + ultimo_a_capo + 1
+                break
+            posizione -= blocco
+        if riga_finale_valida:
+            f.seek(0, os.SEEK_END)
+            f.write(b'\n')
+            esito = "aggiunto l'a capo mancante all'ultima riga"
+        else:
+            f.truncate(posizione)
+            esito = f"rimossa una riga incompleta di {dimensione - posizione} byte (scrittura interrotta)"
+        f.flush()
+        os.fsync(f.fileno())
+    return esito
+
+def leggi_intestazione(percorso):
+    with open(percorso, encoding='utf-8-sig', newline='') as f:
+        return next(csv.reader(f, delimiter=';'), None)
+
+
+class GiornaleCsv:
+    def __init__(self, percorso, colonne, dimensione_lotto=DIMENSIONE_LOTTO, riga_finale_valida=False):
+        self.percorso = percorso
+        self.dimensione_lotto = dimensione_lotto
+        self.scritti = 0
+        self._lotto = []
+
+        esistente = os.path.exists(percorso) and os.path.getsize(percorso) > 0
+        if esistente:
+            esito = ripara_coda(percorso, riga_finale_valida)
+            if esito:
+                print(f"🩹 {percorso}: {esito}.")
+        # Su un file esistente comanda la sua intestazione: le colonne mancanti restano vuote
+        intestazione = leggi_intestazione(percorso) if esistente else None
+        self.colonne = intestazione or list(colonne)
+        self._file = open(percorso, 'a', encoding='utf-8', newline='')
+        if not intestazione:
+            self._file.write('\ufeff' + ';'.join(self.colonne) + '\n')
+            self._sincronizza()
+
+    def _sincronizza(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def scrivi(self, record):
+        self._lotto.append([_valore(record.get(c)) for c in self.colonne])
+        if len(self._lotto) >= self.dimensione_lotto:
+            self.commit()
+
+    def scrivi_tutti(self, records):
+        for record in records:
+            self.scrivi(record)
+
+    def commit(self):
+        """Scrive su disco i record in attesa con una sola write + fsync."""
+        if not self._lotto:
+            return 0
+        with span('scrittura_csv'):
+            buffer = io.StringIO()
+            csv.writer(buffer, delimiter=';', lineterminator='\n').writerows(self._lotto)
+            self._file.write(buffer.getvalue())
+            self._sincronizza()
+        scritti, self._lotto = len(self._lotto), []
+        self.scritti += scritti
+        return scritti
+
+    def chiudi(self):
+        try:
+            self.commit()
+        finally:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *errore):
+        self.chiudi()
+        return False
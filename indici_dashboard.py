@@ -0,0 +1,51 @@
+# --- INDICI PER I FILTRI DELLA DASHBOARD ---
+# Le colonne testuali ripetute (cantina, vino, sito, sentiment) diventano categoriche: ogni valore è un
+# codice intero invece di una stringa Python. Poi il frame viene ordinato per (prodotto, data), così una
+# selezione della sidebar è una ricerca binaria sull'indice invece di un confronto riga per riga.
+CATEGORICHE_PREZZI = ['ID_PRODOTTO', 'CANTINA', 'NOME_PRODOTTO', 'SITO_ORIGINE']
+CHIAVI_PREZZI = ['CANTINA', 'NOME_PRODOTTO', 'GIORNO']
+
+CATEGORICHE_SENTIMENT = ['ID_PRODOTTO', 'NOME_PRODOTTO', 'CATEGORIA_PRODOTTO', 'SITO_ECOMMERCE', 'SENTIMENT_SCORE']
+CHIAVI_SENTIMENT = ['NOME_PRODOTTO', 'DATA_COMMENTO']
+
+def indicizza(df, chiavi, categoriche=()):
+    """Converte in categoriche le colonne indicate e restituisce il frame ordinato con indice su `chiavi`
+    (l'ultima chiave è la data)."""
+    df = df.copy()
+    for colonna in categoriche:
+        if colonna in df.columns:
+            df[colonna] = df[colonna].astype('category')
+    return df.set_index(chiavi).sort_index()
+
+def valori_livello(df, livello, **filtri):
+    """Valori distinti di un livello dell'indice (per le selectbox), eventualmente ristretti ai livelli precedenti."""
+    if filtri:
+        df = seleziona(df, *filtri.values(), reimposta=False)
+    valori = df.index.get_level_values(livello)
+    return sorted(valori.dropna().unique())
+
+def seleziona(df, *chiavi, inizio=None, fine=None, reimposta=True):
+    """Fetta dell'indice per le chiavi date (prefisso dell'indice) e l'intervallo di date [inizio, fine].
+    Con reimposta=True le chiavi tornano colonne, come nel frame originale."""
+    n_livelli = df.index.nlevels
+    selettore = tuple(chiavi) + (slice(None),) * (n_livelli - len(chiavi))
+    if inizio is not None or fine is not None:
+        selettore = selettore[:-1] + (slice(inizio, fine),)
+    try:
+        fetta = df.loc[selettore, :]
+    except KeyError:
+        fetta = df.iloc[0:0]
+    return fetta.reset_index() if reimposta else fetta
+
+def memoria_mb(df):
+    return df.memory_usage(deep=True, index=True).sum() / 1024 ** 2
+
+def date_estreme(df):
+    date = df.index.get_level_values(-1)
+    return date.min(), date.max()
+
+if __name__ == "__main__":
+    from archivio_prezzi import leggi_cubo
+    grezzo = leggi_cubo()
+    indicizzato = indicizza(grezzo, CHIAVI_PREZZI, CATEGORICHE_PREZZI)
+    print(f"Cubo prezzi: {memoria_mb(grezzo):.1f} MB -> {memoria_mb(indicizzato):.1f} MB con categoriche e indice")
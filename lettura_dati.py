@@ -0,0 +1,155 @@
+import csv
+import io
+import itertools
+import os
+
+import pandas as pd
+
+# --- LETTURA UNIFICATA DEI CSV DEL PROGETTO ---
+# Un solo punto in cui si decidono separatore, BOM, tipi delle colonne e parsing di date e prezzi.
+# Le date si convertono provando i formati noti uno alla volta, ciascuno vettoriale sulle sole celle
+# ancora vuote, e solo sui valori distinti: molto più veloce dell'inferenza elemento per elemento di
+# format='mixed', che in più con dayfirst=True scambia giorno e mese nelle date ISO (2019-11-07 -> 11 luglio).
+DIR_DATA = os.path.join('public', 'data')
+FILE_VINI = os.path.join(DIR_DATA, 'database_vini.csv')
+FILE_STORICO_CSV = os.path.join(DIR_DATA, 'storico_prezzi.csv')
+FILE_SENTIMENT_RAW = os.path.join(DIR_DATA, 'sentiment_vini_raw.csv')
+FILE_SENTIMENT = os.path.join(DIR_DATA, 'sentiment_vini_elaborato.csv')
+
+# Bot prezzi e dashboard: %d/%m/%Y; scraper Vivino: ISO; scraper_reale.py: con l'ora
+FORMATI_DATA = ('%d/%m/%Y', '%Y-%m-%d', '%d/%m/%Y %H:%M', '%d/%m/%Y %H:%M:%S')
+
+# Tipi dichiarati: 'data', 'prezzo' (anche con virgola decimale), 'numero', 'categoria'; il resto è testo
+SCHEMA_VINI = {'PREZZO_BASE': 'prezzo', 'CANTINA': 'categoria', 'SITO_ORIGINE': 'categoria'}
+SCHEMA_STORICO = {'DATA_ESTRAZIONE': 'data', 'PREZZO_RILEVATO': 'prezzo', 'PREZZO_SCONTATO': 'prezzo',
+                  'ID_PRODOTTO': 'categoria', 'CANTINA': 'categoria', 'NOME_PRODOTTO': 'categoria',
+                  'SITO_ORIGINE': 'categoria', 'STOCKOUT': 'categoria'}
+SCHEMA_SENTIMENT_RAW = {'DATA_COMMENTO': 'data', 'RATING_ORIGINALE': 'numero'}
+SCHEMA_SENTIMENT = {'DATA_COMMENTO': 'data', 'RATING_ORIGINALE': 'numero', 'SENTIMENT_SCORE': 'categoria'}
+
+# Lettura a blocchi dei CSV che crescono solo in coda (una riga fisica per record, come li scrive GiornaleCsv)
+RIGHE_PER_BLOCCO = 500
+
+
+def _su_valori_distinti(serie, conversione):
+    """Applica la conversione ai soli valori distinti e la ridistribuisce sulle righe.
+    Date e prezzi si ripetono moltissimo: poche migliaia di valori unici anche su milioni di righe."""
+    codici, distinti = pd.factorize(serie)
+    # In coda il valore mancante: le celle vuote hanno codice -1 e pescano proprio quello
+    distinti = pd.Series(list(distinti) + [None], dtype=object)
+    convertiti = conversione(distinti).to_numpy()
+    return pd.Series(convertiti[codici], index=serie.index, name=serie.name)
+
+def _date_distinte(testo, formati):
+    testo = testo.str.strip()
+    risultato = pd.to_datetime(testo, format=formati[0], errors='coerce')
+    for formato in formati[1:]:
+        mancanti = risultato.isna() & testo.notna()
+        if not mancanti.any():
+            break
+        risultato[mancanti] = pd.to_datetime(testo[mancanti], format=formato, errors='coerce')
+    return risultato
+
+def _prezzi_distinti(testo):
+    testo = testo.astype(str).str.replace('€', '', regex=False).str.replace('\xa0', '', regex=False)
+    testo = testo.str.strip().str.replace(',', '.', regex=False)
+    return pd.to_numeric(testo, errors='coerce').astype('float64')
+
+def converti_date(serie, formati=FORMATI_DATA):
+    """Stringhe -> datetime64 provando i formati in ordine; ciò che non corrisponde a nessuno diventa NaT."""
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return serie
+    return _su_valori_distinti(serie, lambda distinti: _date_distinte(distinti, formati))
+
+def converti_prezzi(serie):
+    """'12,50' / '€ 12.50' / 12.5 -> float; valori sporchi -> NaN."""
+    if pd.api.types.is_numeric_dtype(serie):
+        return serie.astype('float64')
+    return _su_valori_distinti(serie, _prezzi_distinti)
+
+def _separatore(percorso):
+    with open(percorso, encoding='utf-8-sig') as f:
+        intestazione = f.readline()
+    return ';' if intestazione.count(';') >= intestazione.count(',') else ','
+
+def leggi_csv(percorso, schema=None, converti_date_colonne=True, sep=None):
+    """Legge un CSV del progetto applicando lo schema dichiarato.
+
+    Con converti_date_colonne=False le date restano testo: serve ai bot che le ricopiano tali e quali
+    nei file di output."""
+    schema = schema or {}
+    df = pd.read_csv(percorso, sep=sep or _separatore(percorso), encoding='utf-8-sig',
+                     dtype={c: ('category' if t == 'categoria' else str) for c, t in schema.items()})
+    return _applica_schema(df, schema, converti_date_colonne)
+
+def _applica_schema(df, schema, converti_date_colonne):
+    df.columns = df.columns.str.strip().str.upper()
+    for colonna, tipo in schema.items():
+        if colonna not in df.columns:
+            continue
+        if tipo == 'data' and converti_date_colonne:
+            df[colonna] = converti_date(df[colonna])
+        elif tipo in ('prezzo', 'numero'):
+            df[colonna] = converti_prezzi(df[colonna])
+    return df
+
+def leggi_database_vini(percorso=FILE_VINI):
+    return leggi_csv(percorso, SCHEMA_VINI)
+
+def leggi_sentiment(percorso=FILE_SENTIMENT, converti_date_colonne=True):
+    df = leggi_csv(percorso, SCHEMA_SENTIMENT, converti_date_colonne)
+    if 'PAROLE_CHIAVE_ESTRATTE' in df.columns:
+        df['PAROLE_CHIAVE_ESTRATTE'] = df['PAROLE_CHIAVE_ESTRATTE'].fillna('')
+    return df
+
+def leggi_sentiment_raw(percorso=FILE_SENTIMENT_RAW, converti_date_colonne=True):
+    return leggi_csv(percorso, SCHEMA_SENTIMENT_RAW, converti_date_colonne)
+
+def _campi_riga(riga, sep):
+    """Numero di campi di una riga fisica letta da sola; None se non è un record CSV completo."""
+    try:
+        campi = list(csv.reader([riga.decode('utf-8-sig').rstrip('\r\n')], delimiter=sep, strict=True))
+    except (UnicodeDecodeError, csv.Error):
+        return None
+    return len(campi[0]) if len(campi) == 1 else None
+
+def leggi_csv_a_blocchi(percorso, da_byte=0, schema=None, converti_date_colonne=True, righe_per_blocco=RIGHE_PER_BLOCCO):
+    """Legge un CSV dalla posizione da_byte in poi, un blocco di righe alla volta (memoria costante).
+
+    Genera (df, fini): fini[i] è il byte subito dopo la riga i del blocco, da salvare come segnalibro
+    quando quella riga è stata consumata. Un'ultima riga senza a capo (scrittura ancora in corso o
+    interrotta) non viene letta: resta per il giro successivo. Le righe che da sole non sono un record
+    completo (pezzi di un record con a capo tra virgolette, righe rotte) si segnalano e si saltano:
+    il segnalibro le supera con la prima riga buona successiva, invece di fermarsi lì per sempre."""
+    schema = schema or {}
+    sep = _separatore(percorso)
+    dtype = {c: ('category' if t == 'categoria' else str) for c, t in schema.items()}
+    with open(percorso, 'rb') as f:
+        intestazione = f.readline()
+        colonne = _campi_riga(intestazione, sep)
+        posizione = max(da_byte, f.tell())
+        f.seek(posizione)
+        while True:
+            righe, fini, lette = [], [], 0
+            for riga in itertools.islice(f, righe_per_blocco):
+                if not riga.endswith(b'\n'):
+                    break
+                lette += 1
+                posizione += len(riga)
+                if not riga.strip():
+                    continue
+                if _campi_riga(riga, sep) != colonne:
+                    print(f"⚠️ {percorso}: riga al byte {posizione - len(riga)} non è un record completo "
+                          f"(a capo dentro un campo o riga rotta), saltata.")
+                    continue
+                righe.append(riga)
+                fini.append(posizione)
+            if not lette:
+                return
+            if not righe:
+                continue
+            df = pd.read_csv(io.BytesIO(intestazione + b''.join(righe)), sep=sep, encoding='utf-8-sig', dtype=dtype)
+            yield _applica_schema(df, schema, converti_date_colonne), fini
+
+def leggi_sentiment_raw_a_blocchi(percorso=FILE_SENTIMENT_RAW, da_byte=0, converti_date_colonne=True, righe_per_blocco=RIGHE_PER_BLOCCO):
+    return leggi_csv_a_blocchi(percorso, da_byte, SCHEMA_SENTIMENT_RAW, converti_date_colonne, righe_per_blocco)
@@ -0,0 +1,146 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+# --- STRUMENTAZIONE LEGGERA: SPAN E CONTATORI DEI GIRI NOTTURNI ---
+# Un giro (prezzi, recensioni, sentiment...) raccoglie in memoria span cronometrati e contatori, con
+# etichette libere (sito, listing); alla chiusura scrive un report JSONL in public/data/metriche (una riga
+# per span/contatore, l'ultima è il riepilogo) e stampa listing e siti più lenti.
+# Si accende con METRICHE=1 nell'ambiente. Spenta, span() restituisce sempre lo stesso oggetto vuoto e
+# conta() esce alla prima riga: nel ciclo caldo resta solo il costo di una chiamata di funzione.
+DIR_METRICHE = os.path.join('public', 'data', 'metriche')
+ATTIVE = os.environ.get('METRICHE') == '1'
+MAX_RIGHE_RIEPILOGO = 5
+
+_giro = None
+
+
+class _SpanSpento:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *errore):
+        return False
+
+SPAN_SPENTO = _SpanSpento()
+
+
+class Giro:
+    def __init__(self, nome):
+        self.nome = nome
+        self.inizio = time.perf_counter()
+        self.avviato = datetime.now()
+        self.span = []        # (nome, secondi, etichette, errore)
+        self.contatori = {}   # (nome, etichette ordinate) -> valore
+        self._lock = threading.Lock()  # il timbro degli screenshot scrive dai thread del pool
+
+    def aggiungi_span(self, nome, secondi, etichette, errore=False):
+        self.span.append((nome, secondi, etichette, errore))
+
+    def aggiungi(self, nome, valore, etichette):
+        chiave = (nome, tuple(sorted(etichette.items())))
+        with self._lock:
+            self.contatori[chiave] = self.contatori.get(chiave, 0) + valore
+
+
+class Span:
+    __slots__ = ('giro', 'nome', 'etichette', 'inizio')
+
+    def __init__(self, giro, nome, etichette):
+        self.giro = giro
+        self.nome = nome
+        self.etichette = etichette
+
+    def __enter__(self):
+        self.inizio = time.perf_counter()
+        return self
+
+    def __exit__(self, tipo, *errore):
+        self.giro.aggiungi_span(self.nome, time.perf_counter() - self.inizio, self.etichette, tipo is not None)
+        return False
+
+
+def span(nome, **etichette):
+    """Cronometra un blocco: with span('fetch', sito='tannico', listing=id): ..."""
+    if _giro is None:
+        return SPAN_SPENTO
+    return Span(_giro, nome, etichette)
+
+def conta(nome, valore=1, **etichette):
+    if _giro is None:
+        return
+    _giro.aggiungi(nome, valore, etichette)
+
+def _percentile(valori, quota):
+    ordinati = sorted(valori)
+    return ordinati[min(len(ordinati) - 1, int(quota * len(ordinati)))]
+
+def riepilogo(giro):
+    """Aggregati per nome di span, contatori, listing e siti più lenti (somma dei loro span)."""
+    per_nome, per_listing, per_sito = {}, {}, {}
+    for nome, secondi, etichette, _ in giro.span:
+        per_nome.setdefault(nome, []).append(secondi)
+        if 'listing' in etichette:
+            per_listing[etichette['listing']] = per_listing.get(etichette['listing'], 0) + secondi
+        if 'sito' in etichette:
+            per_sito[etichette['sito']] = per_sito.get(etichette['sito'], 0) + secondi
+    lenti = lambda totali: [{'chiave': k, 'secondi': round(v, 3)}
+                            for k, v in sorted(totali.items(), key=lambda kv: -kv[1])[:MAX_RIGHE_RIEPILOGO]]
+    return {
+        'tipo': 'riepilogo', 'giro': giro.nome, 'avviato': giro.avviato.isoformat(timespec='seconds'),
+        'durata_s': round(time.perf_counter() - giro.inizio, 3),
+        'span': {nome: {'n': len(v), 'totale_s': round(sum(v), 3), 'p50_ms': round(_percentile(v, 0.5) * 1000, 1),
+                        'p95_ms': round(_percentile(v, 0.95) * 1000, 1)} for nome, v in per_nome.items()},
+        'contatori': {nome + ''.join(f'[{k}={v}]' for k, v in etichette): valore
+                      for (nome, etichette), valore in giro.contatori.items()},
+        'listing_piu_lenti': lenti(per_listing),
+        'siti_piu_lenti': lenti(per_sito),
+    }
+
+def scrivi_report(giro, dir_metriche=DIR_METRICHE):
+    os.makedirs(dir_metriche, exist_ok=True)
+    percorso = os.path.join(dir_metriche, f"{giro.nome}_{giro.avviato.strftime('%Y%m%d_%H%M%S')}_{os.getpid()}.jsonl")
+    sintesi = riepilogo(giro)
+    with open(percorso, 'w', encoding='utf-8') as f:
+        for nome, secondi, etichette, errore in giro.span:
+            f.write(json.dumps({'tipo': 'span', 'nome': nome, 'ms': round(secondi * 1000, 2), 'errore': errore, **etichette},
+                               ensure_ascii=False) + '\n')
+        for (nome, etichette), valore in giro.contatori.items():
+            f.write(json.dumps({'tipo': 'contatore', 'nome': nome, 'valore': valore, **dict(etichette)}, ensure_ascii=False) + '\n')
+        f.write(json.dumps(sintesi, ensure_ascii=False) + '\n')
+    return percorso, sintesi
+
+def stampa_riepilogo(sintesi):
+    print(f"\n📊 Metriche del giro '{sintesi['giro']}' ({sintesi['durata_s']:.1f}s)")
+    for nome, s in sorted(sintesi['span'].items(), key=lambda kv: -kv[1]['totale_s']):
+        print(f"   {nome:<18} {s['n']:>6} x  totale {s['totale_s']:>8.1f}s  p50 {s['p50_ms']:>8.1f} ms  p95 {s['p95_ms']:>8.1f} ms")
+    for nome, valore in sorted(sintesi['contatori'].items()):
+        print(f"   #{nome}: {valore}")
+    if sintesi['siti_piu_lenti']:
+        print("   🐢 Siti più lenti: " + ", ".join(f"{r['chiave']} {r['secondi']:.1f}s" for r in sintesi['siti_piu_lenti']))
+    if sintesi['listing_piu_lenti']:
+        print("   🐢 Listing più lenti: " + ", ".join(f"{r['chiave']} {r['secondi']:.1f}s" for r in sintesi['listing_piu_lenti']))
+
+@contextmanager
+def giro(nome, attive=None):
+    """Apre un giro di misura (se le metriche sono attive) e alla fine scrive il report JSONL."""
+    global _giro
+    if not (ATTIVE if attive is None else attive) or _giro is not None:
+        yield None  # spente, oppure già dentro un giro (es. stadio della pipeline che chiama il bot)
+        return
+    _giro = Giro(nome)
+    try:
+        yield _giro
+    finally:
+        corrente, _giro = _giro, None
+        try:
+            percorso, sintesi = scrivi_report(corrente)
+            stampa_riepilogo(sintesi)
+            print(f"   📝 Report: {percorso}")
+        except Exception as e:
+            print(f"⚠️ Report delle metriche non scritto: {e}")
@@ -0,0 +1,43 @@
+import io
+import re
+
+from wordcloud import WordCloud
+
+# --- NUVOLE DI PAROLE DEL MODULO SENTIMENT ---
+# Le frequenze delle parole chiave si contano una sola volta per (vino, sentiment, giorno):
+# per un intervallo di date basta sommare i giorni coinvolti invece di riunire e ritokenizzare il testo.
+# L'immagine viene generata direttamente come PNG (niente figure matplotlib da chiudere).
+STOPWORDS_ITA = {'di', 'a', 'da', 'in', 'con', 'su', 'per', 'tra', 'fra', 'il', 'lo', 'la', 'i', 'gli', 'le', 'un', 'uno', 'una', 'è', 'che', 'non', 'molto', 'vino', 'bottiglia', 'sapore', 'note'}
+RE_PAROLA = re.compile(r"\w[\w']+")  # stessa regola di WordCloud: almeno due caratteri
+
+LATO_NUVOLA = 400
+MAX_PAROLE = 200
+
+def tabella_frequenze(df_sent):
+    """Serie (NOME_PRODOTTO, SENTIMENT_SCORE, DATA_COMMENTO, PAROLA) -> conteggio, ordinata per le fette."""
+    df = df_sent[['NOME_PRODOTTO', 'SENTIMENT_SCORE', 'DATA_COMMENTO', 'PAROLE_CHIAVE_ESTRATTE']].copy()
+    df['PAROLA'] = df['PAROLE_CHIAVE_ESTRATTE'].fillna('').astype(str).str.lower().str.findall(RE_PAROLA)
+    df = df.explode('PAROLA').dropna(subset=['PAROLA', 'DATA_COMMENTO'])
+    df = df[~df['PAROLA'].isin(STOPWORDS_ITA)]
+    return (df.groupby(['NOME_PRODOTTO', 'SENTIMENT_SCORE', 'DATA_COMMENTO', 'PAROLA'], observed=True)
+            .size().sort_index())
+
+def frequenze(tabella, vino, sentiment, inizio=None, fine=None):
+    """{parola: conteggio} per un vino e un sentiment nell'intervallo [inizio, fine]."""
+    try:
+        fetta = tabella.loc[(vino, sentiment, slice(inizio, fine))]
+    except KeyError:
+        return {}
+    if fetta.empty:
+        return {}
+    return fetta.groupby(level='PAROLA').sum().to_dict()
+
+def nuvola_png(frequenze_parole, colormap):
+    """Rende la nuvola come PNG con sfondo trasparente; None se non ci sono parole."""
+    if not frequenze_parole:
+        return None
+    nuvola = WordCloud(width=LATO_NUVOLA, height=LATO_NUVOLA, background_color='rgba(0,0,0,0)', mode="RGBA",
+                       colormap=colormap, max_words=MAX_PAROLE).generate_from_frequencies(frequenze_parole)
+    buffer = io.BytesIO()
+    nuvola.to_image().save(buffer, format='PNG')
+    return buffer.getvalue()
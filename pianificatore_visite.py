@@ -0,0 +1,109 @@
+import math
+import os
+from datetime import datetime
+
+import pandas as pd
+
+from archivio_prezzi import apri_archivio, FILE_ARCHIVIO
+from lettura_dati import converti_date, converti_prezzi
+
+# --- PIANIFICATORE ADATTIVO DELLE VISITE NOTTURNE ---
+# Ogni listing ha un intervallo di visita ricavato dalle sue ultime rilevazioni nello storico:
+# - link morti (prezzo vuoto più notti di fila): attesa esponenziale 2, 4, 8... fino a MAX_ATTESA_ERRORI giorni
+# - prezzo fermo da molte rilevazioni: si allunga piano fino a MAX_ATTESA_STABILE giorni
+# - prezzo che cambia spesso (volatile) o listing mai visto: tutte le notti, con la precedenza
+# Chi è "in scadenza" viene ordinato per priorità e tagliato al budget della notte (se impostato).
+FINESTRA_GIORNI = 30
+MAX_ATTESA_ERRORI = 16
+MAX_ATTESA_STABILE = 4
+RILEVAZIONI_PER_GIORNO_STABILE = 7   # ogni 7 rilevazioni a prezzo invariato, un giorno di attesa in più
+CAMBI_VOLATILE = 2                   # cambi di prezzo nella finestra oltre cui il listing è volatile
+BUDGET_VISITE = int(os.environ['BUDGET_VISITE']) if os.environ.get('BUDGET_VISITE') else None
+
+
+def _chiave(id_prodotto, sito):
+    return str(id_prodotto).strip(), str(sito).strip().lower()
+
+def leggi_esiti_recenti(file_archivio=FILE_ARCHIVIO, oggi=None, finestra_giorni=FINESTRA_GIORNI):
+    """Ultime rilevazioni per listing, con data e prezzo effettivo (scontato se presente), in ordine di inserimento."""
+    oggi = pd.Timestamp(oggi or datetime.now()).normalize()
+    conn = apri_archivio(file_archivio)
+    try:
+        # Finestra per rowid (lo storico è in sola aggiunta): evita di convertire le date di tutto l'archivio
+        n_listing = conn.execute("SELECT COUNT(*) FROM (SELECT DISTINCT ID_PRODOTTO, SITO_ORIGINE FROM storico_prezzi)").fetchone()[0]
+        df = pd.read_sql_query(
+            "SELECT rowid AS RIGA, DATA_ESTRAZIONE, ID_PRODOTTO, SITO_ORIGINE, PREZZO_RILEVATO, PREZZO_SCONTATO "
+            "FROM storico_prezzi WHERE rowid > (SELECT COALESCE(MAX(rowid), 0) FROM storico_prezzi) - ? ORDER BY rowid",
+            conn, params=(n_listing * finestra_giorni * 2,))
+    finally:
+        conn.close()
+    df['GIORNO'] = converti_date(df['DATA_ESTRAZIONE']).dt.normalize()
+    df['PREZZO'] = converti_prezzi(df['PREZZO_SCONTATO']).fillna(converti_prezzi(df['PREZZO_RILEVATO']))
+    return df[df['GIORNO'] >= oggi - pd.Timedelta(days=finestra_giorni)]
+
+def statistiche_listing(esiti):
+    """{(id, sito): dict} con ultima visita, serie di errori finale, rilevazioni a prezzo invariato e cambi."""
+    statistiche = {}
+    for (id_prodotto, sito), gruppo in esiti.groupby(['ID_PRODOTTO', 'SITO_ORIGINE'], sort=False):
+        prezzi = gruppo['PREZZO'].tolist()
+        serie_errori = 0
+        for prezzo in reversed(prezzi):
+            if not math.isnan(prezzo):
+                break
+            serie_errori += 1
+        validi = [p for p in prezzi if not math.isnan(p)]
+        cambi = sum(1 for a, b in zip(validi, validi[1:]) if a != b)
+        invariati = 0
+        for prezzo in reversed(validi):
+            if prezzo != validi[-1]:
+                break
+            invariati += 1
+        statistiche[_chiave(id_prodotto, sito)] = {
+            'ultima_visita': gruppo['GIORNO'].max(), 'serie_errori': serie_errori,
+            'invariati': invariati, 'cambi': cambi,
+        }
+    return statistiche
+
+def intervallo_visita(stat):
+    """Giorni da attendere tra due visite e motivo."""
+    if stat['serie_errori'] >= 2:
+        return min(MAX_ATTESA_ERRORI, 2 ** (stat['serie_errori'] - 1)), 'link morto'
+    if stat['cambi'] >= CAMBI_VOLATILE:
+        return 1, 'volatile'
+    attesa = min(MAX_ATTESA_STABILE, 1 + stat['invariati'] // RILEVAZIONI_PER_GIORNO_STABILE)
+    return attesa, 'stabile' if attesa > 1 else 'regolare'
+
+def pianifica(listing, oggi=None, budget=BUDGET_VISITE, file_archivio=FILE_ARCHIVIO):
+    """Divide i listing (dict con 'id_prodotto' e 'sito_origine') in (da_visitare, rimandati).
+    L'ordine dell'anagrafica è preservato tra quelli da visitare."""
+    oggi = pd.Timestamp(oggi or datetime.now()).normalize()
+    statistiche = statistiche_listing(leggi_esiti_recenti(file_archivio, oggi))
+
+    in_scadenza, rimandati, motivi = [], [], {}
+    for posizione, l in enumerate(listing):
+        stat = statistiche.get(_chiave(l['id_prodotto'], l['sito_origine']))
+        if stat is None:
+            in_scadenza.append((float('inf'), posizione, l))  # mai visto (o fuori finestra): subito
+            motivi['nuovo'] = motivi.get('nuovo', 0) + 1
+            continue
+        attesa, motivo = intervallo_visita(stat)
+        trascorsi = (oggi - stat['ultima_visita']).days
+        if trascorsi < attesa:
+            rimandati.append(l)
+            motivi[f"{motivo} (rimandato)"] = motivi.get(f"{motivo} (rimandato)", 0) + 1
+            continue
+        # Priorità: quanto è in ritardo rispetto al suo intervallo; i volatili davanti, i link morti in fondo
+        priorita = trascorsi / attesa + (1 if motivo == 'volatile' else 0) - (1 if motivo == 'link morto' else 0)
+        in_scadenza.append((priorita, posizione, l))
+        motivi[motivo] = motivi.get(motivo, 0) + 1
+
+    in_scadenza.sort(key=lambda voce: (-voce[0], voce[1]))
+    if budget is not None and len(in_scadenza) > budget:
+        rimandati.extend(l for _, _, l in in_scadenza[budget:])
+        motivi['oltre il budget (rimandato)'] = len(in_scadenza) - budget
+        in_scadenza = in_scadenza[:budget]
+    da_visitare = [l for _, _, l in sorted(in_scadenza, key=lambda voce: voce[1])]
+
+    riepilogo = ", ".join(f"{n} {motivo}" for motivo, n in sorted(motivi.items()))
+    print(f"🗓️ Pianificazione: {len(da_visitare)} listing da visitare, {len(rimandati)} rimandati ({riepilogo}).")
+    return da_visitare, rimandati
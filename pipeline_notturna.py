@@ -0,0 +1,191 @@
+import json
+import multiprocessing as mp
+import os
+import queue
+import sys
+import time
+from datetime import datetime
+from multiprocessing.connection import wait
+
+from metriche import giro
+
+# --- PIPELINE NOTTURNA (PREZZI, RECENSIONI, SENTIMENT) ---
+# Un solo punto di ingresso per la notte: ogni stadio gira nel suo processo e gli stadi collegati nel grafo
+# si passano i dati su code limitate (lo scraper Vivino consegna le recensioni di un vino appena finito e
+# il sentiment le arricchisce subito, senza aspettare il CSV grezzo). Una coda piena rallenta il produttore.
+# A ogni stadio concluso si scrive un checkpoint: se la notte si interrompe, il giro successivo dello stesso
+# giorno riparte dagli stadi mancanti (e da quelli a valle di uno stadio da rifare).
+FILE_CHECKPOINT = os.path.join('.cache', 'checkpoint_pipeline.json')
+DIMENSIONE_CODA = 4      # blocchi (un vino ciascuno) in attesa tra uno stadio e l'altro
+FINE = None              # marcatore di fine flusso in coda
+INCOMPLETO = 2           # codice di uscita di uno stadio che è finito senza fare il suo lavoro (es. input mancante)
+
+
+# Ogni stadio restituisce False se finisce senza aver fatto il suo lavoro: non va segnato come completato
+def stadio_prezzi(ingressi, emetti):
+    # Import dentro gli stadi: ogni processo carica solo le librerie che gli servono (Playwright, Gemini...)
+    from bot_prezzi import avvia_scraping
+    return avvia_scraping()
+
+def stadio_recensioni(ingressi, emetti):
+    import scraper_multiplo
+    return scraper_multiplo.main(al_vino=emetti)
+
+def stadio_sentiment(ingressi, emetti):
+    from bot_sentiment_ai import elabora_sentiment, SessioneSentiment
+    coda = ingressi.get('recensioni')
+    if coda is None:
+        # Recensioni già raccolte in un giro precedente della notte: si riparte dal CSV grezzo
+        return elabora_sentiment() is not None
+    # Client, cache, classificatore e budget una volta per stadio, non una volta per vino
+    with SessioneSentiment() as sessione:
+        for blocco in iter(coda.get, FINE):
+            if sessione.residuo <= 0:
+                continue  # budget esaurito: si svuota comunque la coda per non bloccare lo scraper
+            elabora_sentiment(recensioni=blocco, sessione=sessione)
+        # Coda chiusa: lo scraper ha già scritto il CSV grezzo. Un ultimo passaggio dal segnalibro fa avanzare
+        # il segnalibro oltre le recensioni appena elaborate e, col budget rimasto, riprende quelle tagliate
+        # dal budget o saltate da Gemini (qui o nelle notti precedenti)
+        return elabora_sentiment(sessione=sessione) is not None
+
+# Grafo degli stadi: ogni dipendenza è anche una coda dal produttore al consumatore
+STADI = {
+    'prezzi': {'funzione': stadio_prezzi, 'dipende_da': []},
+    'recensioni': {'funzione': stadio_recensioni, 'dipende_da': []},
+    'sentiment': {'funzione': stadio_sentiment, 'dipende_da': ['recensioni']},
+}
+
+
+def carica_checkpoint(notte, file_checkpoint=FILE_CHECKPOINT):
+    """Stadi già completati nella notte indicata; un checkpoint di un'altra notte non vale più."""
+    if not os.path.exists(file_checkpoint):
+        return {}
+    with open(file_checkpoint, encoding='utf-8') as f:
+        checkpoint = json.load(f)
+    return checkpoint.get('stadi', {}) if checkpoint.get('notte') == notte else {}
+
+def salva_checkpoint(notte, stadi, file_checkpoint=FILE_CHECKPOINT):
+    os.makedirs(os.path.dirname(file_checkpoint) or '.', exist_ok=True)
+    temporaneo = file_checkpoint + '.tmp'
+    with open(temporaneo, 'w', encoding='utf-8') as f:
+        json.dump({'notte': notte, 'stadi': stadi}, f, indent=2, ensure_ascii=False)
+    os.replace(temporaneo, file_checkpoint)
+
+def stadi_da_eseguire(completati, grafo=STADI):
+    """Stadi non completati più, in ordine topologico, tutti quelli a valle di uno stadio da rifare."""
+    da_eseguire = []
+    visitati = set()
+
+    def visita(nome):
+        if nome in visitati:
+            return
+        visitati.add(nome)
+        for dipendenza in grafo[nome]['dipende_da']:
+            visita(dipendenza)
+        if nome not in completati or any(d in da_eseguire for d in grafo[nome]['dipende_da']):
+            da_eseguire.append(nome)
+
+    for nome in grafo:
+        visita(nome)
+    return da_eseguire
+
+def _esegui_stadio(nome, ingressi, uscite):
+    """Corpo del processo figlio: lo stadio emette blocchi verso tutte le sue code di uscita."""
+    def emetti(blocco):
+        for coda in uscite:
+            coda.put(blocco)
+    try:
+        # Ogni stadio è un giro di misura a sé (report JSONL separato, se METRICHE=1)
+        with giro(nome):
+            esito = STADI[nome]['funzione'](ingressi, emetti)
+        if esito is False:
+            sys.exit(INCOMPLETO)
+    finally:
+        # Anche se lo stadio fallisce, i consumatori devono sapere che il flusso è finito
+        for coda in uscite:
+            coda.put(FINE)
+
+def _svuota(coda):
+    try:
+        while True:
+            coda.get_nowait()
+    except queue.Empty:
+        pass
+
+def esegui_pipeline(da_capo=False, file_checkpoint=FILE_CHECKPOINT):
+    """Esegue gli stadi della notte; restituisce True se sono tutti completati."""
+    notte = datetime.now().strftime('%Y-%m-%d')
+    completati = {} if da_capo else carica_checkpoint(notte, file_checkpoint)
+    da_eseguire = stadi_da_eseguire(completati)
+    if not da_eseguire:
+        print(f"✅ Pipeline della notte {notte} già completata (checkpoint in {file_checkpoint}).")
+        return True
+    for nome in STADI:
+        if nome not in da_eseguire:
+            print(f"⏭️ Stadio '{nome}' già completato alle {completati[nome]['fine']}: salto.")
+    for nome in da_eseguire:
+        completati.pop(nome, None)
+
+    # 'spawn': processi puliti, senza ereditare thread o event loop del processo principale
+    contesto = mp.get_context('spawn')
+    code = {(produttore, nome): contesto.Queue(DIMENSIONE_CODA)
+            for nome in da_eseguire for produttore in STADI[nome]['dipende_da'] if produttore in da_eseguire}
+
+    processi, inizio = {}, {}
+    for nome in da_eseguire:
+        # Un produttore già completato non ha coda: il consumatore leggerà i suoi file
+        ingressi = {p: code.get((p, nome)) for p in STADI[nome]['dipende_da']}
+        uscite = [coda for (produttore, _), coda in code.items() if produttore == nome]
+        processi[nome] = contesto.Process(target=_esegui_stadio, args=(nome, ingressi, uscite), name=f"stadio-{nome}")
+        inizio[nome] = time.perf_counter()
+        processi[nome].start()
+        print(f"🚀 Stadio '{nome}' avviato (pid {processi[nome].pid}).")
+
+    falliti = []
+    fine_in_sospeso = []   # code di produttori morti senza il loro finally, ancora senza marcatore di fine
+    in_corso = dict(processi)
+    while in_corso:
+        for sentinella in wait([p.sentinel for p in in_corso.values()], timeout=1):
+            nome = next(n for n, p in in_corso.items() if p.sentinel == sentinella)
+            processo = in_corso.pop(nome)
+            processo.join()
+            durata = time.perf_counter() - inizio[nome]
+            if processo.exitcode == 0:
+                completati[nome] = {'fine': datetime.now().strftime('%H:%M:%S'), 'durata_s': round(durata, 1)}
+                salva_checkpoint(notte, completati, file_checkpoint)
+                print(f"✅ Stadio '{nome}' completato in {durata:.0f}s (checkpoint salvato).")
+            else:
+                falliti.append(nome)
+                if processo.exitcode == INCOMPLETO:
+                    print(f"⚠️ Stadio '{nome}' terminato senza completare il lavoro dopo {durata:.0f}s: al prossimo giro riparte da qui.")
+                else:
+                    print(f"❌ Stadio '{nome}' fallito (codice {processo.exitcode}) dopo {durata:.0f}s: al prossimo giro riparte da qui.")
+                # Codice negativo = ucciso da un segnale: il finally di _esegui_stadio non ha chiuso il flusso,
+                # lo si chiude al suo posto (negli altri casi la FINE è già in coda)
+                if processo.exitcode < 0:
+                    fine_in_sospeso.extend(coda for (produttore, _), coda in code.items() if produttore == nome)
+
+        # Mai una put bloccante: con la coda piena la FINE si riprova al giro dopo, finché il consumatore è vivo
+        for coda in list(fine_in_sospeso):
+            consumatore = next(c for (_, c), q in code.items() if q is coda)
+            try:
+                if consumatore in in_corso:
+                    coda.put_nowait(FINE)
+                fine_in_sospeso.remove(coda)
+            except queue.Full:
+                pass
+
+        # Consumatore terminato con il produttore ancora vivo: la coda va svuotata o il produttore resta bloccato
+        for (produttore, consumatore), coda in code.items():
+            if consumatore not in in_corso and produttore in in_corso:
+                _svuota(coda)
+
+    if falliti:
+        print(f"🚨 Pipeline incompleta: stadi falliti o incompleti {', '.join(falliti)}.")
+        return False
+    print(f"🏁 Pipeline della notte {notte} completata.")
+    return True
+
+if __name__ == "__main__":
+    # --da-capo ignora il checkpoint della notte e riesegue tutti gli stadi
+    sys.exit(0 if esegui_pipeline(da_capo='--da-capo' in sys.argv) else 1)
@@ -0,0 +1,186 @@
+import os
+import re
+from datetime import datetime, timedelta
+
+import numpy as np
+from PIL import Image
+
+from archivio_prezzi import apri_archivio, FILE_ARCHIVIO, FILE_CSV
+from giornale_csv import GiornaleCsv
+from timbro_screenshot import ALTEZZA_FASCIA
+
+# --- DEDUPLICA PERCETTIVA E CONSERVAZIONE DELLE PROVE FOTOGRAFICHE ---
+# Ogni screenshot viene confrontato con lo scatto precedente dello stesso listing (ID_PRODOTTO, SITO_ORIGINE)
+# tramite un hash percettivo (dHash 16x16 della pagina, esclusa la fascia del timbro che cambia ogni notte).
+# Episodio = scatti consecutivi dello stesso listing con lo stesso motivo, senza pause lunghe.
+# Conservazione a livelli:
+# 1. sempre: in una serie di scatti quasi identici al primo restano file solo il primo e l'ultimo; quelli in
+#    mezzo diventano riferimenti al primo (le righe dello storico puntano al suo percorso). Il confronto è
+#    sempre con il primo della serie, non con lo scatto precedente: piccoli cambiamenti che si sommano
+#    notte dopo notte aprono una serie nuova invece di sparire dietro un file ormai diverso;
+# 2. episodi fermi da più di GIORNI_ARCHIVIO: gli scatti in mezzo diventano riferimenti a uno scatto
+#    rimasto dell'episodio (primo, ultimo o uno già tenuto) solo se quasi identici a quello; gli scatti
+#    visibilmente diversi restano file.
+# Indice e riferimenti stanno nel database dello storico, aggiornati nella stessa transazione; i file si
+# cancellano solo dopo il commit (un giro interrotto li ritrova e li cancella al giro successivo).
+# Il CSV storico non si riscrive: prima di cancellare un file, la coppia PERCORSO -> RIFERIMENTO si accoda
+# a riferimenti_prove.csv, che api/storico usa per risolvere i percorsi (vale l'ultima riga, anche a catena).
+DIR_PUBLIC = 'public'
+LATO_HASH = 16
+SOGLIA_QUASI_UGUALI = 10        # bit diversi su 256: tra scatti dello stesso listing o si resta sotto 10 o si va oltre 20
+MAX_PAUSA_EPISODIO = 7          # giorni senza scatti (anche per le visite diradate dal pianificatore) che chiudono un episodio
+GIORNI_ARCHIVIO = 90
+FILE_RIFERIMENTI = os.path.join(DIR_PUBLIC, 'data', 'riferimenti_prove.csv')
+COLONNE_RIFERIMENTI = ['PERCORSO', 'RIFERIMENTO']
+
+RE_SCATTO = re.compile(r'_(\d{8}_\d{6})\.webp$')
+
+SCHEMA_PROVE = """
+CREATE TABLE IF NOT EXISTS prove_fotografiche (
+    PERCORSO TEXT PRIMARY KEY,
+    ID_PRODOTTO TEXT NOT NULL,
+    SITO_ORIGINE TEXT NOT NULL,
+    MOTIVO TEXT,
+    SCATTO TEXT NOT NULL,
+    HASH TEXT NOT NULL,
+    EPISODIO INTEGER NOT NULL,
+    INIZIO_SERIE TEXT NOT NULL,
+    RIFERIMENTO TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_prove_listing ON prove_fotografiche (ID_PRODOTTO, SITO_ORIGINE, SCATTO);
+"""
+COLONNE_PROVE = ['PERCORSO', 'ID_PRODOTTO', 'SITO_ORIGINE', 'MOTIVO', 'SCATTO', 'HASH', 'EPISODIO', 'INIZIO_SERIE', 'RIFERIMENTO']
+
+
+def hash_percettivo(percorso_file, lato=LATO_HASH):
+    """dHash: per ogni riga della miniatura in scala di grigi, 1 se il pixel è più chiaro del vicino a sinistra."""
+    with Image.open(percorso_file) as img:
+        larghezza, altezza = img.size
+        miniatura = img.convert('L').crop((0, 0, larghezza, altezza - ALTEZZA_FASCIA)).resize((lato + 1, lato), Image.LANCZOS)
+    pixel = np.asarray(miniatura, dtype=np.int16)
+    bit = (pixel[:, 1:] > pixel[:, :-1]).flatten()
+    return f"{int(''.join('1' if b else '0' for b in bit), 2):0{lato * lato // 4}x}"
+
+def distanza(hash_a, hash_b):
+    return bin(int(hash_a, 16) ^ int(hash_b, 16)).count('1')
+
+def file_di(percorso_web):
+    return os.path.join(DIR_PUBLIC, *percorso_web.strip('/').split('/'))
+
+def _scatto(percorso_web):
+    trovato = RE_SCATTO.search(percorso_web)
+    return datetime.strptime(trovato.group(1), '%Y%m%d_%H%M%S') if trovato else None
+
+def apri_prove(file_archivio=FILE_ARCHIVIO, file_csv=FILE_CSV):
+    conn = apri_archivio(file_archivio, file_csv)
+    conn.executescript(SCHEMA_PROVE)
+    return conn
+
+def _ultimo_scatto(conn, id_prodotto, sito):
+    riga = conn.execute(f"SELECT {', '.join(COLONNE_PROVE)} FROM prove_fotografiche WHERE ID_PRODOTTO = ? AND SITO_ORIGINE = ? "
+                        "ORDER BY SCATTO DESC LIMIT 1", (id_prodotto, sito)).fetchone()
+    return dict(zip(COLONNE_PROVE, riga)) if riga else None
+
+def _compatta(conn, percorso, riferimento):
+    """Il file diventa un riferimento: storico e indice puntano al file che resta."""
+    conn.execute("UPDATE storico_prezzi SET SCREENSHOT_PATH = ? WHERE SCREENSHOT_PATH = ?", (riferimento, percorso))
+    conn.execute("UPDATE prove_fotografiche SET RIFERIMENTO = ? WHERE PERCORSO = ? OR RIFERIMENTO = ?", (riferimento, percorso, percorso))
+
+def _hash_di(conn, percorso):
+    return conn.execute("SELECT HASH FROM prove_fotografiche WHERE PERCORSO = ?", (percorso,)).fetchone()[0]
+
+def registra_nuove(conn):
+    """Indicizza gli screenshot dello storico non ancora visti, in ordine di scatto; restituisce (registrati, compattati)."""
+    nuove = conn.execute(
+        "SELECT DISTINCT s.SCREENSHOT_PATH, s.ID_PRODOTTO, s.SITO_ORIGINE, s.TRIGGER_REASON FROM storico_prezzi s "
+        "WHERE COALESCE(s.SCREENSHOT_PATH, '') <> '' "
+        "AND NOT EXISTS (SELECT 1 FROM prove_fotografiche p WHERE p.PERCORSO = s.SCREENSHOT_PATH)").fetchall()
+    nuove = sorted(((p, i, s, m) for p, i, s, m in nuove if _scatto(p)), key=lambda r: (r[1], r[2], _scatto(r[0])))
+
+    registrati, compattati = 0, 0
+    for percorso, id_prodotto, sito, motivo in nuove:
+        if not os.path.exists(file_di(percorso)):
+            print(f"⚠️ Prova fotografica mancante su disco: {percorso}")
+            continue
+        scatto = _scatto(percorso)
+        impronta = hash_percettivo(file_di(percorso))
+        precedente = _ultimo_scatto(conn, id_prodotto, sito)
+
+        stesso_episodio = (precedente is not None and precedente['MOTIVO'] == motivo
+                           and scatto - datetime.fromisoformat(precedente['SCATTO']) <= timedelta(days=MAX_PAUSA_EPISODIO))
+        quasi_uguale = stesso_episodio and distanza(impronta, _hash_di(conn, precedente['INIZIO_SERIE'])) <= SOGLIA_QUASI_UGUALI
+        if stesso_episodio:
+            episodio = precedente['EPISODIO']
+        else:
+            episodio = precedente['EPISODIO'] + 1 if precedente else 1
+        inizio_serie = precedente['INIZIO_SERIE'] if quasi_uguale else percorso
+
+        # Il precedente era l'ultimo della serie; ora l'ultimo è questo e lui diventa un riferimento
+        if quasi_uguale and precedente['PERCORSO'] != inizio_serie and precedente['RIFERIMENTO'] is None:
+            _compatta(conn, precedente['PERCORSO'], inizio_serie)
+            compattati += 1
+
+        conn.execute(f"INSERT INTO prove_fotografiche VALUES ({', '.join('?' * len(COLONNE_PROVE))})",
+                     (percorso, id_prodotto, sito, motivo, scatto.isoformat(), impronta, episodio, inizio_serie, None))
+        registrati += 1
+    return registrati, compattati
+
+def compatta_episodi_vecchi(conn, oggi=None, giorni_archivio=GIORNI_ARCHIVIO):
+    """Episodi senza scatti da più di giorni_archivio: gli scatti in mezzo quasi identici a uno scatto
+    rimasto diventano riferimenti a quello; gli altri restano file."""
+    limite = ((oggi or datetime.now()) - timedelta(days=giorni_archivio)).isoformat()
+    episodi = conn.execute(
+        "SELECT ID_PRODOTTO, SITO_ORIGINE, EPISODIO FROM prove_fotografiche "
+        "GROUP BY ID_PRODOTTO, SITO_ORIGINE, EPISODIO HAVING MAX(SCATTO) < ?", (limite,)).fetchall()
+    compattati = 0
+    for id_prodotto, sito, episodio in episodi:
+        scatti = conn.execute(
+            "SELECT PERCORSO, HASH FROM prove_fotografiche WHERE ID_PRODOTTO = ? AND SITO_ORIGINE = ? AND EPISODIO = ? "
+            "AND RIFERIMENTO IS NULL ORDER BY SCATTO", (id_prodotto, sito, episodio)).fetchall()
+        rimasti = [scatti[0], scatti[-1]]
+        for percorso, impronta in scatti[1:-1]:
+            # Con lo scatto si spostano anche quelli che già puntavano a lui: devono restare vicini tutti
+            impronte = [impronta] + [h for (h,) in conn.execute("SELECT HASH FROM prove_fotografiche WHERE RIFERIMENTO = ?", (percorso,))]
+            scarto, vicino = min((max(distanza(h, rimasto[1]) for h in impronte), rimasto[0]) for rimasto in rimasti)
+            if scarto <= SOGLIA_QUASI_UGUALI:
+                _compatta(conn, percorso, vicino)
+                compattati += 1
+            else:
+                rimasti.append((percorso, impronta))  # diverso da tutti: è una prova a sé
+    return compattati
+
+def cancella_compattati(conn, file_riferimenti=FILE_RIFERIMENTI):
+    """Cancella dal disco i file già diventati riferimenti; restituisce i byte liberati.
+    Il riferimento si accoda (con fsync) prima della cancellazione: nessun percorso del CSV resta orfano."""
+    da_cancellare = [(percorso, riferimento) for percorso, riferimento in conn.execute(
+        "SELECT PERCORSO, RIFERIMENTO FROM prove_fotografiche WHERE RIFERIMENTO IS NOT NULL")
+        if os.path.exists(file_di(percorso))]
+    if not da_cancellare:
+        return 0
+    with GiornaleCsv(file_riferimenti, COLONNE_RIFERIMENTI) as giornale:
+        giornale.scrivi_tutti({'PERCORSO': percorso, 'RIFERIMENTO': riferimento} for percorso, riferimento in da_cancellare)
+    liberati = 0
+    for percorso, _ in da_cancellare:
+        file_prova = file_di(percorso)
+        liberati += os.path.getsize(file_prova)
+        os.remove(file_prova)
+    return liberati
+
+def aggiorna_prove(file_archivio=FILE_ARCHIVIO, file_csv=FILE_CSV, oggi=None, file_riferimenti=FILE_RIFERIMENTI):
+    """Giro completo: indicizza le nuove prove, compatta e cancella i file superflui (il CSV storico non si tocca)."""
+    conn = apri_prove(file_archivio, file_csv)
+    try:
+        with conn:
+            registrati, compattati = registra_nuove(conn)
+            compattati += compatta_episodi_vecchi(conn, oggi)
+        liberati = cancella_compattati(conn, file_riferimenti)
+        presenti, totali = conn.execute("SELECT COUNT(*) - COUNT(RIFERIMENTO), COUNT(*) FROM prove_fotografiche").fetchone()
+    finally:
+        conn.close()
+    print(f"🗂️ Prove fotografiche: {registrati} nuove, {compattati} compattate ({liberati / 1e6:.1f} MB liberati); "
+          f"{presenti} file per {totali} scatti.")
+    return registrati, compattati
+
+if __name__ == "__main__":
+    # Il primo giro indicizza e compatta anche tutte le prove già salvate in public/screenshots
+    aggiorna_prove()
@@ -1,11 +1,12 @@
-import requests
+import asyncio
+import json
 import pandas as pd
-import time
 import random # Aggiungiamo un pizzico di imprevedibilità umana
 from datetime import datetime
 import os
-import cloudscraper # IL NOSTRO GRIMALDELLO
-from curl_cffi import requests as stealth_requests
+from curl_cffi.requests import AsyncSession # Impronte crittografiche da browser vero
+from metriche import span, conta, giro
+from giornale_csv import GiornaleCsv
 
 # --- 1. LA TUA LISTA DELLA SPESA (Aggiungi qui le altre bottiglie) ---
 vini_da_estrarre = [
@@ -20,94 +21,227 @@ HEADERS = {
     "Accept": "application/json"
 }
 
-def estrai_recensioni_vivino(vino, max_reviews=100):
+FILE_CSV = "public/data/sentiment_vini_raw.csv"
+# Segnalibri per vino: recensione più recente già salvata e ultima pagina dello storico letta
+FILE_CURSORI = "public/data/cursori_vivino.json"
+# Colonne del CSV grezzo (usate se il file è nuovo) e chiave con cui si riconoscono i doppioni
+COLONNE_RAW = ['DATA_COMMENTO', 'ID_PRODOTTO', 'NOME_PRODOTTO', 'CATEGORIA_PRODOTTO', 'SITO_ECOMMERCE', 'RATING_ORIGINALE', 'TESTO_COMMENTO']
+CHIAVI_DOPPIONI = ['DATA_COMMENTO', 'NOME_PRODOTTO', 'TESTO_COMMENTO']
+
+# --- BUDGET GLOBALE DI RICHIESTE VERSO VIVINO ---
+# Più vini in parallelo, ma tutte le richieste passano dallo stesso "rubinetto":
+# tra due chiamate consecutive (di qualunque vino) c'è sempre una pausa random.
+MAX_VINI_PARALLELI = 4
+PAUSA_MIN, PAUSA_MAX = 2.0, 3.5
+PER_PAGINA = 25
+
+class BudgetRichieste:
+    def __init__(self, pausa_min, pausa_max):
+        self.pausa_min = pausa_min
+        self.pausa_max = pausa_max
+        self._lock = asyncio.Lock()
+        self._prossima = 0.0
+
+    async def attendi_turno(self):
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            attesa = self._prossima - loop.time()
+            if attesa > 0:
+                await asyncio.sleep(attesa)
+            # Pausa RANDOM per non sembrare un metronomo robotico
+            self._prossima = loop.time() + random.uniform(self.pausa_min, self.pausa_max)
+
+def carica_cursori(file_cursori=FILE_CURSORI):
+    if not os.path.exists(file_cursori):
+        return {}
+    with open(file_cursori, encoding='utf-8') as f:
+        return json.load(f)
+
+def salva_cursori(cursori, file_cursori=FILE_CURSORI):
+    temporaneo = file_cursori + '.tmp'
+    with open(temporaneo, 'w', encoding='utf-8') as f:
+        json.dump(cursori, f, indent=2, ensure_ascii=False)
+    os.replace(temporaneo, file_cursori)
+
+def _converti_recensione(rev, vino):
+    giorno_raw = rev.get("created_at")
+    giorno_formattato = datetime.strptime(giorno_raw, "%Y-%m-%dT%H:%M:%S.000Z").strftime("%Y-%m-%d") if giorno_raw else ""
+    testo = (rev.get("note") or "").replace(";", ",").replace("\n", " ")
+    if not testo or len(testo) <= 5:
+        return None
+    return {
+        "DATA_COMMENTO": giorno_formattato,
+        "ID_PRODOTTO": vino['ID_PRODOTTO'],
+        "NOME_PRODOTTO": vino['NOME_PRODOTTO'],
+        "SITO_ECOMMERCE": "Vivino",
+        "RATING_ORIGINALE": rev.get("rating"),
+        "TESTO_COMMENTO": testo  # stessa colonna di sentiment_vini_raw.csv, letta da bot_sentiment_ai
+    }
+
+async def _scarica_pagina(sessione, budget, wine_id, page):
+    with span('attesa_turno', sito='vivino'):
+        await budget.attendi_turno()
+    url = f"https://www.vivino.com/api/wines/{wine_id}/reviews?per_page={PER_PAGINA}&page={page}"
+    with span('fetch', sito='vivino', listing=wine_id):
+        response = await sessione.get(url, headers=HEADERS, impersonate="chrome110")
+    conta('risposte_http', sito='vivino', status=response.status_code)
+    if response.status_code != 200:
+        print(f"⚠️ Errore {response.status_code} su {wine_id} (pagina {page}). Muro impenetrabile.")
+        return None
+    return response.json().get("reviews", [])
+
+async def estrai_recensioni_vivino(sessione, budget, vino, cursore, max_reviews=100):
+    """Raccoglie le recensioni di un vino e aggiorna il suo cursore (dict modificato sul posto).
+
+    1. Novità: dalla pagina 1 (le più recenti) fino alla prima recensione già vista
+       (created_at <= cursore['ultimo_created_at']), poi ci si ferma.
+    2. Arretrati: se lo storico non è ancora stato letto tutto, si riparte da
+       cursore['ultima_pagina'] + 1 con il budget rimasto.
+    """
     print(f"\n🍷 Inizio estrazione per: {vino['NOME_PRODOTTO']} (Max {max_reviews} recensioni)...")
     recensioni_estratte = []
-    page = 1
-    
-    # Inizializziamo lo scraper avanzato simulando un browser Chrome su Windows
-    scraper = cloudscraper.create_scraper(browser={'browser': 'chrome', 'platform': 'windows', 'desktop': True})
-    
-    while len(recensioni_estratte) < max_reviews:
-        url = f"https://www.vivino.com/api/wines/{vino['WINE_ID']}/reviews?per_page=25&page={page}"
-        
-        try:
-            # Usiamo curl_cffi per ingannare le impronte crittografiche
-            response = stealth_requests.get(url, headers=HEADERS, impersonate="chrome110")
-            
-            if response.status_code != 200:
-                print(f"⚠️ Errore {response.status_code}. Muro impenetrabile.")
-                break
+    ultimo_visto = cursore.get('ultimo_created_at')
+    piu_recente = ultimo_visto
+    novita_complete = False  # True quando la fase 1 ha raggiunto le recensioni già viste
 
-            data = response.json()
-            reviews = data.get("reviews", [])
-            
+    try:
+        # --- Fase 1: solo recensioni più nuove dell'ultimo giro ---
+        page = 1
+        while len(recensioni_estratte) < max_reviews:
+            reviews = await _scarica_pagina(sessione, budget, vino['WINE_ID'], page)
             if not reviews:
-                break 
-                
+                if reviews is not None:
+                    novita_complete = True
+                    if not ultimo_visto: cursore['storico_completo'] = True
+                break
+
+            gia_visto = False
             for rev in reviews:
-                giorno_raw = rev.get("created_at")
-                giorno_formattato = datetime.strptime(giorno_raw, "%Y-%m-%dT%H:%M:%S.000Z").strftime("%Y-%m-%d") if giorno_raw else ""
-                rating = rev.get("rating")
-                testo = rev.get("note", "").replace(";", ",").replace("\n", " ")
-                
-                if testo and len(testo) > 5:
-                    recensioni_estratte.append({
-                        "DATA_COMMENTO": giorno_formattato,
-                        "ID_PRODOTTO": vino['ID_PRODOTTO'],
-                        "NOME_PRODOTTO": vino['NOME_PRODOTTO'],
-                        "SITO_ECOMMERCE": "Vivino",
-                        "RATING_ORIGINALE": rating,
-                        "TESTO_ORIGINALE": testo
-                    })
-            
-            print(f"   -> Pagina {page} completata. Totale parziale: {len(recensioni_estratte)}")
+                creata = rev.get("created_at") or ""
+                if ultimo_visto and creata and creata <= ultimo_visto:
+                    gia_visto = True
+                    break
+                piu_recente = max(piu_recente or "", creata) or None
+                record = _converti_recensione(rev, vino)
+                if record: recensioni_estratte.append(record)
+
+            print(f"   -> {vino['ID_PRODOTTO']} pagina {page} completata. Totale parziale: {len(recensioni_estratte)}")
+            if not ultimo_visto:
+                cursore['ultima_pagina'] = page  # primo giro: la fase 1 è anche lo storico
+            if gia_visto or len(reviews) < PER_PAGINA:
+                novita_complete = True
+                if not ultimo_visto and len(reviews) < PER_PAGINA:
+                    cursore['storico_completo'] = True
+                break
             page += 1
-            
-            # Pausa RANDOM (tra i 6 e i 10 secondi) per non sembrare un metronomo robotico
-            time.sleep(random.uniform(6, 10))
-            
-        except Exception as e:
-            print(f"Errore: {e}")
-            break
-            
-    return recensioni_estratte[:max_reviews]
+
+        # --- Fase 2: recupero arretrati dal punto in cui ci eravamo fermati ---
+        if ultimo_visto and not cursore.get('storico_completo'):
+            page = cursore.get('ultima_pagina', 0) + 1
+            while len(recensioni_estratte) < max_reviews:
+                reviews = await _scarica_pagina(sessione, budget, vino['WINE_ID'], page)
+                if reviews is None:
+                    break
+                for rev in reviews:
+                    record = _converti_recensione(rev, vino)
+                    if record: recensioni_estratte.append(record)
+                cursore['ultima_pagina'] = page
+                print(f"   -> {vino['ID_PRODOTTO']} arretrati pagina {page}. Totale parziale: {len(recensioni_estratte)}")
+                if len(reviews) < PER_PAGINA:
+                    cursore['storico_completo'] = True
+                    break
+                page += 1
+
+    except Exception as e:
+        print(f"Errore su {vino['ID_PRODOTTO']}: {e}")
+
+    # Se il budget è finito prima di raggiungere le recensioni già viste, il segnalibro non avanza:
+    # il giro successivo ripartirà dalla pagina 1 senza lasciare buchi (i doppioni vengono scartati)
+    if piu_recente and (novita_complete or not ultimo_visto):
+        cursore['ultimo_created_at'] = piu_recente
+    return recensioni_estratte
+
+def chiave_recensione(rec):
+    return tuple('' if rec.get(c) is None else str(rec.get(c)) for c in CHIAVI_DOPPIONI)
+
+def chiavi_salvate(file_csv=FILE_CSV):
+    """Chiavi dei doppioni già presenti nel CSV grezzo (si leggono solo quelle tre colonne)."""
+    if not os.path.isfile(file_csv) or os.path.getsize(file_csv) == 0:
+        return set()
+    df_chiavi = pd.read_csv(file_csv, sep=';', encoding='utf-8-sig', usecols=CHIAVI_DOPPIONI,
+                            dtype=str, keep_default_na=False, on_bad_lines='skip')
+    return set(df_chiavi.itertuples(index=False, name=None))
+
+def solo_nuove(recensioni, gia_salvate):
+    """Scarta le recensioni con chiave già vista; le chiavi delle nuove entrano in gia_salvate."""
+    nuove = []
+    for rec in recensioni:
+        chiave = chiave_recensione(rec)
+        if chiave not in gia_salvate:
+            gia_salvate.add(chiave)
+            nuove.append(rec)
+    return nuove
+
+async def raccogli_tutte(vini, cursori, max_reviews=100, al_vino=None, file_csv=FILE_CSV):
+    """al_vino(recensioni), se passata, riceve le recensioni nuove di ogni vino appena finito (es. la coda verso
+    il sentiment nella pipeline notturna); gira in un thread, così una coda piena non ferma gli altri vini."""
+    budget = BudgetRichieste(PAUSA_MIN, PAUSA_MAX)
+    semaforo = asyncio.Semaphore(MAX_VINI_PARALLELI)
+    # Se il cursore non è avanzato (budget finito prima delle recensioni già viste) lo scraper rilegge
+    # recensioni già nel CSV grezzo: non devono tornare al sentiment, quindi si filtrano prima della coda
+    gia_inviate = chiavi_salvate(file_csv) if al_vino else set()
+
+    async def un_vino(sessione, vino):
+        async with semaforo:
+            cursore = cursori.setdefault(vino['WINE_ID'], {})
+            recensioni = await estrai_recensioni_vivino(sessione, budget, vino, cursore, max_reviews)
+        nuove = solo_nuove(recensioni, gia_inviate) if al_vino else []
+        if nuove:
+            await asyncio.to_thread(al_vino, nuove)
+        return recensioni
+
+    async with AsyncSession() as sessione:
+        risultati = await asyncio.gather(*[un_vino(sessione, vino) for vino in vini])
+    return [r for lista in risultati for r in lista]
+
+def salva_recensioni(tutte_le_recensioni, file_csv=FILE_CSV):
+    """Accoda le nuove recensioni al CSV grezzo; restituisce True se il salvataggio è andato a buon fine."""
+    conta('recensioni_raccolte', len(tutte_le_recensioni))
+
+    try:
+        # Dello storico servono solo le chiavi dei doppioni: il file non viene più riletto e riscritto per intero
+        nuove = solo_nuove(tutte_le_recensioni, chiavi_salvate(file_csv))
+
+        with GiornaleCsv(file_csv, COLONNE_RAW) as giornale:
+            giornale.scrivi_tutti(nuove)
+        print(f"\n✅ OPERAZIONE COMPLETATA! Accodate {len(nuove)} recensioni nuove in {file_csv} "
+              f"({len(tutte_le_recensioni) - len(nuove)} doppioni scartati)")
+        return True
+
+    except Exception as e:
+        # IL SALVAVITA: Se non riesce a leggere, crea un file a parte!
+        file_emergenza = f"public/data/sentiment_EMERGENZA_{datetime.now().strftime('%H%M%S')}.csv"
+        pd.DataFrame(tutte_le_recensioni).to_csv(file_emergenza, index=False, sep=';', encoding='utf-8-sig')
+        print(f"\n🚨 ERRORE CRITICO in lettura del vecchio file: {e}")
+        print(f"⚠️ Per non sovrascrivere, ho salvato i nuovi dati in: {file_emergenza}")
+        return False
 
 # --- 2. ESECUZIONE MULTIPLA E SALVATAGGIO ---
-file_csv = "public/data/sentiment_vini_raw.csv"
-tutte_le_recensioni = []
-
-# Ciclo su tutte le bottiglie della lista
-for vino in vini_da_estrarre:
-    dati = estrai_recensioni_vivino(vino)
-    tutte_le_recensioni.extend(dati)
-    
-    # Pausa lunghissima tattica per far "raffreddare" l'IP
-    print("\n⏳ Pausa tattica di 30 secondi per eludere i radar...")
-    time.sleep(random.uniform(30, 45))
-
-if tutte_le_recensioni:
-    df_nuovi = pd.DataFrame(tutte_le_recensioni)
-    
-    if os.path.isfile(file_csv):
-        try:
-            df_storico = pd.read_csv(file_csv, sep=';', encoding='utf-8-sig')
-            df_finale = pd.concat([df_storico, df_nuovi], ignore_index=True)
-            df_finale = df_finale.drop_duplicates(subset=['DATA_COMMENTO', 'NOME_PRODOTTO', 'TESTO_ORIGINALE'])
-            df_finale.to_csv(file_csv, index=False, sep=';', encoding='utf-8-sig')
-            print(f"\n✅ OPERAZIONE COMPLETATA! Salvate {len(df_finale)} recensioni in {file_csv}")
-            
-        except Exception as e:
-            # IL SALVAVITA: Se non riesce a leggere, crea un file a parte!
-            file_emergenza = f"public/data/sentiment_EMERGENZA_{datetime.now().strftime('%H%M%S')}.csv"
-            df_nuovi.to_csv(file_emergenza, index=False, sep=';', encoding='utf-8-sig')
-            print(f"\n🚨 ERRORE CRITICO in lettura del vecchio file: {e}")
-            print(f"⚠️ Per non sovrascrivere, ho salvato i nuovi dati in: {file_emergenza}")
+def main(al_vino=None):
+    """Restituisce False se le recensioni raccolte non sono finite nel CSV grezzo."""
+    cursori = carica_cursori()
+    tutte_le_recensioni = asyncio.run(raccogli_tutte(vini_da_estrarre, cursori, al_vino=al_vino))
+
+    if tutte_le_recensioni:
+        # I cursori avanzano solo se le recensioni sono davvero finite su disco
+        if not salva_recensioni(tutte_le_recensioni):
+            return False
+        salva_cursori(cursori)
     else:
-        df_nuovi.to_csv(file_csv, index=False, sep=';', encoding='utf-8-sig')
-        print(f"\n✅ OPERAZIONE COMPLETATA! File creato da zero con {len(df_nuovi)} recensioni.")
-               
-    df_finale.to_csv(file_csv, index=False, sep=';', encoding='utf-8-sig')
-    print(f"\n✅ OPERAZIONE COMPLETATA! Salvate {len(tutte_le_recensioni)} recensioni in {file_csv}")
-else:
-    print("\n❌ Nessuna recensione estratta.")
\ No newline at end of file
+        salva_cursori(cursori)
+        print("\n❌ Nessuna recensione nuova estratta.")
+    return True
+
+if __name__ == "__main__":
+    with giro('recensioni'):
+        main()
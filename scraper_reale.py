@@ -1,11 +1,15 @@
 import requests
 from bs4 import BeautifulSoup
-import gspread
 from datetime import datetime
 import re
+import sys
+from destinazioni_righe import crea_destinazione, destinazione_da_argomenti
 
 # 1. SETUP DEL DATABASE
 LINK_FOGLIO = "https://docs.google.com/spreadsheets/d/1mM998ELdz5WezKjdn93QgeO8IpA6JGIYeU-JtxflLmU/edit?gid=490813682#gid=490813682" 
+# --destinazione sheets|csv|sqlite|finto: Google Sheets di default, file locali o foglio finto per le prove
+COLONNE = ['DATA_ESTRAZIONE', 'ID_PRODOTTO', 'NOME_PRODOTTO', 'SITO_ORIGINE', 'PREZZO_RILEVATO', 'LINK_SCRAPING']
+FILE_LOCALE = "public/data/prezzi_scraper_reale"
 
 # 2. DIZIONARIO BERSAGLI
 siti_target = [
@@ -84,19 +88,17 @@ for sito in siti_target:
     except Exception as e:
         print(f"❌ Errore tecnico: {e}")
 
-# 4. SALVATAGGIO SUL DATABASE
+# 4. SALVATAGGIO SUL DATABASE (una sola scrittura per tutto il giro)
 if dati_estratti:
-    print("\n☁️ Scrittura su Google Sheets in corso...")
+    tipo = destinazione_da_argomenti(sys.argv)
+    print(f"\n☁️ Scrittura su {tipo} in corso...")
     try:
-        gc = gspread.service_account(filename='credenziali.json')
-        sh = gc.open_by_url(LINK_FOGLIO)
-        worksheet = sh.worksheet("Prezzi")
-        
-        for riga in dati_estratti:
-            worksheet.append_row(riga)
+        with crea_destinazione(tipo, COLONNE, FILE_LOCALE, link_foglio=LINK_FOGLIO, nome_foglio="Prezzi") as destinazione:
+            for riga in dati_estratti:
+                destinazione.aggiungi(riga)
             
-        print("🎉 MISSIONE COMPIUTA! Tutti i prezzi sono salvati.")
+        print(f"🎉 MISSIONE COMPIUTA! Tutti i prezzi sono salvati ({destinazione.scritte} righe in {destinazione.chiamate} chiamate).")
     except Exception as e:
-        print(f"❌ Errore nel salvataggio su Google Sheets: {e}")
+        print(f"❌ Errore nel salvataggio su {tipo}: {e}")
 else:
     print("\n⚠️ Nessun dato utile estratto oggi. Database non aggiornato.")
\ No newline at end of file
@@ -0,0 +1,261 @@
+import json
+import math
+import os
+import re
+import sys
+import unicodedata
+from collections import Counter, defaultdict
+
+from lettura_dati import leggi_sentiment
+
+# --- PRIMO FILTRO LOCALE DEL SENTIMENT (PRIMA DI GEMINI) ---
+# Naive Bayes multinomiale in puro Python, addestrato sulle recensioni già etichettate da Gemini.
+# Caratteristiche: parole del testo (con negazione), fascia del RATING_ORIGINALE e voci del lessico.
+# Una recensione si chiude in locale solo se il modello è sicuro (>= SOGLIA_CONFIDENZA) E voto e lessico
+# sono d'accordo; i Neutri sono ambigui per definizione e vanno sempre all'API.
+FILE_ETICHETTATO = 'public/data/sentiment_vini_elaborato.csv'
+FILE_MODELLO = os.path.join('public', 'data', 'modello_sentiment_locale.json')
+
+ETICHETTE = ('Positivo', 'Neutro', 'Negativo')
+SOGLIA_CONFIDENZA = 0.97
+RATING_MIN_POSITIVO = 4.0   # sotto questo voto un "Positivo" lo decide Gemini
+RATING_MAX_NEGATIVO = 2.5
+LISCIATURA = 0.5      # Laplace sulle parole
+PESO_RATING = 3       # il voto conta come più parole: è il segnale più affidabile
+PESO_LESSICO = 2
+VERSIONE_MODELLO = 1
+
+RE_PAROLE = re.compile(r"[^\W\d_]+(?:'[^\W\d_]+)?")
+
+# Parole che invertono la polarità delle due successive ("not good", "non buono", "nicht gut", ...)
+NEGAZIONI = {'not', 'no', 'never', "isn't", "wasn't", "don't", "didn't", 'non', 'mai', 'nicht', 'kein',
+             'keine', 'niet', 'geen', 'pas', 'ne', 'nunca', 'nem', 'não', 'nao', 'ni'}
+
+# --- LESSICO MULTILINGUE: parola -> (polarità, parola chiave in italiano per la word cloud) ---
+LESSICO = {
+    # Positivo
+    'top': (1, 'top'), 'great': (1, 'ottimo'), 'excellent': (1, 'eccellente'), 'amazing': (1, 'strepitoso'),
+    'wonderful': (1, 'meraviglioso'), 'lovely': (1, 'piacevole'), 'delicious': (1, 'delizioso'),
+    'good': (1, 'buono'), 'nice': (1, 'piacevole'), 'elegant': (1, 'elegante'), 'perfect': (1, 'perfetto'),
+    'beautiful': (1, 'bellissimo'), 'fantastic': (1, 'fantastico'), 'outstanding': (1, 'eccezionale'),
+    'balanced': (1, 'equilibrato'), 'smooth': (1, 'morbido'), 'velvety': (1, 'vellutato'),
+    'superb': (1, 'superbo'), 'awesome': (1, 'strepitoso'), 'recommend': (1, 'consigliato'),
+    'recommended': (1, 'consigliato'), 'favorite': (1, 'preferito'), 'favourite': (1, 'preferito'),
+    'harmonious': (1, 'armonioso'), 'fresh': (1, 'fresco'), 'tasty': (1, 'gustoso'), 'love': (1, 'adorato'),
+    'buono': (1, 'buono'), 'buonissimo': (1, 'buonissimo'), 'ottimo': (1, 'ottimo'), 'eccellente': (1, 'eccellente'),
+    'elegante': (1, 'elegante'), 'piacevole': (1, 'piacevole'), 'perfetto': (1, 'perfetto'),
+    'equilibrato': (1, 'equilibrato'), 'morbido': (1, 'morbido'), 'fresco': (1, 'fresco'),
+    'consigliato': (1, 'consigliato'), 'strepitoso': (1, 'strepitoso'), 'fantastico': (1, 'fantastico'),
+    'gut': (1, 'buono'), 'sehr': (1, 'ottimo'), 'lecker': (1, 'gustoso'), 'toll': (1, 'ottimo'),
+    'hervorragend': (1, 'eccellente'), 'wunderbar': (1, 'meraviglioso'), 'frisch': (1, 'fresco'),
+    'lekker': (1, 'gustoso'), 'mooi': (1, 'bello'), 'heerlijk': (1, 'delizioso'), 'aanrader': (1, 'consigliato'),
+    'goed': (1, 'buono'), 'fris': (1, 'fresco'), 'prima': (1, 'ottimo'),
+    'bon': (1, 'buono'), 'excellente': (1, 'eccellente'), 'délicieux': (1, 'delizioso'), 'parfait': (1, 'perfetto'),
+    'bueno': (1, 'buono'), 'buenísimo': (1, 'buonissimo'), 'excelente': (1, 'eccellente'), 'rico': (1, 'gustoso'),
+    'bom': (1, 'buono'), 'ótimo': (1, 'ottimo'), 'delicioso': (1, 'delizioso'),
+    # Negativo
+    'bad': (-1, 'cattivo'), 'awful': (-1, 'pessimo'), 'terrible': (-1, 'pessimo'), 'horrible': (-1, 'pessimo'),
+    'boring': (-1, 'noioso'), 'disappointing': (-1, 'deludente'), 'disappointment': (-1, 'deludente'),
+    'disappointed': (-1, 'deludente'), 'sour': (-1, 'acido'), 'corked': (-1, 'tappato'), 'flat': (-1, 'piatto'),
+    'overpriced': (-1, 'costoso'), 'thin': (-1, 'esile'), 'watery': (-1, 'acquoso'), 'bland': (-1, 'insipido'),
+    'worst': (-1, 'pessimo'), 'meh': (-1, 'mediocre'), 'mediocre': (-1, 'mediocre'), 'poor': (-1, 'scadente'),
+    'unbalanced': (-1, 'sbilanciato'), 'harsh': (-1, 'aspro'), 'bitter': (-1, 'amaro'),
+    'cattivo': (-1, 'cattivo'), 'pessimo': (-1, 'pessimo'), 'deludente': (-1, 'deludente'), 'tappato': (-1, 'tappato'),
+    'acido': (-1, 'acido'), 'piatto': (-1, 'piatto'), 'costoso': (-1, 'costoso'), 'sbilanciato': (-1, 'sbilanciato'),
+    'insipido': (-1, 'insipido'), 'annacquato': (-1, 'acquoso'), 'scadente': (-1, 'scadente'),
+    'schlecht': (-1, 'cattivo'), 'enttäuschend': (-1, 'deludente'), 'sauer': (-1, 'acido'), 'langweilig': (-1, 'noioso'),
+    'slecht': (-1, 'cattivo'), 'zuur': (-1, 'acido'), 'teleurstellend': (-1, 'deludente'), 'saai': (-1, 'noioso'),
+    'mauvais': (-1, 'cattivo'), 'décevant': (-1, 'deludente'), 'malo': (-1, 'cattivo'), 'decepcionante': (-1, 'deludente'),
+    'ruim': (-1, 'cattivo'),
+}
+
+
+def tokenizza(testo):
+    """Parole minuscole (NFKC) con marcatura della negazione: "not good" -> ['not', 'NON_good']."""
+    parole = RE_PAROLE.findall(unicodedata.normalize('NFKC', str(testo)).lower())
+    risultato = []
+    negate = 0
+    for parola in parole:
+        if parola in NEGAZIONI:
+            negate = 2
+            risultato.append(parola)
+            continue
+        risultato.append('NON_' + parola if negate else parola)
+        negate = max(0, negate - 1)
+    return risultato
+
+def voci_lessico(parole):
+    """Voci del lessico presenti nel testo, con la polarità già invertita dalle negazioni."""
+    voci = []
+    for parola in parole:
+        negata = parola.startswith('NON_')
+        voce = LESSICO.get(parola[4:] if negata else parola)
+        if voce:
+            polarita, chiave = voce
+            voci.append((-polarita if negata else polarita, ('non ' + chiave) if negata else chiave))
+    return voci
+
+def fascia_rating(rating):
+    try:
+        rating = float(rating)
+    except (TypeError, ValueError):
+        return None
+    if math.isnan(rating):
+        return None
+    return f"{min(5.0, max(1.0, round(rating * 2) / 2)):.1f}"
+
+def caratteristiche(testo, rating):
+    parole = tokenizza(testo)
+    conteggi = Counter(parole)
+    fascia = fascia_rating(rating)
+    if fascia:
+        conteggi['__RATING_' + fascia] += PESO_RATING
+    for polarita, _ in voci_lessico(parole):
+        conteggi['__LESSICO_POS' if polarita > 0 else '__LESSICO_NEG'] += PESO_LESSICO
+    return conteggi
+
+
+class ClassificatoreLocale:
+    def __init__(self, priori=None, conteggi=None, totali=None, vocabolario=None):
+        self.priori = priori or {}
+        self.conteggi = conteggi or {e: {} for e in ETICHETTE}
+        self.totali = totali or {e: 0 for e in ETICHETTE}
+        self.vocabolario = vocabolario or 0
+
+    @classmethod
+    def addestra(cls, testi, rating, etichette):
+        conteggi = {e: defaultdict(int) for e in ETICHETTE}
+        documenti = Counter()
+        for testo, voto, etichetta in zip(testi, rating, etichette):
+            if etichetta not in conteggi:
+                continue
+            documenti[etichetta] += 1
+            for parola, n in caratteristiche(testo, voto).items():
+                conteggi[etichetta][parola] += n
+        n_documenti = sum(documenti.values())
+        priori = {e: math.log((documenti[e] + 1) / (n_documenti + len(ETICHETTE))) for e in ETICHETTE}
+        vocabolario = len(set().union(*(c.keys() for c in conteggi.values())))
+        return cls(priori, {e: dict(c) for e, c in conteggi.items()},
+                   {e: sum(c.values()) for e, c in conteggi.items()}, vocabolario)
+
+    def probabilita(self, testo, rating):
+        punteggi = {}
+        parole = caratteristiche(testo, rating)
+        for etichetta in ETICHETTE:
+            conteggi = self.conteggi[etichetta]
+            denominatore = math.log(self.totali[etichetta] + LISCIATURA * self.vocabolario)
+            punteggio = self.priori[etichetta]
+            for parola, n in parole.items():
+                punteggio += n * (math.log(conteggi.get(parola, 0) + LISCIATURA) - denominatore)
+            punteggi[etichetta] = punteggio
+        massimo = max(punteggi.values())
+        esponenziali = {e: math.exp(p - massimo) for e, p in punteggi.items()}
+        somma = sum(esponenziali.values())
+        return {e: v / somma for e, v in esponenziali.items()}
+
+    def classifica(self, testo, rating, soglia=SOGLIA_CONFIDENZA):
+        """Restituisce (etichetta, confidenza); etichetta è None se il caso va girato a Gemini."""
+        probabilita = self.probabilita(testo, rating)
+        etichetta = max(probabilita, key=probabilita.get)
+        confidenza = probabilita[etichetta]
+        if confidenza < soglia:
+            return None, confidenza
+
+        fascia = fascia_rating(rating)
+        voto = float(fascia) if fascia else None
+        polarita = [p for p, _ in voci_lessico(tokenizza(testo))]
+        if etichetta == 'Positivo' and voto is not None and voto >= RATING_MIN_POSITIVO and -1 not in polarita:
+            return etichetta, confidenza
+        if etichetta == 'Negativo' and voto is not None and voto <= RATING_MAX_NEGATIVO and 1 not in polarita:
+            return etichetta, confidenza
+        return None, confidenza
+
+    def dati_ia(self, testo, etichetta):
+        """Risposta nello stesso formato di Gemini, così costruisci_record non cambia.
+        In locale non c'è traduzione: testo_tradotto resta vuoto (TESTO_COMMENTO vuoto = non tradotto,
+        le dashboard mostrano TESTO_ORIGINALE segnalandolo). Le parole chiave sono già in italiano (lessico)."""
+        voci = voci_lessico(tokenizza(testo))
+        positive = list(dict.fromkeys(c for p, c in voci if p > 0))
+        negative = list(dict.fromkeys(c for p, c in voci if p < 0))
+        return {
+            'testo_tradotto': '',
+            'sentiment_generale': etichetta,
+            'parole_positive': ', '.join(positive),
+            'parole_negative': ', '.join(negative),
+        }
+
+    def salva(self, file_modello=FILE_MODELLO):
+        temporaneo = file_modello + '.tmp'
+        with open(temporaneo, 'w', encoding='utf-8') as f:
+            json.dump({'versione': VERSIONE_MODELLO, 'priori': self.priori, 'conteggi': self.conteggi,
+                       'totali': self.totali, 'vocabolario': self.vocabolario}, f, ensure_ascii=False)
+        os.replace(temporaneo, file_modello)
+
+    @classmethod
+    def carica(cls, file_modello=FILE_MODELLO):
+        with open(file_modello, encoding='utf-8') as f:
+            dati = json.load(f)
+        if dati.get('versione') != VERSIONE_MODELLO:
+            return None
+        return cls(dati['priori'], dati['conteggi'], dati['totali'], dati['vocabolario'])
+
+
+def leggi_etichettato(file_etichettato=FILE_ETICHETTATO):
+    df = leggi_sentiment(file_etichettato, converti_date_colonne=False)
+    return df[df['SENTIMENT_SCORE'].isin(ETICHETTE) & df['TESTO_ORIGINALE'].notna()].reset_index(drop=True)
+
+def addestra_da_csv(file_etichettato=FILE_ETICHETTATO, file_modello=FILE_MODELLO):
+    df = leggi_etichettato(file_etichettato)
+    modello = ClassificatoreLocale.addestra(df['TESTO_ORIGINALE'], df['RATING_ORIGINALE'], df['SENTIMENT_SCORE'])
+    modello.salva(file_modello)
+    print(f"🧮 Classificatore locale addestrato su {len(df)} recensioni etichettate -> {file_modello}")
+    return modello
+
+def carica_o_addestra(file_modello=FILE_MODELLO, file_etichettato=FILE_ETICHETTATO):
+    """Il modello salvato resta fisso tra un giro e l'altro: si riaddestra solo con --addestra,
+    così le etichette decise in locale non finiscono a rinforzare il modello stesso."""
+    if os.path.exists(file_modello):
+        modello = ClassificatoreLocale.carica(file_modello)
+        if modello is not None:
+            return modello
+    if not os.path.exists(file_etichettato):
+        return None
+    return addestra_da_csv(file_etichettato, file_modello)
+
+def valuta(file_etichettato=FILE_ETICHETTATO, soglia=SOGLIA_CONFIDENZA, pieghe=5, dimensione_batch=10):
+    """Validazione incrociata a k pieghe contro le etichette di Gemini: accordo sui casi chiusi in locale
+    e chiamate API risparmiate (a parità di dimensione del batch)."""
+    df = leggi_etichettato(file_etichettato)
+    chiuse, concordi = 0, 0
+    confusione = Counter()
+    for k in range(pieghe):
+        prova = df.index % pieghe == k
+        modello = ClassificatoreLocale.addestra(df.loc[~prova, 'TESTO_ORIGINALE'], df.loc[~prova, 'RATING_ORIGINALE'],
+                                                df.loc[~prova, 'SENTIMENT_SCORE'])
+        for testo, rating, atteso in df.loc[prova, ['TESTO_ORIGINALE', 'RATING_ORIGINALE', 'SENTIMENT_SCORE']].itertuples(index=False):
+            etichetta, _ = modello.classifica(testo, rating, soglia)
+            if etichetta is None:
+                continue
+            chiuse += 1
+            concordi += etichetta == atteso
+            confusione[(atteso, etichetta)] += 1
+
+    totale = len(df)
+    chiamate_prima = math.ceil(totale / dimensione_batch)
+    chiamate_dopo = math.ceil((totale - chiuse) / dimensione_batch)
+    print(f"📊 Validazione incrociata ({pieghe} pieghe, soglia {soglia}) su {totale} recensioni etichettate")
+    print(f"   Chiuse in locale: {chiuse} ({chiuse / totale:.1%}), accordo con Gemini: {concordi / max(chiuse, 1):.1%}")
+    for (atteso, previsto), n in sorted(confusione.items()):
+        if atteso != previsto:
+            print(f"   ⚠️ {n} × Gemini={atteso} / locale={previsto}")
+    print(f"   Chiamate API (batch da {dimensione_batch}): {chiamate_prima} -> {chiamate_dopo} "
+          f"(-{1 - chiamate_dopo / chiamate_prima:.1%})")
+    return {'totale': totale, 'chiuse': chiuse, 'concordi': concordi,
+            'chiamate_prima': chiamate_prima, 'chiamate_dopo': chiamate_dopo}
+
+
+if __name__ == "__main__":
+    if '--addestra' in sys.argv:
+        addestra_da_csv()
+    else:
+        valuta()
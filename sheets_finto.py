@@ -0,0 +1,25 @@
+import time
+
+# --- FOGLIO GOOGLE SHEETS FINTO (PROVE OFFLINE DELLE DESTINAZIONI) ---
+# Imita il Worksheet di gspread per le sole scritture in coda: append_row e append_rows.
+# Ogni chiamata è un round trip verso l'API (contato e, se serve, rallentato da una latenza finta),
+# così si misura quante richieste consuma uno scraper senza toccare la quota vera.
+class FoglioFinto:
+    def __init__(self, nome='Prezzi', latenza=0.0):
+        self.title = nome
+        self.latenza = latenza
+        self.chiamate = 0
+        self.righe = []
+
+    def _round_trip(self):
+        self.chiamate += 1
+        if self.latenza:
+            time.sleep(self.latenza)
+
+    def append_row(self, values, value_input_option='RAW', **opzioni):
+        self._round_trip()
+        self.righe.append(list(values))
+
+    def append_rows(self, values, value_input_option='RAW', **opzioni):
+        self._round_trip()
+        self.righe.extend(list(riga) for riga in values)
@@ -0,0 +1,68 @@
+import hashlib
+import os
+import threading
+import time
+
+# --- SORGENTI DATI CON RICARICAMENTO IN BACKGROUND ---
+# Ogni file ha il suo dato in memoria, legato all'impronta del contenuto. Un thread di sorveglianza
+# controlla mtime/dimensione ogni INTERVALLO_CONTROLLO secondi; se cambiano ricalcola l'hash e, solo se
+# il contenuto è davvero diverso, ricarica e sostituisce il dato. Le richieste degli utenti leggono sempre
+# l'ultimo dato pronto e non aspettano mai un ricaricamento (tranne il primissimo caricamento).
+INTERVALLO_CONTROLLO = 30
+
+def impronta_file(percorso):
+    h = hashlib.sha256()
+    with open(percorso, 'rb') as f:
+        for blocco in iter(lambda: f.read(1 << 20), b''):
+            h.update(blocco)
+    return h.hexdigest()
+
+def stato_file(percorso):
+    try:
+        stato = os.stat(percorso)
+    except FileNotFoundError:
+        return None
+    return stato.st_mtime_ns, stato.st_size
+
+
+class SorgenteFile:
+    def __init__(self, percorso, caricatore, intervallo=INTERVALLO_CONTROLLO):
+        self.percorso = percorso
+        self.caricatore = caricatore  # funzione(percorso) -> dato pronto per l'app
+        self.intervallo = intervallo
+        self.ricaricamenti = 0
+        self._lock = threading.Lock()
+        self._stato = None
+        self._firma = None
+        self._valore = None
+        self._aggiorna()
+        threading.Thread(target=self._sorveglia, name=f"sorveglia-{os.path.basename(percorso)}", daemon=True).start()
+
+    def _aggiorna(self):
+        stato = stato_file(self.percorso)
+        if stato is None or stato == self._stato:
+            return False
+        firma = impronta_file(self.percorso)
+        if firma == self._firma:
+            self._stato = stato  # file toccato (es. checkout git) ma contenuto identico
+            return False
+        valore = self.caricatore(self.percorso)
+        with self._lock:
+            self._valore, self._firma, self._stato = valore, firma, stato
+        self.ricaricamenti += 1
+        print(f"🔄 {self.percorso} ricaricato (versione {firma[:10]})")
+        return True
+
+    def _sorveglia(self):
+        while True:
+            time.sleep(self.intervallo)
+            try:
+                self._aggiorna()
+            except Exception as e:
+                # Si continua a servire l'ultimo dato valido; il prossimo controllo riproverà
+                print(f"⚠️ Ricaricamento di {self.percorso} fallito: {e}")
+
+    def leggi(self):
+        """Restituisce (dato, firma); la firma cambia solo quando cambia il contenuto del file."""
+        with self._lock:
+            return self._valore, self._firma
@@ -11,6 +11,37 @@ interface PriceHistoryRow {
   [key: string]: string | number | boolean | undefined | null;
 }
 
+// Prove fotografiche compattate (prove_fotografiche.py): lo storico CSV non viene riscritto, il file
+// cancellato si risolve sul file che lo sostituisce. Vale l'ultima riga per percorso, anche a catena.
+async function caricaRiferimentiProve(): Promise<Map<string, string>> {
+  const riferimenti = new Map<string, string>();
+  try {
+    const filePath = path.join(process.cwd(), "public", "data", "riferimenti_prove.csv");
+    const parsed = Papa.parse<Record<string, string>>(await fs.readFile(filePath, "utf8"), {
+      header: true,
+      skipEmptyLines: true,
+      delimiter: ";",
+      transformHeader: (header) => header.trim().replace(/^\uFEFF/, '').toUpperCase()
+    });
+    for (const row of parsed.data) {
+      if (row.PERCORSO && row.RIFERIMENTO) riferimenti.set(row.PERCORSO, row.RIFERIMENTO);
+    }
+  } catch {
+    // Nessuna prova ancora compattata
+  }
+  return riferimenti;
+}
+
+function risolviProva(percorso: PriceHistoryRow[string], riferimenti: Map<string, string>) {
+  if (typeof percorso !== "string") return percorso;
+  const visti = new Set<string>();
+  while (riferimenti.has(percorso) && !visti.has(percorso)) {
+    visti.add(percorso);
+    percorso = riferimenti.get(percorso)!;
+  }
+  return percorso;
+}
+
 export async function GET(req: NextRequest) {
   try {
     const session = await getServerSession(authOptions);
@@ -34,8 +65,10 @@ export async function GET(req: NextRequest) {
     });
 
     const parsedData = parsed.data as PriceHistoryRow[];
+    const riferimenti = await caricaRiferimentiProve();
     const sanitizedData = parsedData.map((row) => ({
       ...row,
+      SCREENSHOT_PATH: risolviProva(row.SCREENSHOT_PATH, riferimenti),
       PREZZO_RILEVATO: parseFloat(row.PREZZO_RILEVATO?.toString().replace(',', '.') || "0"),
       PREZZO_SCONTATO: parseFloat(row.PREZZO_SCONTATO?.toString().replace(',', '.') || "0"),
     }));
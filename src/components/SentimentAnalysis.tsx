@@ -16,6 +16,7 @@ interface Review {
   SITO_ORIGINE: string;
   RATING_ORIGINALE: number;
   TESTO_COMMENTO: string;
+  TESTO_ORIGINALE?: string;
   SENTIMENT_SCORE: string;
   PAROLE_CHIAVE_ESTRATTE: string;
 }
@@ -192,7 +193,7 @@ const SentimentAnalysis = () => {
     if (selectedWord) {
       const lowerWord = selectedWord.toLowerCase();
       filtered = filtered.filter(r => 
-        (r.TESTO_COMMENTO || "").toLowerCase().includes(lowerWord) ||
+        (r.TESTO_COMMENTO || r.TESTO_ORIGINALE || "").toLowerCase().includes(lowerWord) ||
         (r.PAROLE_CHIAVE_ESTRATTE || "").toLowerCase().includes(lowerWord)
       );
     }
@@ -465,7 +466,15 @@ const SentimentAnalysis = () => {
                       r.SENTIMENT_SCORE === "Negativo" ? "bg-red-100 text-red-700" : "bg-gray-100 text-gray-700"
                     )}>{r.SENTIMENT_SCORE}</span>
                   </td>
-                  <td className="px-6 py-4 border-b italic text-gray-600">{r.TESTO_COMMENTO}</td>
+                  <td className="px-6 py-4 border-b italic text-gray-600">
+                    {/* TESTO_COMMENTO vuoto: recensione chiusa dal filtro locale, mostrata in lingua originale */}
+                    {r.TESTO_COMMENTO || (
+                      <>
+                        {r.TESTO_ORIGINALE}{" "}
+                        <span className="not-italic px-2 py-0.5 rounded-full text-xs bg-gray-100 text-gray-500">non tradotto</span>
+                      </>
+                    )}
+                  </td>
                 </tr>
               )) : (
                 <tr><td colSpan={5} className="px-6 py-8 text-center text-gray-500 italic">Nessuna recensione trovata.</td></tr>
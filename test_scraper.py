@@ -1,11 +1,15 @@
 import requests
 from bs4 import BeautifulSoup
-import gspread
 from datetime import datetime
+import sys
+from destinazioni_righe import crea_destinazione, destinazione_da_argomenti
 
 # --- 1. VARIABILI DA PERSONALIZZARE ---
 LINK_FOGLIO = "https://docs.google.com/spreadsheets/d/1mM998ELdz5WezKjdn93QgeO8IpA6JGIYeU-JtxflLmU/edit?gid=490813682#gid=490813682" # <-- Metti il link del tuo Google Sheet!
 url_vino = "https://www.callmewine.com/franciacorta-extra-brut-alma-assemblage-1-bellavista-375cl-P63055.htm"
+# --destinazione sheets|csv|sqlite|finto (di default il Google Sheet)
+COLONNE = ['DATA_ESTRAZIONE', 'NOME_PRODOTTO', 'PREZZO_RILEVATO', 'LINK_SCRAPING']
+FILE_LOCALE = "public/data/prezzi_test_scraper"
 
 headers = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
@@ -31,18 +35,16 @@ try:
             
             print(f"✅ Trovato: {vero_nome} a {prezzo_estratto}")
             
-            # --- 3. FASE DI SALVATAGGIO (Google Sheets) ---
-            print("☁️ Connessione al database Google Sheets in corso...")
+            # --- 3. FASE DI SALVATAGGIO (Google Sheets o file locale) ---
+            tipo = destinazione_da_argomenti(sys.argv)
+            print(f"☁️ Scrittura su {tipo} in corso...")
             
-            # Usa il tuo file credenziali.json per farsi aprire la porta da Google
-            gc = gspread.service_account(filename='credenziali.json')
-            sh = gc.open_by_url(LINK_FOGLIO)
-            worksheet = sh.worksheet("Prezzi") # Puntiamo al foglio nuovo
+            # Con Sheets usa il tuo file credenziali.json per farsi aprire la porta da Google
+            with crea_destinazione(tipo, COLONNE, FILE_LOCALE, link_foglio=LINK_FOGLIO, nome_foglio="Prezzi") as destinazione:
+                # Scriviamo una nuova riga con i 4 dati in ordine!
+                destinazione.aggiungi([data_oggi, vero_nome, prezzo_estratto, url_vino])
             
-            # Scriviamo una nuova riga con i 4 dati in ordine!
-            worksheet.append_row([data_oggi, vero_nome, prezzo_estratto, url_vino])
-            
-            print("🎉 MISSIONE COMPIUTA! I dati sono stati scritti sul tuo Google Sheet.")
+            print(f"🎉 MISSIONE COMPIUTA! I dati sono stati scritti su {tipo}.")
             
         else:
             print("⚠️ Accesso ok, ma mancano prezzo o titolo sulla pagina.")
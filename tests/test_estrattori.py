@@ -0,0 +1,30 @@
+import json
+import os
+
+import pytest
+
+from estrazione_html import PaginaProdotto
+from estrattori_siti import trova_estrattore
+
+# Valori attesi delle fixture del benchmark, con entrambi i parser: ogni ramo degli estrattori ha la sua pagina
+
+DIR_FIXTURES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmark', 'fixtures')
+
+with open(os.path.join(DIR_FIXTURES, 'attesi.json'), encoding='utf-8') as f:
+    ATTESI = json.load(f)
+
+
+@pytest.mark.parametrize('parser', ['auto', 'bs4'])
+@pytest.mark.parametrize('fixture', sorted(ATTESI))
+def test_valori_attesi_delle_fixture(fixture, parser):
+    atteso = ATTESI[fixture]
+    with open(os.path.join(DIR_FIXTURES, f'{fixture}.html'), 'rb') as f:
+        pagina = PaginaProdotto(f.read(), parser=parser)
+    dati = trova_estrattore(atteso['sito_origine']).estrai(pagina)
+    assert dati == {k: atteso[k] for k in ('prezzo_originale', 'prezzo_scontato', 'stockout')}
+
+def test_ogni_sito_ha_sconto_o_stockout_coperti():
+    for sito in {a['sito_origine'] for a in ATTESI.values()}:
+        casi = [a for a in ATTESI.values() if a['sito_origine'] == sito]
+        assert any(a['stockout'] for a in casi) and any(not a['stockout'] for a in casi), sito
+    assert any(a['prezzo_scontato'] is not None for a in ATTESI.values())
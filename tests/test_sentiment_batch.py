@@ -0,0 +1,128 @@
+import asyncio
+import time
+
+import pandas as pd
+import pytest
+
+import bot_sentiment_ai
+from bot_sentiment_ai import SecchielloToken, analizza_batch, COLONNE_ELABORATO, VERSIONE_PROMPT
+from cache_sentiment import CacheSentiment, impronta_testo
+from gemini_finto import ClientFinto
+from giornale_csv import GiornaleCsv
+
+# Motore sentiment contro il client Gemini finto: nessuna chiamata reale, latenza azzerata
+
+TESTI = [f"Vino {'buono ed elegante' if n % 2 else 'acido e deludente'}, bottiglia numero {n}" for n in range(14)]
+
+
+@pytest.fixture(autouse=True)
+def ritmo_veloce(monkeypatch):
+    # Il ritmo di produzione (10 richieste/min) farebbe aspettare i test senza provare niente in più
+    monkeypatch.setattr(bot_sentiment_ai, 'RICHIESTE_AL_MINUTO', 6000)
+
+def da_fare(testi):
+    return [(impronta_testo(t), [{'ID_PRODOTTO': f'ID-{n}', 'TESTO_COMMENTO': t}], t) for n, t in enumerate(testi)]
+
+def elabora(tmp_path, client, testi):
+    cache = CacheSentiment(VERSIONE_PROMPT, str(tmp_path / 'cache.db'))
+    giornale = GiornaleCsv(str(tmp_path / 'elaborato.csv'), COLONNE_ELABORATO)
+    try:
+        salvate, saltate = asyncio.run(bot_sentiment_ai._elabora(client, cache, da_fare(testi), giornale))
+    finally:
+        giornale.chiudi()
+        cache.chiudi()
+    return salvate, saltate, pd.read_csv(tmp_path / 'elaborato.csv', sep=';', encoding='utf-8-sig', dtype=str)
+
+
+def test_id_del_batch_in_ordine_sparso():
+    client = ClientFinto(latenza=0, mescola=True, seme=3)
+    batch = [(f'id{n}', t) for n, t in enumerate(TESTI[:10])]
+    risultati = asyncio.run(analizza_batch(client, SecchielloToken(6000), asyncio.Semaphore(1), batch))
+    assert set(risultati) == {id_rec for id_rec, _ in batch}
+    for id_rec, testo in batch:
+        assert risultati[id_rec]['testo_tradotto'] == testo
+
+def test_risultati_rimappati_sulle_righe_giuste(tmp_path):
+    client = ClientFinto(latenza=0, mescola=True, seme=5)
+    salvate, saltate, df = elabora(tmp_path, client, TESTI)
+    assert (salvate, saltate) == (len(TESTI), 0)
+    per_id = dict(zip(df['ID_PRODOTTO'], df['TESTO_COMMENTO']))
+    assert per_id == {f'ID-{n}': t for n, t in enumerate(TESTI)}
+    for _, riga in df.iterrows():
+        atteso = 'Positivo' if 'buono' in riga['TESTO_ORIGINALE'] else 'Negativo'
+        assert riga['SENTIMENT_SCORE'] == atteso
+
+def test_elementi_persi_saltati_e_non_salvati(tmp_path):
+    persi = {impronta_testo(TESTI[1])[:16], impronta_testo(TESTI[12])[:16]}
+    client = ClientFinto(latenza=0, mescola=True, id_da_perdere=persi)
+    salvate, saltate, df = elabora(tmp_path, client, TESTI)
+    assert (salvate, saltate) == (len(TESTI) - 2, 2)
+    assert not {TESTI[1], TESTI[12]} & set(df['TESTO_ORIGINALE'])
+    cache = CacheSentiment(VERSIONE_PROMPT, str(tmp_path / 'cache.db'))
+    try:
+        assert cache.leggi(impronta_testo(TESTI[1])) is None
+        assert cache.leggi(impronta_testo(TESTI[0])) is not None
+    finally:
+        cache.chiudi()
+
+def test_secchiello_rallenta_dopo_429_e_poi_recupera():
+    async def prova():
+        secchiello = SecchielloToken(30)
+        iniziale = secchiello.ritmo
+        client = ClientFinto(latenza=0, primi_429=1)
+        inizio = time.monotonic()
+        risultati = await analizza_batch(client, secchiello, asyncio.Semaphore(1), [('a', TESTI[0])])
+        attesa = time.monotonic() - inizio
+        return secchiello, iniziale, client, risultati, attesa
+
+    secchiello, iniziale, client, risultati, attesa = asyncio.run(prova())
+    assert 'a' in risultati
+    assert (client.chiamate, client.errori_429) == (2, 1)
+    assert attesa >= 0.9                      # rispettato il retryDelay di 1s suggerito dal 429
+    assert secchiello.ritmo < iniziale        # dimezzato dal 429, appena rialzato dal successo
+    for _ in range(60):
+        secchiello.segnala_successo()
+    assert secchiello.ritmo >= iniziale
+    assert secchiello.ritmo <= secchiello.massimo
+
+def test_doppione_di_un_testo_saltato_si_riprova(tmp_path):
+    perso = impronta_testo(TESTI[3])[:16]
+    cache = CacheSentiment(VERSIONE_PROMPT, str(tmp_path / 'cache.db'))
+    giornale = GiornaleCsv(str(tmp_path / 'elaborato.csv'), COLONNE_ELABORATO)
+    fatte = set()
+    righe = [{'ID_PRODOTTO': f'ID-{n}', 'TESTO_COMMENTO': t} for n, t in enumerate(TESTI[:5])]
+    try:
+        primo = bot_sentiment_ai._elabora_blocco(ClientFinto(latenza=0, id_da_perdere={perso}), cache, None, giornale, righe, fatte)
+        secondo = bot_sentiment_ai._elabora_blocco(ClientFinto(latenza=0), cache, None, giornale, [dict(righe[3], ID_PRODOTTO='ID-bis')], fatte)
+    finally:
+        giornale.chiudi()
+        cache.chiudi()
+    assert primo == (4, 1)
+    assert secondo == (1, 0)
+    assert impronta_testo(TESTI[3]) in fatte
+
+def test_sessione_dalla_coda_poi_segnalibro_riprende_le_tagliate(tmp_path):
+    grezzo = tmp_path / 'grezzo.csv'
+    righe = [{'DATA_COMMENTO': '01/01/2025', 'ID_PRODOTTO': f'ID-{n}', 'RATING_ORIGINALE': 3, 'TESTO_COMMENTO': t}
+             for n, t in enumerate(TESTI)]
+    pd.DataFrame(righe).to_csv(grezzo, sep=';', encoding='utf-8-sig', index=False)
+    opzioni = dict(file_input=str(grezzo), file_segnalibro=str(tmp_path / 'segnalibro.json'))
+    client = ClientFinto(latenza=0)
+    with bot_sentiment_ai.SessioneSentiment(client, str(tmp_path / 'elaborato.csv'), str(tmp_path / 'cache.db'),
+                                            filtro_locale=False, budget=10) as sessione:
+        # Due vini dalla coda: il secondo resta tagliato dal budget
+        for blocco in (righe[:7], righe[7:]):
+            bot_sentiment_ai.elabora_sentiment(recensioni=blocco, sessione=sessione, **opzioni)
+        bot_sentiment_ai.elabora_sentiment(sessione=sessione, **opzioni)
+        chiamate = client.chiamate
+    # Il segnalibro supera le 10 già elaborate e si ferma sulla prima tagliata
+    byte = bot_sentiment_ai.carica_segnalibro(str(grezzo), opzioni['file_segnalibro'])
+    with open(grezzo, 'rb') as f:
+        assert f.read()[byte:].split(b'\n')[0].endswith(TESTI[10].encode())
+    # Il giro dopo, con budget nuovo, riprende proprio da lì
+    salvate = bot_sentiment_ai.elabora_sentiment(ClientFinto(latenza=0), file_output=str(tmp_path / 'elaborato.csv'),
+                                                 file_cache=str(tmp_path / 'cache.db'), filtro_locale=False, **opzioni)
+    df = pd.read_csv(tmp_path / 'elaborato.csv', sep=';', encoding='utf-8-sig', dtype=str)
+    assert chiamate == 2
+    assert salvate == len(TESTI) - 10
+    assert sorted(df['TESTO_ORIGINALE']) == sorted(TESTI)
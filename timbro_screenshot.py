@@ -0,0 +1,51 @@
+import io
+from functools import lru_cache
+
+from PIL import Image, ImageDraw, ImageFont
+
+from metriche import span
+
+# --- TIMBRO DIGITALE DELLE PROVE FOTOGRAFICHE ---
+# Lo screenshot arriva da Playwright come byte PNG in memoria (nessun file temporaneo); fascia nera e
+# testo fisso della notifica sono precalcolati per larghezza e motivo, il font è caricato una volta sola.
+# Il timbro è pensato per girare in un pool di thread: decodifica PNG e codifica WebP di Pillow
+# rilasciano il GIL, quindi più prove si timbrano in parallelo mentre Playwright continua a navigare.
+ALTEZZA_FASCIA = 90
+QUALITA_WEBP = 75
+MAX_CARATTERI_URL = 80
+
+@lru_cache(maxsize=1)
+def font_timbro():
+    try:
+        return ImageFont.load_default()
+    except Exception:
+        return None
+
+@lru_cache(maxsize=32)
+def fascia_timbro(larghezza, motivo):
+    """Fascia nera con la riga della notifica già scritta; data e URL si aggiungono a ogni scatto."""
+    fascia = Image.new('RGB', (larghezza, ALTEZZA_FASCIA), (0, 0, 0))
+    ImageDraw.Draw(fascia).text((20, 60), f"NOTIFICA: VIOLAZIONE COMMERCIALE [{motivo}]", fill=(255, 100, 100), font=font_timbro())
+    return fascia
+
+def timbra(png, url, motivo, scatto):
+    """Byte PNG dello screenshot -> byte WebP con la fascia del timbro (data/ora dello scatto, URL, motivo)."""
+    img = Image.open(io.BytesIO(png)).convert('RGB')
+    larghezza, altezza = img.size
+    img.paste(fascia_timbro(larghezza, motivo), (0, altezza - ALTEZZA_FASCIA))
+
+    draw = ImageDraw.Draw(img)
+    testo_url = f"URL: {url[:MAX_CARATTERI_URL]}..." if len(url) > MAX_CARATTERI_URL else f"URL: {url}"
+    draw.text((20, altezza - 80), f"DATA/ORA: {scatto.strftime('%d/%m/%Y %H:%M:%S')}", fill=(255, 255, 255), font=font_timbro())
+    draw.text((20, altezza - 55), testo_url, fill=(255, 255, 0), font=font_timbro())
+
+    uscita = io.BytesIO()
+    img.save(uscita, 'WEBP', quality=QUALITA_WEBP)
+    return uscita.getvalue()
+
+def salva_timbrato(png, percorso, url, motivo, scatto):
+    with span('timbro', listing=url):
+        webp = timbra(png, url, motivo, scatto)
+    with open(percorso, 'wb') as f:
+        f.write(webp)
+    return percorso